@@ -0,0 +1,58 @@
+"""Compare embeddings backends on a synthetic book.
+
+Reports ingestion throughput (chunks/s), p50/p99 query embedding latency and
+recall@k on a self retrieval task: each query is a partial excerpt of a
+chunk, which must come back in the k first results. The hashing backend
+runs offline, the OpenAI one needs OPENAI_API_KEY:
+
+    $ python benchmarks/embeddings.py --backend hashing --backend openai
+"""
+import time
+import click
+import numpy as np
+
+from tellar.embeddings import EMBEDDINGS_BACKENDS, create_embeddings
+from tellar.vector_index import build_index
+from synthetic import excerpt, synthetic_chunks
+
+
+@click.command()
+@click.option("--backend", "backends", type=click.Choice(EMBEDDINGS_BACKENDS), multiple=True, default=["hashing"], show_default=True)
+@click.option("--chunks", "count", type=int, default=5000, show_default=True)
+@click.option("--queries", type=int, default=200, show_default=True)
+@click.option("--batch-size", type=int, default=64, show_default=True)
+@click.option("-k", type=int, default=4, show_default=True)
+def benchmark(backends: list[str], count: int, queries: int, batch_size: int, k: int):
+    chunks = synthetic_chunks(count)
+    rng = np.random.default_rng(1)
+    targets = rng.integers(count, size=queries)
+    query_texts = [excerpt(chunks[i], rng) for i in targets]
+
+    print(f"{count} chunks, {queries} queries, k={k}")
+    print(f"{'backend':<10}{'chunks/s':>12}{'p50 (ms)':>12}{'p99 (ms)':>12}{'recall@k':>12}")
+    for backend in backends:
+        embeddings = create_embeddings(backend)
+
+        start = time.perf_counter()
+        vectors = []
+        for i in range(0, count, batch_size):
+            vectors.extend(embeddings.embed_documents(chunks[i : i + batch_size]))
+        throughput = count / (time.perf_counter() - start)
+        index = build_index(np.asarray(vectors, dtype=np.float32), "flat")
+
+        latencies, found = [], []
+        for query in query_texts:
+            start = time.perf_counter()
+            vector = embeddings.embed_query(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+            _, ids = index.search(np.asarray([vector], dtype=np.float32), k)
+            found.append(ids[0])
+        recall = np.mean([target in ids for target, ids in zip(targets, found)])
+        print(
+            f"{backend:<10}{throughput:>12.0f}"
+            f"{np.percentile(latencies, 50):>12.3f}{np.percentile(latencies, 99):>12.3f}{recall:>12.3f}"
+        )
+
+
+if __name__ == "__main__":
+    benchmark()
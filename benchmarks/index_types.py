@@ -0,0 +1,71 @@
+"""Compare FAISS index types on synthetic book embeddings.
+
+Reports build time, index size on disk, p50/p99 query latency and recall@k
+against the exact (flat) index. Runs offline:
+
+    $ python benchmarks/index_types.py --vectors 50000 --dimension 1536
+"""
+import os
+import tempfile
+import time
+import click
+import faiss
+import numpy as np
+
+from tellar.vector_index import INDEX_TYPES, build_index
+
+
+def synthetic_vectors(count: int, dimension: int, seed: int = 0) -> np.ndarray:
+    # Clustered vectors: chunks of a book talk about a limited set of topics
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, count // 100), dimension))
+    vectors = centers[rng.integers(len(centers), size=count)]
+    vectors += rng.normal(scale=0.3, size=(count, dimension))
+    return vectors.astype(np.float32)
+
+
+@click.command()
+@click.option("--vectors", "count", type=int, default=20000, show_default=True)
+@click.option("--dimension", type=int, default=256, show_default=True)
+@click.option("--queries", type=int, default=200, show_default=True)
+@click.option("-k", type=int, default=4, show_default=True)
+def benchmark(count: int, dimension: int, queries: int, k: int):
+    vectors = synthetic_vectors(count, dimension)
+    rng = np.random.default_rng(1)
+    query_vectors = vectors[rng.integers(count, size=queries)]
+    query_vectors += rng.normal(scale=0.1, size=query_vectors.shape).astype(np.float32)
+
+    exact = faiss.IndexFlatL2(dimension)
+    exact.add(vectors)
+    _, expected = exact.search(query_vectors, k)
+
+    print(f"{count} vectors, dimension {dimension}, {queries} queries, k={k}")
+    print(f"{'index':<8}{'build (s)':>12}{'size (MB)':>12}{'p50 (ms)':>12}{'p99 (ms)':>12}{'recall@k':>12}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for index_type in INDEX_TYPES:
+            start = time.perf_counter()
+            index = build_index(vectors, index_type)
+            build_time = time.perf_counter() - start
+
+            path = os.path.join(tmp_dir, f"{index_type}.faiss")
+            faiss.write_index(index, path)
+            size = os.path.getsize(path) / 1e6
+
+            # One query at a time, like story_tool does
+            latencies, found = [], []
+            for query in query_vectors:
+                start = time.perf_counter()
+                _, ids = index.search(query[None, :], k)
+                latencies.append((time.perf_counter() - start) * 1000)
+                found.append(ids[0])
+            recall = np.mean(
+                [len(set(e) & set(f)) / k for e, f in zip(expected, found)]
+            )
+            print(
+                f"{index_type:<8}{build_time:>12.2f}{size:>12.1f}"
+                f"{np.percentile(latencies, 50):>12.3f}{np.percentile(latencies, 99):>12.3f}{recall:>12.3f}"
+            )
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,221 @@
+"""Benchmark SearchableDocument retrieval on synthetic books.
+
+For each configuration (index type, chunk size, chunk overlap), builds the
+index of a synthetic book with the deterministic local embedder, then
+reports:
+
+- ingest throughput (pages/s and chunks/s, PDF reading and embedding included)
+- index size on disk and in RAM (resident memory taken by loading it)
+- p50/p99 search latency, one query at a time like story_tool does
+- recall@k against a brute force search over the same embeddings, and hit@k:
+  how often the page a query was taken from is returned
+
+Everything is seeded and runs offline. Results can be saved and compared
+with those of another commit:
+
+    $ python benchmarks/retrieval.py --pages 500 --output before.json
+    $ python benchmarks/retrieval.py --pages 500 --compare before.json
+"""
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import click
+import faiss
+import numpy as np
+
+from tellar.book_reader import BookReader
+from tellar.embeddings import HashingEmbeddings
+from tellar.indexer import directory_size
+from tellar.searchable_document import SEARCH_MODES, SearchableDocument
+from tellar.vector_index import INDEX_TYPES
+from synthetic import excerpt, synthetic_book
+
+# Compared metrics, and whether higher is better
+METRICS = {
+    "pages_per_s": True,
+    "chunks_per_s": True,
+    "disk_mb": False,
+    "ram_mb": False,
+    "p50_ms": False,
+    "p99_ms": False,
+    "recall": True,
+    "hit": True,
+}
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "faiss": faiss.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def loaded_size(pdf_path: str, settings: dict) -> int:
+    """Resident memory taken by loading a prebuilt index (run in a fresh process)."""
+    rss = rss_bytes()
+    doc = SearchableDocument(pdf_path, **settings)
+    return rss_bytes() - rss
+
+
+def brute_force(vectors: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    distances = ((vectors - query) ** 2).sum(axis=1)
+    return np.argsort(distances, kind="stable")[:k]
+
+
+def run(pdf_path: str, pages: int, texts: list[str], config: dict, queries: int, k: int, mode: str, workers: int) -> dict:
+    settings = dict(
+        chunk_size=config["chunk_size"],
+        chunk_overlap=config["chunk_overlap"],
+        index_type=config["index_type"],
+        embeddings="hashing",
+        search_mode=mode,
+        workers=workers,
+    )
+
+    start = time.perf_counter()
+    doc = SearchableDocument(pdf_path, **settings)
+    ingest_time = time.perf_counter() - start
+
+    # Loading a prebuilt index is what a server does on start-up. A fresh
+    # process keeps the measure clear of memory this one already holds.
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        ram = executor.submit(loaded_size, pdf_path, settings).result()
+
+    # Exact neighbours of each query, over the same chunks and embeddings
+    chunks = [
+        chunk.page_content
+        for chunk in BookReader(
+            pdf_path,
+            chunk_size=config["chunk_size"],
+            chunk_overlap=config["chunk_overlap"],
+            workers=workers,
+        ).chunks()
+    ]
+    embeddings = HashingEmbeddings()
+    vectors = np.asarray(embeddings.embed_documents(chunks), dtype=np.float32)
+
+    rng = np.random.default_rng(1)
+    latencies, recalls, hits = [], [], []
+    for _ in range(queries):
+        page = int(rng.integers(pages))
+        query = excerpt(texts[page], rng)
+        start = time.perf_counter()
+        results = doc.search(query, k=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        found = {result.page_content for result in results}
+        expected = {chunks[i] for i in brute_force(vectors, np.asarray(embeddings.embed_query(query)), k)}
+        recalls.append(len(found & expected) / len(expected))
+        hits.append(any(result.metadata["page"] == page for result in results))
+
+    return {
+        **config,
+        "chunks": doc.chunk_count,
+        "pages_per_s": pages / ingest_time,
+        "chunks_per_s": doc.chunk_count / ingest_time,
+        "disk_mb": directory_size(doc.db_path) / 1e6,
+        "ram_mb": max(0, ram) / 1e6,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "recall": float(np.mean(recalls)),
+        "hit": float(np.mean(hits)),
+    }
+
+
+def config_name(result: dict) -> str:
+    return f"{result['index_type']}/{result['chunk_size']}/{result['chunk_overlap']}"
+
+
+@click.command()
+@click.option("--pages", type=int, default=200, show_default=True)
+@click.option("--words-per-page", type=int, default=400, show_default=True)
+@click.option("--index-type", "index_types", type=click.Choice(INDEX_TYPES), multiple=True, default=["flat"], show_default=True)
+@click.option("--chunk-size", "chunk_sizes", type=int, multiple=True, default=[1000], show_default=True)
+@click.option("--chunk-overlap", type=int, default=0, show_default=True)
+@click.option("--search-mode", type=click.Choice(SEARCH_MODES), default="vector", show_default=True)
+@click.option("--queries", type=int, default=200, show_default=True)
+@click.option("-k", type=int, default=4, show_default=True)
+@click.option("--workers", type=int, default=None, help="PDF reading processes (default: all CPUs)")
+@click.option("--output", type=click.Path(), help="save results as JSON")
+@click.option("--compare", type=click.Path(exists=True), help="compare with saved results")
+def benchmark(pages, words_per_page, index_types, chunk_sizes, chunk_overlap, search_mode, queries, k, workers, output, compare):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Fresh index and embedding caches
+        os.environ["HOME"] = tmp_dir
+        pdf_path = os.path.join(tmp_dir, "book.pdf")
+        texts = synthetic_book(pdf_path, pages, words_per_page=words_per_page)
+
+        print(f"{pages} pages of {words_per_page} words, {queries} queries, k={k}, {search_mode} search")
+        print(
+            f"{'index/chunk/overlap':<22}{'chunks':>8}{'pages/s':>10}{'chunks/s':>10}{'disk (MB)':>11}"
+            f"{'RAM (MB)':>10}{'p50 (ms)':>10}{'p99 (ms)':>10}{'recall@k':>10}{'hit@k':>8}"
+        )
+        for index_type in index_types:
+            for chunk_size in chunk_sizes:
+                config = {"index_type": index_type, "chunk_size": chunk_size, "chunk_overlap": chunk_overlap}
+                result = run(pdf_path, pages, texts, config, queries, k, search_mode, workers)
+                results.append(result)
+                print(
+                    f"{config_name(result):<22}{result['chunks']:>8}{result['pages_per_s']:>10.0f}"
+                    f"{result['chunks_per_s']:>10.0f}{result['disk_mb']:>11.2f}{result['ram_mb']:>10.2f}"
+                    f"{result['p50_ms']:>10.3f}{result['p99_ms']:>10.3f}{result['recall']:>10.3f}{result['hit']:>8.3f}"
+                )
+
+    report = {
+        "environment": environment(),
+        "parameters": {
+            "pages": pages,
+            "words_per_page": words_per_page,
+            "search_mode": search_mode,
+            "queries": queries,
+            "k": k,
+        },
+        "results": results,
+    }
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if compare:
+        with open(compare) as f:
+            baseline = json.load(f)
+        if baseline["parameters"] != report["parameters"]:
+            print("Warning: the baseline was run with other parameters")
+        previous = {config_name(result): result for result in baseline["results"]}
+        print(f"\nChange vs {baseline['environment'].get('commit') or compare} (+ is better)")
+        for result in results:
+            before = previous.get(config_name(result))
+            if before is None:
+                continue
+            changes = []
+            for metric, higher_is_better in METRICS.items():
+                if before[metric] == 0:
+                    continue
+                change = (result[metric] - before[metric]) / before[metric] * 100
+                changes.append(f"{metric} {change if higher_is_better else -change:+.1f}%")
+            print(f"{config_name(result):<22}{', '.join(changes)}")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,55 @@
+"""Measure the cost of starting a conversation with a character.
+
+Reports sessions/s and memory allocated per session for clone() (a session of
+a shared character template) against building a whole Character (prompt,
+tools, agent and executor), as the server did for each new sender. Runs
+offline: the chat model is never called.
+
+    $ python benchmarks/sessions.py --sessions 1000
+"""
+import gc
+import time
+import tracemalloc
+import click
+from langchain_openai import ChatOpenAI
+
+from tellar.character import Character
+
+
+def measure(create, count: int) -> tuple[float, float]:
+    gc.collect()
+    start = time.perf_counter()
+    sessions = [create() for _ in range(count)]
+    rate = count / (time.perf_counter() - start)
+    del sessions
+
+    gc.collect()
+    tracemalloc.start()
+    sessions = [create() for _ in range(count)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return rate, size / count
+
+
+@click.command()
+@click.option("--sessions", "count", type=int, default=1000, show_default=True)
+def benchmark(count: int):
+    model = ChatOpenAI(model="gpt-4o-mini", api_key="benchmark")
+    # The book is only searched when the model calls story_tool
+    char = Character(name="Harry", searchable_doc=None, char_name="Harry", language="english", model=model)
+
+    def full():
+        return Character(name="Harry", searchable_doc=None, char_name="Harry", language="french", model=model)
+
+    def session():
+        return char.clone(language="french")
+
+    print(f"{count} sessions")
+    print(f"{'method':<10}{'sessions/s':>14}{'KiB/session':>14}")
+    for method, create in [("full", full), ("clone", session)]:
+        rate, size = measure(create, count)
+        print(f"{method:<10}{rate:>14.0f}{size / 1024:>14.2f}")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,93 @@
+"""Deterministic synthetic books for the benchmarks."""
+import numpy as np
+
+
+def __escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_text_pdf(path: str, pages: list[str], line_length: int = 90):
+    """Write a minimal PDF with one page per text."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Pages, filled once page ids are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for text in pages:
+        # Wrap text on words to keep lines inside the page
+        lines, line = [], ""
+        for word in text.split():
+            if line and len(line) + len(word) + 1 > line_length:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        if line:
+            lines.append(line)
+        stream = "BT /F1 10 Tf 12 TL 40 800 Td " + " ".join(
+            f"({__escape(l)}) Tj T*" for l in lines
+        ) + " ET"
+        content = stream.encode("latin-1", errors="replace")
+        objects.append(
+            b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream"
+        )
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+            % len(objects)
+        )
+        page_ids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        " ".join(f"{i} 0 R" for i in page_ids).encode(),
+        len(page_ids),
+    )
+
+    data = b"%PDF-1.4\n"
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n" % i + obj + b"\nendobj\n"
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref,
+    )
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def synthetic_chunks(count: int, words_per_chunk: int = 150, seed: int = 0) -> list[str]:
+    # Zipf distributed vocabulary, each chunk mixing common words and a few topic
+    # words. Like in real languages, frequent words are short.
+    rng = np.random.default_rng(seed)
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    vocabulary = [
+        "".join(rng.choice(letters, size=2 + int(np.log2(rank + 1) / 2)))
+        for rank in range(20000)
+    ]
+    ranks = np.minimum(rng.zipf(1.3, size=(count, words_per_chunk)), len(vocabulary)) - 1
+    topics = rng.integers(len(vocabulary), size=(count, 10))
+    chunks = []
+    for words, topic in zip(ranks, topics):
+        words = words.copy()
+        words[rng.integers(words_per_chunk, size=20)] = rng.choice(topic, size=20)
+        chunks.append(" ".join(vocabulary[w] for w in words))
+    return chunks
+
+
+def synthetic_book(path: str, pages: int, words_per_page: int = 400, seed: int = 0) -> list[str]:
+    """Write a PDF book of the given number of pages, return the text of its pages."""
+    texts = synthetic_chunks(pages, words_per_chunk=words_per_page, seed=seed)
+    write_text_pdf(path, texts)
+    return texts
+
+
+def excerpt(text: str, rng: np.random.Generator, length: int = 20) -> str:
+    """A question about a passage: some of its words, in order."""
+    words = text.split()
+    start = rng.integers(max(1, len(words) - length))
+    words = words[start : start + length]
+    return " ".join(w for w in words if rng.random() > 0.3)
@@ -0,0 +1,179 @@
+import asyncio
+from dataclasses import dataclass
+import atexit
+import json
+import logging
+import shutil
+import tempfile
+import threading
+import numpy as np
+from gptcache import Cache, Config
+from gptcache.adapter.api import get, put
+from gptcache.manager import manager_factory
+from gptcache.similarity_evaluation import TimeEvaluation
+from langchain_core.embeddings import Embeddings
+
+from tellar.embeddings import HashingEmbeddings
+from tellar.utils.lru_cache import LRUCache
+from tellar.utils.text_utils import normalize_query, tokenize
+
+# Logger
+logger = logging.getLogger(__name__)
+
+# Squared L2 distance between normalized vectors is 2 - 2 * cosine: at most 4
+MAX_DISTANCE = 4.0
+
+
+@dataclass
+class AnswerCacheStats:
+    hits: int = 0
+    misses: int = 0
+    # Conversations with history: not cacheable
+    bypassed: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def to_json(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": self.hit_rate,
+            # Each hit is an agent run (and its LLM calls) not made
+            "saved_llm_calls": self.hits,
+        }
+
+
+def content_words(query: str) -> set:
+    # Short words ("a", "of", "me"...) can change, names and numbers cannot
+    return {
+        word
+        for word in tokenize(query)
+        if len(word) >= 3 or any(c.isdigit() for c in word)
+    }
+
+
+@dataclass
+class _Store:
+    cache: Cache
+    # Normalized question -> answer, checked before the semantic cache
+    exact: LRUCache
+    # GPTCache (SQLite and FAISS) is used from worker threads
+    lock: threading.Lock
+
+
+class AnswerCache:
+    """Semantic cache of the answers to conversation openers (GPTCache).
+
+    Answers are only shared between characters speaking the same language,
+    with the same goal, about the same book: each such context gets its own
+    store. Questions are first matched exactly (once normalized), then on
+    their embeddings (local, no API call) with a cosine similarity threshold:
+    an embedding match only counts when both questions have the same content
+    words, "your father" never answers "your brother". Entries expire after
+    ttl seconds and each store keeps its max_size most recently used answers.
+    """
+
+    def __init__(
+        self,
+        similarity_threshold: float = 0.9,
+        ttl: float = 3600,
+        max_size: int = 1000,
+        embeddings: Embeddings = None,
+    ):
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self.max_size = max_size
+        self.embeddings = embeddings or HashingEmbeddings()
+        self.stats = AnswerCacheStats()
+        self.__data_dir = tempfile.mkdtemp(prefix="tellar-answers-")
+        # GPTCache saves its stores at exit: remove them after (atexit runs last in first)
+        atexit.register(shutil.rmtree, self.__data_dir, ignore_errors=True)
+        self.__stores = {}
+        self.__lock = threading.Lock()
+
+    def __embed(self, text: str, **kwargs) -> np.ndarray:
+        return np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+
+    def __get_store(self, context_key: str) -> _Store:
+        with self.__lock:
+            store = self.__stores.get(context_key)
+            if store is None:
+                cache = Cache()
+                cache.init(
+                    pre_embedding_func=lambda data, **kwargs: normalize_query(data["prompt"]),
+                    embedding_func=self.__embed,
+                    data_manager=manager_factory(
+                        "sqlite,faiss",
+                        data_dir=f"{self.__data_dir}/{context_key}",
+                        max_size=self.max_size,
+                        vector_params={"dimension": len(self.__embed("dimension"))},
+                    ),
+                    similarity_evaluation=TimeEvaluation(
+                        evaluation="distance",
+                        evaluation_config={"max_distance": MAX_DISTANCE},
+                        time_range=self.ttl,
+                    ),
+                    # GPTCache compares (MAX_DISTANCE - distance) / MAX_DISTANCE: (1 + cosine) / 2
+                    config=Config(similarity_threshold=(1 + self.similarity_threshold) / 2),
+                )
+                store = _Store(
+                    cache=cache,
+                    exact=LRUCache(max_size=self.max_size, ttl=self.ttl),
+                    lock=threading.Lock(),
+                )
+                self.__stores[context_key] = store
+            return store
+
+    def __lookup(self, store: _Store, query: str) -> str:
+        normalized = normalize_query(query)
+        answer = store.exact.get(normalized)
+        if answer is not None:
+            return answer
+        with store.lock:
+            payload = get(query, cache_obj=store.cache)
+        if payload is None:
+            return None
+        entry = json.loads(payload)
+        if content_words(entry["question"]) != content_words(normalized):
+            logger.debug(f"Answer cache near miss: {query} / {entry['question']}")
+            return None
+        return entry["answer"]
+
+    def get(self, context_key: str, query: str, cacheable: bool = True) -> str:
+        """Cached answer to a question, or None (always None when not cacheable)."""
+        if not cacheable:
+            self.stats.bypassed += 1
+            return None
+        answer = self.__lookup(self.__get_store(context_key), query)
+        if answer is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+            logger.debug(f"Answer cache hit: {query}")
+        return answer
+
+    def put(self, context_key: str, query: str, answer: str):
+        store = self.__get_store(context_key)
+        normalized = normalize_query(query)
+        store.exact.put(normalized, answer)
+        # The question is kept with the answer, to check the content words of a match
+        with store.lock:
+            put(query, json.dumps({"question": normalized, "answer": answer}), cache_obj=store.cache)
+
+    async def aget(self, context_key: str, query: str, cacheable: bool = True) -> str:
+        # SQLite and FAISS work: off the event loop
+        return await asyncio.to_thread(self.get, context_key, query, cacheable)
+
+    async def aput(self, context_key: str, query: str, answer: str):
+        await asyncio.to_thread(self.put, context_key, query, answer)
+
+    def close(self):
+        with self.__lock:
+            for store in self.__stores.values():
+                with store.lock:
+                    store.cache.data_manager.close()
+            self.__stores.clear()
@@ -0,0 +1,106 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import logging
+import multiprocessing
+import os
+import time
+from typing import Iterator
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+import pypdf
+
+# Logger
+logger = logging.getLogger(__name__)
+
+
+def read_pages(
+    pdf_path: str,
+    start: int,
+    end: int,
+    chunk_size: int,
+    chunk_overlap: int,
+    separators: list,
+) -> list[Document]:
+    """Extract and split pages [start, end) the same way PyPDFLoader.load_and_split does."""
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, separators=separators
+    )
+    reader = pypdf.PdfReader(pdf_path)
+    pages = [
+        Document(
+            page_content=reader.pages[page_number].extract_text(extraction_mode="plain"),
+            metadata={"source": pdf_path, "page": page_number},
+        )
+        for page_number in range(start, end)
+    ]
+    return text_splitter.split_documents(pages)
+
+
+@dataclass
+class ReadStats:
+    pages: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.pages / self.seconds if self.seconds > 0 else 0.0
+
+
+class BookReader:
+    def __init__(
+        self,
+        pdf_path: str,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 0,
+        separators: list = None,
+        workers: int = None,
+        pages_per_task: int = 16,
+    ):
+        self.pdf_path = pdf_path
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = separators or [" ", ",", "\n"]
+        self.workers = workers or os.cpu_count() or 1
+        self.pages_per_task = pages_per_task
+        self.page_count = len(pypdf.PdfReader(pdf_path).pages)
+        self.stats = ReadStats()
+
+    def chunks(self) -> Iterator[Document]:
+        """Yield the book chunks in page order, while later pages are still being read."""
+        start_time = time.perf_counter()
+        self.stats = ReadStats()
+
+        ranges = [
+            (start, min(start + self.pages_per_task, self.page_count))
+            for start in range(0, self.page_count, self.pages_per_task)
+        ]
+        settings = (self.chunk_size, self.chunk_overlap, self.separators)
+
+        # Small books are not worth spawning processes for
+        if self.workers == 1 or len(ranges) <= 1:
+            results = (read_pages(self.pdf_path, s, e, *settings) for s, e in ranges)
+            yield from self.__count(results, ranges)
+        else:
+            # Spawned, not forked: books are read from indexing threads
+            with ProcessPoolExecutor(
+                max_workers=min(self.workers, len(ranges)),
+                mp_context=multiprocessing.get_context("spawn"),
+            ) as executor:
+                # map() keeps task order and yields each result as soon as it is ready
+                results = executor.map(
+                    read_pages,
+                    *zip(*[(self.pdf_path, s, e, *settings) for s, e in ranges]),
+                )
+                yield from self.__count(results, ranges)
+
+        self.stats.seconds = time.perf_counter() - start_time
+        logger.info(
+            f"Read {self.stats.pages} pages ({self.stats.chunks} chunks) in {self.stats.seconds:.2f}s: {self.stats.pages_per_second:.1f} pages/s"
+        )
+
+    def __count(self, results, ranges) -> Iterator[Document]:
+        for (start, end), chunks in zip(ranges, results):
+            self.stats.pages += end - start
+            self.stats.chunks += len(chunks)
+            yield from chunks
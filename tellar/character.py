@@ -1,16 +1,28 @@
 from dataclasses import dataclass
+import logging
 import os
 from pathlib import Path
 import time
+from typing import AsyncIterable, AsyncIterator
+import uuid
+import aiofiles
 from langchain_openai import ChatOpenAI
 from langchain.agents import create_tool_calling_agent, AgentExecutor
 from langchain_core.prompts import ChatPromptTemplate
 from langchain.tools import tool
-from langchain_core.messages import HumanMessage
-import openai
 import json
 
+from tellar.answer_cache import AnswerCache
+from tellar.chat_history import ChatHistory
+from tellar.context_packer import ContextPacker
 from tellar.searchable_document import SearchableDocument
+from tellar.speech import SpeechPipeline
+from tellar.utils.json_stream import JsonFieldStreamer
+from tellar.utils.openai_client import OpenAIClientPool, default_pool
+from tellar.utils.text_utils import hash_key
+
+# Logger
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -43,28 +55,41 @@ class Answer:
             return cls(text=f"{json_str}")
 
 
-class Character:
+@dataclass
+class AnswerDelta:
+    """Piece of answer text, as the model writes it."""
+
+    text: str
+
+
+class CharacterTemplate:
+    """What all the conversations with a character share.
+
+    The prompt, tools, agent and executor are built once: the language and goal
+    of each conversation are prompt variables, filled in by its Character.
+    """
 
     def __init__(
         self,
         name: str,
         searchable_doc: SearchableDocument,
         char_name: str,
-        language: str,
-        goal: str = None,
         verbose: bool = False,
         temp_speech_file_path: Path = None,
         model=None,
+        context_packer: ContextPacker = None,
+        answer_cache: AnswerCache = None,
+        openai_pool: OpenAIClientPool = None,
     ):
         self.name = name
         self.searchable_doc = searchable_doc
         self.char_name = char_name
-        self.language = language
-        self.goal = goal
         self.verbose = verbose
-        self.chat_history = []
         self.temp_speech_file_path = temp_speech_file_path
         self.model = model or ChatOpenAI(model="gpt-4o-mini")
+        self.context_packer = context_packer or ContextPacker()
+        self.answer_cache = answer_cache
+        self.openai_pool = openai_pool or default_pool
 
         # If no temp speech file path provided: defaults to local user
         if self.temp_speech_file_path is None:
@@ -78,12 +103,12 @@ class Character:
 
         instructions = f"""
         Your are {char_name}.
-        {goal}
+        {{goal}}
         Use story_tool to learn about your own story (rely exclusively on it to know more about yourself).
         Do speak in the first person from the perspective of {char_name}.
         Do use story_tool to know more about your character.
         Do use time_tool to know the current time.
-        Use only {language} to reply.
+        Use only {{language}} to reply.
         You know only what your character knows.
         Do act like you don't know things that where created after your era (when asked just say you don't even know what it is, without giving any details).
         Try not to repeat yourself in conversations. Sometimes, open your answers with questions when you need to move forward.
@@ -104,21 +129,25 @@ class Character:
         )
 
         @tool
-        def story_tool(query: str) -> str:
+        async def story_tool(query: str) -> str:
             """Useful for when you need to answer questions about your character."""
-            return self.searchable_doc.search(query)
+            docs = await self.searchable_doc.asearch(
+                query, k=self.context_packer.max_passages
+            )
+            # Only deduplicated passage text, within the token budget, reaches the prompt
+            return self.context_packer.pack(docs).text
 
         @tool
-        def draw_tool(query: str) -> str:
+        async def draw_tool(query: str) -> str:
             """Useful for when you need to draw or show something. Returns the URL of the created image"""
-            client = openai.OpenAI()
-            response = client.images.generate(
-                model="dall-e-3",
-                prompt=query,
-                size="1024x1024",
-                quality="standard",
-                n=1,
-            )
+            async with self.openai_pool.limit() as client:
+                response = await client.images.generate(
+                    model="dall-e-3",
+                    prompt=query,
+                    size="1024x1024",
+                    quality="standard",
+                    n=1,
+                )
             return response.data[0].url
 
         @tool
@@ -131,34 +160,257 @@ class Character:
 
         self.agent = create_tool_calling_agent(self.model, tools, prompt)
         self.executor = AgentExecutor(agent=self.agent, tools=tools, verbose=verbose)
+        self.speech = SpeechPipeline(openai_pool=self.openai_pool)
 
-    async def answer(self, query: str) -> Answer:
-        raw_answer = await self.executor.ainvoke(
-            {"input": query, "chat_history": self.chat_history}
+    def speech_file_path(self) -> Path:
+        """New speech file, for a conversation (concurrent ones would overwrite each other)."""
+        path = self.temp_speech_file_path
+        return path.with_name(f"{path.stem}-{uuid.uuid4().hex[:12]}{path.suffix}")
+
+    def session(
+        self,
+        language: str,
+        goal: str = None,
+        history_token_budget: int = 1500,
+        history_turns: int = 4,
+    ) -> "Character":
+        """New conversation with the character."""
+        return Character.from_template(
+            self,
+            language=language,
+            goal=goal,
+            history_token_budget=history_token_budget,
+            history_turns=history_turns,
+        )
+
+
+class Character:
+    """A conversation with a character: its language, goal and history.
+
+    Everything else is shared with the other conversations through the
+    character template, so that clone() is cheap.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        searchable_doc: SearchableDocument,
+        char_name: str,
+        language: str,
+        goal: str = None,
+        verbose: bool = False,
+        temp_speech_file_path: Path = None,
+        model=None,
+        context_packer: ContextPacker = None,
+        history_token_budget: int = 1500,
+        history_turns: int = 4,
+        answer_cache: AnswerCache = None,
+        openai_pool: OpenAIClientPool = None,
+    ):
+        template = CharacterTemplate(
+            name=name,
+            searchable_doc=searchable_doc,
+            char_name=char_name,
+            verbose=verbose,
+            temp_speech_file_path=temp_speech_file_path,
+            model=model,
+            context_packer=context_packer,
+            answer_cache=answer_cache,
+            openai_pool=openai_pool,
         )
-        answer = Answer.from_json_str(raw_answer["output"])
-        self.chat_history.extend([HumanMessage(content=query), raw_answer["output"]])
+        self.__init_session(template, language, goal, history_token_budget, history_turns)
+
+    @classmethod
+    def from_template(
+        cls,
+        template: CharacterTemplate,
+        language: str,
+        goal: str = None,
+        history_token_budget: int = 1500,
+        history_turns: int = 4,
+    ) -> "Character":
+        character = cls.__new__(cls)
+        character.__init_session(template, language, goal, history_token_budget, history_turns)
+        return character
+
+    def __init_session(
+        self,
+        template: CharacterTemplate,
+        language: str,
+        goal: str,
+        history_token_budget: int,
+        history_turns: int,
+    ):
+        self.template = template
+        self.language = language
+        self.goal = goal
+        self.history_token_budget = history_token_budget
+        self.history_turns = history_turns
+        self.chat_history = ChatHistory(
+            model=template.model, token_budget=history_token_budget, keep_turns=history_turns
+        )
+        # Shared with the template (may be replaced for this conversation only)
+        self.answer_cache = template.answer_cache
+        self.executor = template.executor
+        self.temp_speech_file_path = template.speech_file_path()
+
+    @property
+    def name(self) -> str:
+        return self.template.name
+
+    @property
+    def searchable_doc(self) -> SearchableDocument:
+        return self.template.searchable_doc
+
+    @property
+    def char_name(self) -> str:
+        return self.template.char_name
+
+    @property
+    def verbose(self) -> bool:
+        return self.template.verbose
+
+    @property
+    def model(self):
+        return self.template.model
+
+    @property
+    def context_packer(self) -> ContextPacker:
+        return self.template.context_packer
+
+    @property
+    def openai_pool(self) -> OpenAIClientPool:
+        return self.template.openai_pool
+
+    @property
+    def agent(self):
+        return self.template.agent
+
+    def __inputs(self, query: str) -> dict:
+        return {
+            "input": query,
+            "goal": self.goal or "",
+            "language": self.language,
+            "chat_history": self.chat_history.record_turn_tokens(),
+        }
+
+    @property
+    def book_key(self) -> str:
+        """Identity of what the character knows: the book index, and the books of the library it may search."""
+        manifest = getattr(self.searchable_doc, "manifest", None)
+        return hash_key(getattr(manifest, "key", None), getattr(self.searchable_doc, "filter", None))
+
+    @property
+    def identity(self) -> str:
+        """Who the character is: saved sessions and warmup results are kept per identity."""
+        return hash_key(self.name, self.char_name, self.book_key, self.language)
+
+    @property
+    def answer_context(self) -> str:
+        """What answers depend on, besides the question."""
+        return hash_key(self.identity, self.goal)
+
+    async def __cached_output(self, query: str) -> str:
+        if self.answer_cache is None:
+            return None
+        # Once the conversation started, answers depend on it
+        return await self.answer_cache.aget(
+            self.answer_context, query, cacheable=len(self.chat_history) == 0
+        )
+
+    async def __add_turn(self, query: str, output: str, cached: bool):
+        # Answers drawn from part of a progressive index are not shared
+        if (
+            not cached
+            and self.answer_cache is not None
+            and len(self.chat_history) == 0
+            and self.searchable_doc.progress.ready
+        ):
+            await self.answer_cache.aput(self.answer_context, query, output)
+        # Folded after the reply, before the next turn
+        self.chat_history.add_turn(query, output)
+
+    async def answer(self, query: str) -> Answer:
+        await self.chat_history.wait_folded()
+        output = await self.__cached_output(query)
+        cached = output is not None
+        if not cached:
+            raw_answer = await self.executor.ainvoke(self.__inputs(query))
+            output = raw_answer["output"]
+        answer = Answer.from_json_str(output)
+        await self.__add_turn(query, output, cached)
         return answer
 
-    async def speak(self, message: str) -> Path:
-        client = openai.OpenAI()
-        with client.audio.speech.with_streaming_response.create(
-            model="tts-1",
-            voice="onyx",
-            # response_format="opus",
-            input=message,
-        ) as response:
-            response.stream_to_file(self.temp_speech_file_path)
+    async def astream(self, query: str) -> AsyncIterator[AnswerDelta | Answer]:
+        """Answer a query, yielding the answer text as it is generated.
+
+        Yields AnswerDelta pieces of text, then the complete Answer (with its image).
+        """
+        await self.chat_history.wait_folded()
+        output = await self.__cached_output(query)
+        if output is not None:
+            answer = Answer.from_json_str(output)
+            await self.__add_turn(query, output, cached=True)
+            yield AnswerDelta(text=answer.text or "")
+            yield answer
+            return
+
+        parsers = {}
+        # Text streamed by the last model call, should the agent end without an output
+        streamed = {}
+        last_run_id = None
+        output = None
+        async for event in self.executor.astream_events(self.__inputs(query), version="v2"):
+            if event["event"] == "on_chat_model_stream":
+                content = event["data"]["chunk"].content
+                if not isinstance(content, str) or not content:
+                    continue
+                # One parser per model call: tool calling steps come before the answer
+                parser = parsers.setdefault(event["run_id"], JsonFieldStreamer("text"))
+                delta = parser.feed(content)
+                if delta:
+                    streamed[event["run_id"]] = streamed.get(event["run_id"], "") + delta
+                    last_run_id = event["run_id"]
+                    yield AnswerDelta(text=delta)
+            elif event["event"] == "on_chain_end" and not event.get("parent_ids"):
+                chain_output = event["data"].get("output")
+                if isinstance(chain_output, dict) and isinstance(chain_output.get("output"), str):
+                    output = chain_output["output"]
+
+        if output is None:
+            if last_run_id is None:
+                raise RuntimeError("The agent ended without an answer")
+            logger.warning("The agent ended without an output: using the streamed answer")
+            output = json.dumps(Answer(text=streamed[last_run_id]).to_json())
+
+        await self.__add_turn(query, output, cached=False)
+        yield Answer.from_json_str(output)
+
+    async def astream_speech(self, text: str | AsyncIterable[str]) -> AsyncIterator[bytes]:
+        """Speech of a text, or of a stream of text pieces: MP3 audio, sentence by sentence."""
+        async for audio in self.template.speech.astream(text):
+            yield audio
+
+    async def speak(self, message: str | AsyncIterable[str]) -> Path:
+        """Write the speech of a text to the speech file of the conversation."""
+        self.temp_speech_file_path.parent.mkdir(parents=True, exist_ok=True)
+        async with aiofiles.open(self.temp_speech_file_path, "wb") as file:
+            async for audio in self.astream_speech(message):
+                await file.write(audio)
         return self.temp_speech_file_path
 
-    def clone(self, language: str = None, goal: str = None):
-        return Character(
-            name=self.name,
-            searchable_doc=self.searchable_doc,
-            char_name=self.char_name,
+    def close(self):
+        """End of the conversation: remove its speech file."""
+        self.temp_speech_file_path.unlink(missing_ok=True)
+
+    def clone(self, language: str = None, goal: str = None) -> "Character":
+        """New conversation with the same character (and an empty history)."""
+        character = Character.from_template(
+            self.template,
             language=language or self.language,
             goal=goal,
-            verbose=self.verbose,
-            temp_speech_file_path=self.temp_speech_file_path,
-            model=self.model,
+            history_token_budget=self.history_token_budget,
+            history_turns=self.history_turns,
         )
+        character.answer_cache = self.answer_cache
+        return character
@@ -0,0 +1,175 @@
+import asyncio
+from dataclasses import dataclass, field
+import logging
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from tellar.utils.token_utils import TokenCounter
+
+# Logger
+logger = logging.getLogger(__name__)
+
+# Role and separators of each message in the prompt
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_INSTRUCTIONS = """Update the summary of a conversation with its new lines.
+Keep names, facts, promises and open questions, drop small talk.
+Write at most {max_words} words, in the language of the conversation.
+Reply with the updated summary only."""
+
+
+@dataclass
+class HistoryStats:
+    # History tokens sent with each turn
+    turn_tokens: list = field(default_factory=list)
+    summarizations: int = 0
+    summarized_turns: int = 0
+
+    @property
+    def max_turn_tokens(self) -> int:
+        return max(self.turn_tokens, default=0)
+
+
+class ChatHistory:
+    """Conversation history sent to the model, kept within a token budget.
+
+    The last turns are kept verbatim. When the history goes over budget, older
+    turns are folded into a running summary written by the model (or dropped
+    when there is no model). add_turn() folds in the background, so replies do
+    not wait for the summary: wait_folded() before sending the next turn.
+    """
+
+    def __init__(
+        self,
+        model: BaseChatModel = None,
+        token_budget: int = 1500,
+        keep_turns: int = 4,
+        summary_tokens: int = None,
+        token_counter: TokenCounter = None,
+    ):
+        self.model = model
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.summary_tokens = summary_tokens or token_budget // 4
+        self.token_counter = token_counter or TokenCounter()
+        self.summary = None
+        self.stats = HistoryStats()
+        self.__turns = []
+        self.__folding = None
+
+    @property
+    def messages(self) -> list[BaseMessage]:
+        messages = []
+        if self.summary:
+            messages.append(
+                SystemMessage(content=f"Summary of the conversation so far: {self.summary}")
+            )
+        for turn in self.__turns:
+            messages.extend(turn)
+        return messages
+
+    @property
+    def tokens(self) -> int:
+        return sum(
+            self.token_counter.count(message.content) + MESSAGE_OVERHEAD_TOKENS
+            for message in self.messages
+        )
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def to_json(self):
+        return {
+            "summary": self.summary,
+            "turns": [[query.content, answer.content] for query, answer in self.__turns],
+        }
+
+    def restore(self, json: dict):
+        """Continue a conversation saved with to_json()."""
+        self.summary = json.get("summary")
+        self.__turns = [
+            (HumanMessage(content=query), AIMessage(content=answer))
+            for query, answer in json.get("turns", [])
+        ]
+
+    def record_turn_tokens(self) -> list[BaseMessage]:
+        """Messages to send with a new turn, counting their tokens."""
+        self.stats.turn_tokens.append(self.tokens)
+        return self.messages
+
+    def add_turn(self, query: str, answer: str):
+        """Add a turn, folding the history in the background when over budget (in the running event loop)."""
+        self.__turns.append((HumanMessage(content=query), AIMessage(content=answer)))
+        if self.__folding is None and self.tokens > self.token_budget:
+            self.__folding = asyncio.create_task(self.__fold())
+
+    async def aadd_turn(self, query: str, answer: str):
+        self.add_turn(query, answer)
+        await self.wait_folded()
+
+    async def wait_folded(self):
+        """Wait for the history to be within budget again."""
+        while self.__folding is not None:
+            # Shielded: a cancelled turn does not lose the summary
+            await asyncio.shield(self.__folding)
+
+    async def __fold(self):
+        try:
+            # Turns added meanwhile are folded in the next round
+            while self.tokens > self.token_budget and await self.__fold_once():
+                pass
+        finally:
+            self.__folding = None
+
+    async def __fold_once(self) -> bool:
+        # Fold every turn but the last ones (at least one turn is kept)
+        count = max(len(self.__turns) - self.keep_turns, 0)
+        while count < len(self.__turns) - 1 and self.__tokens_without(count) > self.token_budget:
+            count += 1
+        if count == 0:
+            return False
+        folded = self.__turns[:count]
+        summary = self.summary
+        try:
+            summary = await self.__summarize(folded)
+        except Exception as e:
+            # Losing old turns beats breaking the conversation
+            logger.warning(f"Could not summarize the conversation: {e}")
+        # Swapped at once: the history is complete while the summary is written
+        self.summary, self.__turns = summary, self.__turns[count:]
+        self.stats.summarizations += 1
+        self.stats.summarized_turns += count
+        logger.debug(f"Folded {count} turns into a {self.token_counter.count(self.summary or '')} tokens summary")
+        return True
+
+    def __tokens_without(self, count: int) -> int:
+        # Estimate, the summary being at most summary_tokens long
+        return self.summary_tokens + sum(
+            self.token_counter.count(message.content) + MESSAGE_OVERHEAD_TOKENS
+            for turn in self.__turns[count:]
+            for message in turn
+        )
+
+    async def __summarize(self, turns: list) -> str:
+        if self.model is None:
+            return self.summary
+        lines = "\n".join(
+            f"{'User' if isinstance(message, HumanMessage) else 'You'}: {message.content}"
+            for turn in turns
+            for message in turn
+        )
+        response = await self.model.ainvoke(
+            [
+                SystemMessage(
+                    content=SUMMARY_INSTRUCTIONS.format(
+                        # About 3 words for 4 tokens
+                        max_words=self.summary_tokens * 3 // 4
+                    )
+                ),
+                HumanMessage(
+                    content=f"Current summary: {self.summary or '(none)'}\n\nNew lines:\n{lines}"
+                ),
+            ]
+        )
+        # The model may not keep to the length asked
+        return self.token_counter.truncate(response.content, self.summary_tokens)
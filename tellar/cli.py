@@ -1,15 +1,23 @@
 import asyncio
 import logging
+import aiofiles
 import click
 import os
 from colorama import Fore, Style
 import pyfiglet
+import tempfile
 import uvicorn
 
-from tellar.character import Character
+from tellar.answer_cache import AnswerCache
+from tellar.character import Answer, AnswerDelta, Character
+from tellar.embeddings import EMBEDDINGS_BACKENDS
+from tellar.indexer import build_indexes, build_library, find_pdfs
+from tellar.library import Library
 from tellar.server.client import Client
 from tellar.server.server import Server
-from tellar.searchable_document import SearchableDocument
+from tellar.server.sessions import SessionManager
+from tellar.searchable_document import SEARCH_MODES
+from tellar.utils.openai_client import OpenAIClientPool
 
  # Configure logging
 stream_handler = logging.StreamHandler()
@@ -26,9 +34,41 @@ console_formatter = uvicorn.logging.ColourizedFormatter(
 stream_handler.setFormatter(console_formatter)
 
 
-@click.command()
+class DefaultCommandGroup(click.Group):
+    """Group running its default command when no command name is given: `tellar -c ... -p ...`."""
+
+    def __init__(self, *args, default_command: str = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.default_command = default_command
+
+    def parse_args(self, ctx, args):
+        if args and args[0] not in self.commands and args[0] != "--help":
+            args = [self.default_command] + list(args)
+        return super().parse_args(ctx, args)
+
+
+@click.group(cls=DefaultCommandGroup, default_command="chat")
+def cli():
+    """Talk to your favorite fictional characters."""
+
+
+@cli.command()
 @click.option("--character", "-c", type=str, required=True, help="character name")
-@click.option("--pdf", "-p", type=str, required=True, help="book PDF file path")
+@click.option(
+    "--pdf",
+    "-p",
+    type=str,
+    required=True,
+    multiple=True,
+    help="book PDF file path (repeat it to index a series as one library)",
+)
+@click.option(
+    "--book",
+    "-b",
+    type=str,
+    multiple=True,
+    help="only search these books of the library (PDF file names)",
+)
 @click.option(
     "--language",
     "-l",
@@ -53,7 +93,71 @@ stream_handler.setFormatter(console_formatter)
     default=False,
 )
 @click.option("--auto", "-a", help="auto mode: look for another tellar on the network and engage in conversation", is_flag=True, show_default=True, default=False)
-def cli(character: str, pdf: str, language: str, debug: bool, voice: bool, serve: bool, auto: bool):
+@click.option(
+    "--search-mode",
+    type=click.Choice(SEARCH_MODES),
+    default="vector",
+    help="book search: embeddings (vector), keywords (lexical) or both (hybrid)",
+    show_default=True,
+)
+@click.option(
+    "--progressive",
+    help="start right away, searching the book while it is being indexed",
+    is_flag=True,
+    show_default=True,
+    default=False,
+)
+@click.option(
+    "--embeddings",
+    type=click.Choice(EMBEDDINGS_BACKENDS),
+    default="openai",
+    help="embeddings backend: OpenAI API or local hashing (offline, faster, less accurate)",
+    show_default=True,
+)
+@click.option(
+    "--answer-cache",
+    help="reuse answers to similar conversation openers (semantic cache)",
+    is_flag=True,
+    show_default=True,
+    default=False,
+)
+@click.option(
+    "--openai-concurrency",
+    type=click.IntRange(min=1),
+    default=4,
+    help="image and speech requests sent to OpenAI at the same time",
+    show_default=True,
+)
+@click.option(
+    "--openai-timeout",
+    type=click.FloatRange(min=0, min_open=True),
+    default=60.0,
+    help="timeout of image and speech requests (seconds)",
+    show_default=True,
+)
+@click.option(
+    "--max-sessions",
+    type=click.IntRange(min=1),
+    default=1000,
+    help="server mode: conversations kept in memory (least recently used ones are evicted)",
+    show_default=True,
+)
+@click.option(
+    "--session-ttl",
+    type=click.FloatRange(min=0, min_open=True),
+    default=3600.0,
+    help="server mode: idle time after which a conversation leaves memory (seconds)",
+    show_default=True,
+)
+@click.option(
+    "--persist-sessions",
+    help="server mode: save conversations leaving memory, and restore them when their sender comes back",
+    is_flag=True,
+    show_default=True,
+    default=False,
+)
+def chat(character: str, pdf: tuple[str], book: tuple[str], language: str, debug: bool, voice: bool, serve: bool, auto: bool, search_mode: str, progressive: bool, embeddings: str, answer_cache: bool, openai_concurrency: int, openai_timeout: float, max_sessions: int, session_ttl: float, persist_sessions: bool):
+    """Chat with a character (default command)."""
     print("Reading book... Please wait")
 
     # Check OpenAI API key
@@ -65,13 +169,21 @@ def cli(character: str, pdf: str, language: str, debug: bool, voice: bool, serve
         )
         exit(1)
 
-    # Check that the PDF file exists
-    if not os.path.isfile(pdf):
-        print(Fore.RED + "PDF file not found." + Style.RESET_ALL)
-        exit(1)
+    # Check that the PDF files exist
+    for path in pdf:
+        if not os.path.isfile(path):
+            print(Fore.RED + "PDF file not found." + Style.RESET_ALL)
+            exit(1)
 
-    # Create searchable document
-    searchable_doc = SearchableDocument(pdf)
+    # Create searchable document: a library view, even of a single book, so that --book is checked
+    library = Library.open(
+        pdf, search_mode=search_mode, progressive=progressive, embeddings=embeddings
+    )
+    try:
+        searchable_doc = library.view(books=list(book) or None)
+    except ValueError as e:
+        print(Fore.RED + str(e) + Style.RESET_ALL)
+        exit(1)
 
     print(pyfiglet.figlet_format(character))
     
@@ -82,6 +194,8 @@ def cli(character: str, pdf: str, language: str, debug: bool, voice: bool, serve
         char_name=character,
         language=language,
         verbose=debug,
+        answer_cache=AnswerCache() if answer_cache else None,
+        openai_pool=OpenAIClientPool(max_concurrency=openai_concurrency, timeout=openai_timeout),
     )
 
     # Auto mode does not work with server mode enabled
@@ -96,36 +210,137 @@ def cli(character: str, pdf: str, language: str, debug: bool, voice: bool, serve
     # Start
     if serve:
         # Server mode
-        __server_mode(char)
+        sessions = SessionManager(
+            char, max_sessions=max_sessions, idle_ttl=session_ttl, persist=persist_sessions
+        )
+        __server_mode(char, sessions)
     else:
         # Interactive mode
         __interactive_mode(char, voice)
         
         
+@cli.command()
+@click.argument("paths", nargs=-1, required=True, type=click.Path(exists=True))
+@click.option("--jobs", "-j", type=int, default=2, help="books indexed in parallel", show_default=True)
+@click.option(
+    "--embeddings",
+    type=click.Choice(EMBEDDINGS_BACKENDS),
+    default="openai",
+    help="embeddings backend (use the one of the chat command)",
+    show_default=True,
+)
+@click.option(
+    "--library",
+    is_flag=True,
+    default=False,
+    help="index the books together, as one library (chat with several --pdf, given in the same order)",
+)
+def index(paths: tuple[str], jobs: int, embeddings: str, library: bool):
+    """Build the indexes of books (PDF files or directories of PDF files)."""
+    if embeddings == "openai" and os.getenv("OPENAI_API_KEY") is None:
+        print(
+            Fore.RED
+            + "Please set the OPENAI_API_KEY environment variable."
+            + Style.RESET_ALL
+        )
+        exit(1)
+
+    pdf_paths = find_pdfs(paths)
+    if not pdf_paths:
+        print(Fore.RED + "No PDF file found." + Style.RESET_ALL)
+        exit(1)
+
+    if library:
+        print(f"Indexing a library of {len(pdf_paths)} books...")
+        reports = [build_library(pdf_paths, embeddings=embeddings)]
+    else:
+        print(f"Indexing {len(pdf_paths)} books, {jobs} at a time...")
+        reports = build_indexes(
+            pdf_paths, jobs=jobs, embeddings=embeddings
+        )
+
+    print(f"{'book':<40}{'status':>8}{'time (s)':>10}{'pages':>8}{'chunks':>8}{'size (MB)':>11}")
+    for report in reports:
+        color = Fore.RED if report.status == "failed" else ""
+        print(
+            color
+            + f"{report.name[:39]:<40}{report.status:>8}{report.seconds:>10.1f}"
+            f"{report.pages:>8}{report.chunks:>8}{report.size / 1e6:>11.1f}"
+            + Style.RESET_ALL
+        )
+        if report.error is not None:
+            print(Fore.RED + f"  {report.error}" + Style.RESET_ALL)
+
+    if any(report.status == "failed" for report in reports):
+        exit(1)
+
+
 def __auto_mode(char: Character):
     client = Client(char)
     client.start()
 
-def __server_mode(char: Character):
-    server = Server(char)
+def __server_mode(char: Character, sessions: SessionManager = None):
+    server = Server(char, sessions=sessions)
     server.start()
 
 
-def __interactive_mode(char: Character, voice: bool):
+async def __stream_answer(char: Character, message: str, voice: bool = False) -> Answer:
+    # Print the answer as it is written (and speak it, sentence by sentence)
+    texts = asyncio.Queue()
+    speaking = asyncio.create_task(__speak_answer(char, texts)) if voice else None
+    streamed, answer = False, None
+    try:
+        async for item in char.astream(message):
+            if isinstance(item, AnswerDelta):
+                print(item.text, end="", flush=True)
+                texts.put_nowait(item.text)
+                streamed = True
+            else:
+                answer = item
+        if not streamed:
+            texts.put_nowait(answer.text or "")
+    finally:
+        texts.put_nowait(None)
+    print("" if streamed else answer.text)
+    if speaking is not None:
+        await speaking
+    return answer
+
+
+async def __speak_answer(char: Character, texts: asyncio.Queue):
+    async def pieces():
+        while (piece := await texts.get()) is not None:
+            yield piece
 
-    # Prompt loop
-    while True:
-        print(Style.BRIGHT + Fore.BLUE + "You > " + Style.RESET_ALL, end="")
-        message = input()
-        print(Style.BRIGHT + Fore.GREEN + char.name + " > " + Style.RESET_ALL, end="")
-        answer = asyncio.run(char.answer(message))
-        print(answer.text)
-        if answer.image is not None:
-            print(f"[{answer.image}]")
-        if voice:
-            speech_file_path = asyncio.run(char.speak(answer.text))
-            # Play the speech file
-            os.system(f"afplay {speech_file_path}")
+    # Play each sentence while the next ones are being synthesized, from a file removed once played
+    fd, path = tempfile.mkstemp(prefix="tellar-speech-", suffix=".mp3")
+    os.close(fd)
+    try:
+        async for audio in char.astream_speech(pieces()):
+            async with aiofiles.open(path, "wb") as file:
+                await file.write(audio)
+            await asyncio.to_thread(os.system, f"afplay {path}")
+    finally:
+        os.remove(path)
+
+
+async def __prompt_loop(char: Character, voice: bool):
+    # One event loop for the whole conversation: OpenAI connections are reused from one turn to the next
+    try:
+        while True:
+            print(Style.BRIGHT + Fore.BLUE + "You > " + Style.RESET_ALL, end="")
+            # Blocking: there is nothing else to run while waiting for the user
+            message = input()
+            print(Style.BRIGHT + Fore.GREEN + char.name + " > " + Style.RESET_ALL, end="")
+            answer = await __stream_answer(char, message, voice)
+            if answer.image is not None:
+                print(f"[{answer.image}]")
+    finally:
+        await char.openai_pool.aclose()
+
+
+def __interactive_mode(char: Character, voice: bool):
+    asyncio.run(__prompt_loop(char, voice))
 
 
 if __name__ == "__main__":
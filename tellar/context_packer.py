@@ -0,0 +1,108 @@
+from dataclasses import dataclass
+import logging
+from langchain_core.documents import Document
+
+from tellar.utils.text_utils import tokenize
+from tellar.utils.token_utils import TokenCounter
+
+# Logger
+logger = logging.getLogger(__name__)
+
+# Passages story_tool returned before packing (the default k of a search)
+BASELINE_PASSAGES = 4
+
+
+@dataclass
+class PackedContext:
+    text: str
+    tokens: int
+    raw_tokens: int
+    passages: int
+
+    @property
+    def saved_tokens(self) -> int:
+        return max(0, self.raw_tokens - self.tokens)
+
+
+@dataclass
+class PackingStats:
+    calls: int = 0
+    tokens: int = 0
+    saved_tokens: int = 0
+
+
+class ContextPacker:
+    """Turn retrieved passages into a compact prompt context fitting a token budget.
+
+    The default budget still fits the 4 passages of 1000 characters (about 250
+    tokens each) story_tool returned before packing: the saving comes from
+    metadata and duplicates, not from dropping passages.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 1100,
+        max_passages: int = 8,
+        similarity_threshold: float = 0.8,
+        min_passage_tokens: int = 32,
+        token_counter: TokenCounter = None,
+    ):
+        self.token_budget = token_budget
+        self.max_passages = max_passages
+        self.similarity_threshold = similarity_threshold
+        self.min_passage_tokens = min_passage_tokens
+        self.token_counter = token_counter or TokenCounter()
+        self.stats = PackingStats()
+
+    @staticmethod
+    def __shingles(text: str) -> set:
+        words = tokenize(text)
+        return {tuple(words[i : i + 3]) for i in range(max(1, len(words) - 2))}
+
+    def __is_duplicate(self, shingles: set, kept: list[set]) -> bool:
+        for other in kept:
+            overlap = len(shingles & other)
+            # Near identical, or (almost) contained in a passage already kept
+            if overlap >= self.similarity_threshold * min(len(shingles), len(other)):
+                return True
+        return False
+
+    def pack(self, docs: list[Document]) -> PackedContext:
+        """Deduplicate passages (kept in rank order) and fit them to the token budget."""
+        passages, kept_shingles = [], []
+        remaining = self.token_budget
+        for doc in docs:
+            text = " ".join(doc.page_content.split())
+            if not text:
+                continue
+            shingles = self.__shingles(text)
+            if self.__is_duplicate(shingles, kept_shingles):
+                continue
+            tokens = self.token_counter.count(text)
+            if passages:
+                # Passage separator
+                remaining -= 1
+            if tokens > remaining:
+                # Keep the beginning of the passage if enough room is left for it to be useful
+                if remaining >= self.min_passage_tokens:
+                    passages.append(self.token_counter.truncate(text, remaining))
+                break
+            passages.append(text)
+            kept_shingles.append(shingles)
+            remaining -= tokens
+
+        text = "\n\n".join(passages)
+        packed = PackedContext(
+            text=text,
+            tokens=self.token_counter.count(text),
+            # What the agent was given before: the stringified list of the first documents
+            raw_tokens=self.token_counter.count(str(docs[:BASELINE_PASSAGES])),
+            passages=len(passages),
+        )
+        self.stats.calls += 1
+        self.stats.tokens += packed.tokens
+        self.stats.saved_tokens += packed.saved_tokens
+        logger.debug(
+            f"Packed {len(docs)} passages into {packed.passages} ({packed.tokens} tokens, {packed.saved_tokens} saved)"
+        )
+        return packed
@@ -0,0 +1,162 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import hashlib
+from itertools import islice
+import logging
+import os
+import random
+import threading
+import time
+from typing import Iterable, Iterator
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+import numpy as np
+import openai
+
+from tellar.embedding_cache import EmbeddingCache
+
+# Logger
+logger = logging.getLogger(__name__)
+
+# Errors worth waiting for: the same batch is likely to succeed later
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+def embeddings_model_name(embeddings) -> str:
+    model = getattr(embeddings, "model", None)
+    return model if isinstance(model, str) else type(embeddings).__name__
+
+
+@dataclass
+class EmbedStats:
+    batches: int = 0
+    resumed_batches: int = 0
+    retries: int = 0
+    chunks: int = 0
+    cached_chunks: int = 0
+
+
+class BatchEmbedder:
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        batch_size: int = 64,
+        max_concurrency: int = 4,
+        max_retries: int = 6,
+        initial_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        checkpoint_path: str = None,
+        cache: EmbeddingCache = None,
+    ):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.checkpoint_path = checkpoint_path
+        self.cache = cache
+        self.model = embeddings_model_name(embeddings)
+        self.stats = EmbedStats()
+        self.__stats_lock = threading.Lock()
+
+    def embed(
+        self, chunks: Iterable[Document]
+    ) -> Iterator[tuple[list[Document], np.ndarray]]:
+        """Embed chunks batch by batch, yielding (batch, vectors) pairs in order."""
+        self.stats = EmbedStats()
+        if self.checkpoint_path is not None:
+            os.makedirs(self.checkpoint_path, exist_ok=True)
+
+        chunks = iter(chunks)
+        batches = iter(lambda: list(islice(chunks, self.batch_size)), [])
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            pending = deque()
+            for index, batch in enumerate(batches):
+                pending.append((batch, executor.submit(self.__embed_batch, index, batch)))
+                # Bound the number of batches in flight (and read ahead)
+                if len(pending) >= self.max_concurrency:
+                    yield self.__collect(pending.popleft())
+            while pending:
+                yield self.__collect(pending.popleft())
+
+    def clear_checkpoint(self):
+        if self.checkpoint_path is None or not os.path.isdir(self.checkpoint_path):
+            return
+        for name in os.listdir(self.checkpoint_path):
+            os.remove(os.path.join(self.checkpoint_path, name))
+        os.rmdir(self.checkpoint_path)
+
+    def __collect(self, item) -> tuple[list[Document], np.ndarray]:
+        batch, future = item
+        vectors = future.result()
+        self.stats.batches += 1
+        self.stats.chunks += len(batch)
+        return batch, vectors
+
+    def __batch_file(self, index: int, texts: list[str]) -> str:
+        # Batch content is part of the name: a checkpoint never resumes different chunks
+        digest = hashlib.sha256("\0".join(texts).encode()).hexdigest()[:16]
+        return os.path.join(self.checkpoint_path, f"{index:06d}-{digest}.npy")
+
+    def __embed_batch(self, index: int, batch: list[Document]) -> np.ndarray:
+        texts = [doc.page_content for doc in batch]
+
+        batch_file = None
+        if self.checkpoint_path is not None:
+            batch_file = self.__batch_file(index, texts)
+            if os.path.exists(batch_file):
+                with self.__stats_lock:
+                    self.stats.resumed_batches += 1
+                return np.load(batch_file)
+
+        vectors = self.__embed_uncached(texts)
+
+        if batch_file is not None:
+            tmp_file = f"{batch_file}.tmp"
+            with open(tmp_file, "wb") as f:
+                np.save(f, vectors)
+            os.replace(tmp_file, batch_file)
+        return vectors
+
+    def __embed_uncached(self, texts: list[str]) -> np.ndarray:
+        if self.cache is None:
+            return np.asarray(self.__embed_with_retry(texts), dtype=np.float32)
+
+        # Only chunks never embedded with this model reach the API
+        vectors = self.cache.get_many(self.model, texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            new_vectors = np.asarray(
+                self.__embed_with_retry(missing_texts), dtype=np.float32
+            )
+            self.cache.put_many(self.model, missing_texts, new_vectors)
+            for i, vector in zip(missing, new_vectors):
+                vectors[i] = vector
+        with self.__stats_lock:
+            self.stats.cached_chunks += len(texts) - len(missing)
+        return np.stack(vectors)
+
+    def __embed_with_retry(self, texts: list[str]) -> list[list[float]]:
+        attempt = 0
+        while True:
+            try:
+                return self.embeddings.embed_documents(texts)
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                # Exponential backoff with jitter, so concurrent batches do not retry in lockstep
+                delay = min(self.max_backoff, self.initial_backoff * 2**attempt)
+                delay *= random.uniform(0.5, 1.0)
+                logger.warning(f"Embedding failed ({e}), retrying in {delay:.1f}s")
+                with self.__stats_lock:
+                    self.stats.retries += 1
+                attempt += 1
+                time.sleep(delay)
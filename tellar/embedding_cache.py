@@ -0,0 +1,83 @@
+from dataclasses import dataclass
+import hashlib
+import os
+import sqlite3
+import threading
+import numpy as np
+
+# SQLite limits the number of bound parameters per statement
+_MAX_BATCH = 500
+
+
+@dataclass
+class EmbeddingCacheStats:
+    hits: int = 0
+    misses: int = 0
+
+
+class EmbeddingCache:
+    """On disk store of chunk embeddings, keyed by (embedding model, chunk text hash)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.stats = EmbeddingCacheStats()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self.__lock, self.__connection:
+            # WAL lets several processes read while one of them writes
+            self.__connection.execute("PRAGMA journal_mode=WAL")
+            self.__connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    text_hash BLOB NOT NULL,
+                    vector BLOB NOT NULL,
+                    PRIMARY KEY (model, text_hash)
+                ) WITHOUT ROWID
+                """
+            )
+
+    @staticmethod
+    def __hash(text: str) -> bytes:
+        return hashlib.sha256(text.encode()).digest()
+
+    def get_many(self, model: str, texts: list[str]) -> list[np.ndarray]:
+        """Return the cached vector of each text, or None when it is not cached."""
+        hashes = [self.__hash(text) for text in texts]
+        found = {}
+        with self.__lock:
+            for start in range(0, len(hashes), _MAX_BATCH):
+                batch = hashes[start : start + _MAX_BATCH]
+                rows = self.__connection.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                    [model, *batch],
+                )
+                found.update(rows)
+            vectors = [
+                np.frombuffer(found[h], dtype=np.float32) if h in found else None
+                for h in hashes
+            ]
+            hits = sum(v is not None for v in vectors)
+            self.stats.hits += hits
+            self.stats.misses += len(vectors) - hits
+        return vectors
+
+    def put_many(self, model: str, texts: list[str], vectors):
+        rows = [
+            (model, self.__hash(text), np.asarray(vector, dtype=np.float32).tobytes())
+            for text, vector in zip(texts, vectors)
+        ]
+        with self.__lock, self.__connection:
+            self.__connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                rows,
+            )
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return self.__connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self):
+        with self.__lock:
+            self.__connection.close()
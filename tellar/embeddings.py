@@ -0,0 +1,113 @@
+from functools import lru_cache
+import hashlib
+import logging
+import math
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+import numpy as np
+
+from tellar.utils.text_utils import tokenize
+
+# Logger
+logger = logging.getLogger(__name__)
+
+EMBEDDINGS_BACKENDS = ("openai", "hashing")
+
+def check_embeddings_backend(backend: str):
+    if backend not in EMBEDDINGS_BACKENDS:
+        raise ValueError(
+            f"Unknown embeddings backend {backend}, expected one of {', '.join(EMBEDDINGS_BACKENDS)}"
+        )
+
+
+def create_embeddings(backend: str = "openai") -> Embeddings:
+    check_embeddings_backend(backend)
+    if backend == "hashing":
+        return HashingEmbeddings()
+    return OpenAIEmbeddings()
+
+
+@lru_cache(maxsize=1 << 16)
+def _feature_hash(feature: str) -> int:
+    # Stable across processes (unlike hash()): indexes are persisted
+    return int.from_bytes(
+        hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little"
+    )
+
+
+class HashingEmbeddings(Embeddings):
+    """Local, stateless embeddings: hashed term frequencies projected to a dense vector.
+
+    Words and word bigrams are hashed into a huge sparse space, each feature
+    being projected on a few signed random dimensions (sparse random
+    projection, computed from the hash bits instead of stored). Term
+    frequencies are dampened (1 + log tf) and very short words down weighted,
+    a corpus free stand-in for IDF. Vectors are L2 normalized.
+    """
+
+    def __init__(self, dimension: int = 384, nonzeros: int = 4, bigrams: bool = True):
+        # Each projection takes its sign and dimension from its own slice of the
+        # 64 bit hash (at most 32 bits, handled as int64). The dimension is the
+        # rest of the slice modulo dimension: 6 bits more than the dimension
+        # needs keep the modulo bias under 1/64.
+        self.__bits = min(64 // max(nonzeros, 1), 32)
+        min_bits = math.ceil(math.log2(dimension)) + 1 + 6
+        if nonzeros < 1 or self.__bits < min_bits:
+            raise ValueError(f"nonzeros must be between 1 and {64 // min_bits}")
+        self.dimension = dimension
+        self.nonzeros = nonzeros
+        self.bigrams = bigrams
+        # Part of the index manifest: changing a setting rebuilds the index
+        self.model = f"hashing-d{dimension}-n{nonzeros}{'-bigrams' if bigrams else ''}-v2"
+
+    def __features(self, text: str) -> dict:
+        words = tokenize(text)
+        counts = {}
+        for word in words:
+            counts[word] = counts.get(word, 0) + 1
+        if self.bigrams:
+            for first, second in zip(words, words[1:]):
+                bigram = f"{first} {second}"
+                counts[bigram] = counts.get(bigram, 0) + 1
+        return counts
+
+    def __embed(self, texts: list[str]) -> np.ndarray:
+        rows, hashes, weights = [], [], []
+        for row, text in enumerate(texts):
+            for feature, count in self.__features(text).items():
+                rows.append(row)
+                hashes.append(_feature_hash(feature))
+                # Stop words are short: a cheap, corpus free IDF
+                weights.append((1 + math.log(count)) * min(1.0, len(feature) / 4))
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        if not hashes:
+            return vectors
+
+        rows = np.asarray(rows, dtype=np.int64)
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        weights = np.asarray(weights, dtype=np.float32)
+        for i in range(self.nonzeros):
+            bits = ((hashes >> np.uint64(self.__bits * i)) & np.uint64((1 << self.__bits) - 1)).astype(np.int64)
+            columns = (bits >> 1) % self.dimension
+            signs = np.where(bits & 1, 1.0, -1.0).astype(np.float32)
+            vectors += np.bincount(
+                rows * self.dimension + columns,
+                weights=signs * weights,
+                minlength=len(texts) * self.dimension,
+            ).reshape(len(texts), self.dimension).astype(np.float32)
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.__embed(texts).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.__embed([text])[0].tolist()
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        # Microseconds of CPU: cheaper than a hop to the thread pool
+        return self.embed_query(text)
@@ -0,0 +1,117 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import logging
+import os
+import time
+
+from tellar.embedding_cache import EmbeddingCache
+from tellar.searchable_document import SearchableDocument
+
+# Logger
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class IndexReport:
+    # The book, or the books of a library separated by os.pathsep
+    pdf_path: str
+    status: str
+    seconds: float
+    pages: int = 0
+    chunks: int = 0
+    size: int = 0
+    error: str = None
+
+    @property
+    def name(self) -> str:
+        return ", ".join(os.path.basename(path) for path in self.pdf_path.split(os.pathsep))
+
+    def to_json(self):
+        return {
+            "pdf_path": self.pdf_path,
+            "status": self.status,
+            "seconds": self.seconds,
+            "pages": self.pages,
+            "chunks": self.chunks,
+            "size": self.size,
+            "error": self.error,
+        }
+
+
+def find_pdfs(paths: list[str]) -> list[str]:
+    """Expand directories (recursively) into the PDF files they hold."""
+    pdf_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in sorted(os.walk(path)):
+                pdf_paths.extend(
+                    os.path.join(root, name)
+                    for name in sorted(files)
+                    if name.lower().endswith(".pdf")
+                )
+        else:
+            pdf_paths.append(path)
+    return pdf_paths
+
+
+def directory_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, files in os.walk(path)
+        for name in files
+    )
+
+
+def __index_book(pdf_path: str | list[str], **kwargs) -> IndexReport:
+    start = time.perf_counter()
+    if isinstance(pdf_path, list):
+        pdf_path, pdf_paths = os.pathsep.join(pdf_path), pdf_path
+    else:
+        pdf_paths = pdf_path
+    try:
+        doc = SearchableDocument(pdf_paths, **kwargs)
+    except Exception as e:
+        logger.error(f"Indexing {pdf_path} failed: {e}")
+        return IndexReport(pdf_path, "failed", time.perf_counter() - start, error=str(e))
+    return IndexReport(
+        pdf_path,
+        # Pages are only read when the index is built
+        "built" if doc.progress.total_pages > 0 else "cached",
+        time.perf_counter() - start,
+        pages=doc.progress.total_pages,
+        chunks=doc.chunk_count,
+        size=directory_size(doc.db_path),
+    )
+
+
+def __default_embedding_cache(kwargs: dict):
+    if "embedding_cache" not in kwargs:
+        kwargs["embedding_cache"] = EmbeddingCache(
+            os.path.join(os.path.expanduser("~"), ".tellar", "embeddings.sqlite")
+        )
+
+
+def build_library(pdf_paths: list[str], **kwargs) -> IndexReport:
+    """Build (or check) the shared index of a library, the one of Library.open(pdf_paths).
+
+    Books are given in the order of the chat command: the index depends on it.
+    """
+    __default_embedding_cache(kwargs)
+    return __index_book(list(pdf_paths), **kwargs)
+
+
+def build_indexes(pdf_paths: list[str], jobs: int = 2, **kwargs) -> list[IndexReport]:
+    """Build (or check) the index of each book, a few books at a time.
+
+    Books share one embedding cache, reports are returned in the order of pdf_paths.
+    """
+    __default_embedding_cache(kwargs)
+    # Books are mostly waiting for embeddings and reading PDFs in their own
+    # process pools: threads are enough to overlap them, the processes are shared out
+    if "workers" not in kwargs:
+        kwargs["workers"] = max(1, (os.cpu_count() or 1) // max(1, jobs))
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = [
+            executor.submit(__index_book, pdf_path, **kwargs) for pdf_path in pdf_paths
+        ]
+        return [future.result() for future in futures]
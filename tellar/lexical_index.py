@@ -0,0 +1,106 @@
+from collections import Counter
+import pickle
+import numpy as np
+
+from tellar.utils.text_utils import tokenize
+
+
+class LexicalIndex:
+    """BM25 inverted index over the chunks of a book.
+
+    Postings are packed in flat arrays (CSR layout) holding precomputed BM25
+    term weights: a query only sums a few array slices.
+    """
+
+    def __init__(
+        self,
+        vocabulary: dict,
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        weights: np.ndarray,
+        idf: np.ndarray,
+        doc_count: int,
+    ):
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.idf = idf
+        self.doc_count = doc_count
+
+    @classmethod
+    def build(cls, texts: list[str], k1: float = 1.5, b: float = 0.75):
+        counts = [Counter(tokenize(text)) for text in texts]
+        vocabulary = {}
+        term_ids = np.fromiter(
+            (vocabulary.setdefault(term, len(vocabulary)) for c in counts for term in c),
+            dtype=np.int64,
+        )
+        tfs = np.fromiter((tf for c in counts for tf in c.values()), dtype=np.float32)
+        doc_ids = np.repeat(
+            np.arange(len(counts), dtype=np.int32), [len(c) for c in counts]
+        )
+        lengths = np.array([sum(c.values()) for c in counts], dtype=np.float32)
+        average_length = max(float(lengths.mean()), 1.0) if len(texts) > 0 else 1.0
+
+        # Group postings by term (doc order is kept inside each term)
+        order = np.argsort(term_ids, kind="stable")
+        term_ids, doc_ids, tfs = term_ids[order], doc_ids[order], tfs[order]
+        doc_frequencies = np.bincount(term_ids, minlength=len(vocabulary))
+        offsets = np.concatenate([[0], np.cumsum(doc_frequencies)]).astype(np.int64)
+        idf = np.log(
+            1 + (len(texts) - doc_frequencies + 0.5) / (doc_frequencies + 0.5)
+        ).astype(np.float32)
+        norms = k1 * (1 - b + b * lengths[doc_ids] / average_length)
+        weights = (tfs * (k1 + 1) / (tfs + norms)).astype(np.float32)
+
+        return cls(vocabulary, offsets, doc_ids, weights, idf, len(texts))
+
+    def search(
+        self, query: str, k: int = 4, positions: np.ndarray = None
+    ) -> list[tuple[int, float]]:
+        """Return up to k (chunk position, BM25 score) pairs, best first.
+
+        When positions are given, only chunks at these positions are considered.
+        """
+        term_ids = {
+            self.vocabulary[term] for term in tokenize(query) if term in self.vocabulary
+        }
+        if not term_ids:
+            return []
+        scores = np.zeros(self.doc_count, dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            # Doc ids are unique within a posting list: plain fancy indexing is enough
+            scores[self.doc_ids[start:end]] += self.idf[term_id] * self.weights[start:end]
+        if positions is not None:
+            mask = np.zeros(self.doc_count, dtype=bool)
+            mask[positions] = True
+            scores[~mask] = 0
+
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(int(i), float(scores[i])) for i in best]
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            pickle.dump(
+                (
+                    self.vocabulary,
+                    self.offsets,
+                    self.doc_ids,
+                    self.weights,
+                    self.idf,
+                    self.doc_count,
+                ),
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path, "rb") as f:
+            return cls(*pickle.load(f))
@@ -0,0 +1,86 @@
+import logging
+import os
+import threading
+
+from tellar.searchable_document import SearchableDocument, SearchFilter
+
+# Logger
+logger = logging.getLogger(__name__)
+
+
+class LibraryView:
+    """A filtered window on a library, usable wherever a SearchableDocument is expected."""
+
+    def __init__(self, document: SearchableDocument, filter: SearchFilter = None):
+        self.document = document
+        self.filter = filter
+
+    @property
+    def progress(self):
+        return self.document.progress
+
+    @property
+    def manifest(self):
+        return self.document.manifest
+
+    def wait_until_ready(self, timeout: float = None) -> bool:
+        return self.document.wait_until_ready(timeout)
+
+    def search(self, query: str, k: int = 4, mode: str = None):
+        return self.document.search(query, k=k, mode=mode, filter=self.filter)
+
+    async def asearch(self, query: str, k: int = 4, mode: str = None):
+        return await self.document.asearch(query, k=k, mode=mode, filter=self.filter)
+
+
+class Library:
+    """Several books indexed into one shared store, loaded once per process.
+
+    Characters from the same universe get filtered views of the library instead
+    of one index (and one copy of it in memory) each.
+    """
+
+    __libraries = {}
+    __lock = threading.Lock()
+
+    def __init__(self, pdf_paths: list[str], **kwargs):
+        self.pdf_paths = list(pdf_paths)
+        self.books = [os.path.basename(path) for path in self.pdf_paths]
+        self.document = SearchableDocument(self.pdf_paths, **kwargs)
+
+    @classmethod
+    def open(cls, pdf_paths: list[str], **kwargs) -> "Library":
+        """Return the library of these books, indexing or loading it on first use only."""
+        # Options can hold unhashable values (separators list...)
+        key = (
+            tuple(os.path.abspath(path) for path in pdf_paths),
+            repr(sorted(kwargs.items())),
+        )
+        with cls.__lock:
+            library = cls.__libraries.get(key)
+            if library is None:
+                logger.info(f"Opening library of {len(pdf_paths)} books")
+                library = cls(pdf_paths, **kwargs)
+                cls.__libraries[key] = library
+            return library
+
+    @classmethod
+    def close_all(cls):
+        with cls.__lock:
+            cls.__libraries.clear()
+
+    def view(self, books: list[str] = None, pages: tuple[int, int] = None) -> LibraryView:
+        """Restrict searches to some books (file names) and/or a [start, end) page range."""
+        if books is not None:
+            unknown = set(books) - set(self.books)
+            if unknown:
+                raise ValueError(f"Unknown books: {', '.join(sorted(unknown))}")
+        if books is None and pages is None:
+            return LibraryView(self.document)
+        return LibraryView(
+            self.document,
+            SearchFilter(
+                books=tuple(books) if books is not None else None,
+                pages=tuple(pages) if pages is not None else None,
+            ),
+        )
@@ -1,38 +1,453 @@
 from ast import List
+import asyncio
+from dataclasses import asdict, dataclass, field
+import hashlib
+import json
 import os
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_openai import OpenAIEmbeddings
+import shutil
+import threading
+import logging
+import numpy as np
+from langchain_core.embeddings import Embeddings
 from langchain_community.vectorstores import FAISS
 from os.path import exists
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_core.retrievers import BaseRetriever
+
+from tellar.book_reader import BookReader
+from tellar.embedder import BatchEmbedder, embeddings_model_name
+from tellar.embedding_cache import EmbeddingCache
+from tellar.embeddings import create_embeddings
+from tellar.lexical_index import LexicalIndex
+from tellar.utils.lru_cache import LRUCache
+from tellar.utils.text_utils import normalize_query
+from tellar.vector_index import (
+    build_vector_store,
+    check_index_type,
+    filtered_search,
+    load_vector_store,
+)
+
+# Logger
+logger = logging.getLogger(__name__)
+
+# Bump when the on-disk index layout changes: older indexes are then rebuilt
+INDEX_VERSION = 3
+
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+
+# Reciprocal rank fusion constant: dampens the weight of the very first ranks
+RRF_K = 60
+
+
+@dataclass
+class IndexManifest:
+    content_hash: str
+    embedding_model: str
+    chunk_size: int = 1000
+    chunk_overlap: int = 0
+    separators: list = field(default_factory=lambda: [" ", ",", "\n"])
+    index_type: str = "flat"
+    version: int = INDEX_VERSION
+    source: str = None
+
+    @property
+    def key(self) -> str:
+        # Source name is informative only: same content under another name shares the index
+        settings = self.to_json()
+        settings.pop("source")
+        return hashlib.sha256(
+            json.dumps(settings, sort_keys=True).encode()
+        ).hexdigest()
+
+    def to_json(self):
+        return asdict(self)
+
+    @classmethod
+    def from_json(cls, json: dict):
+        return cls(**json)
+
+
+@dataclass(frozen=True)
+class SearchFilter:
+    """Restrict a search to some books (file names) and/or a [start, end) page range."""
+
+    books: tuple = None
+    pages: tuple = None
+
+    def matches(self, metadata: dict) -> bool:
+        if self.books is not None and metadata.get("book") not in self.books:
+            return False
+        if self.pages is not None:
+            start, end = self.pages
+            if not start <= metadata.get("page", -1) < end:
+                return False
+        return True
+
+
+@dataclass
+class IndexingProgress:
+    total_pages: int = 0
+    indexed_pages: int = 0
+    chunks: int = 0
+    ready: bool = False
+    error: str = None
+
+    @property
+    def ratio(self) -> float:
+        if self.ready:
+            return 1.0
+        return self.indexed_pages / self.total_pages if self.total_pages else 0.0
+
+    def to_json(self):
+        return {
+            "ready": self.ready,
+            "progress": self.ratio,
+            "indexed_pages": self.indexed_pages,
+            "total_pages": self.total_pages,
+            "chunks": self.chunks,
+            "error": self.error,
+        }
+
+
+def check_search_mode(mode: str):
+    if mode not in SEARCH_MODES:
+        raise ValueError(
+            f"Unknown search mode: {mode} (expected one of {', '.join(SEARCH_MODES)})"
+        )
+
+
+def hash_file(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_files(paths: list[str]) -> str:
+    if len(paths) == 1:
+        return hash_file(paths[0])
+    # Book order matters: it is the order of the chunks in the index
+    return hashlib.sha256("".join(hash_file(p) for p in paths).encode()).hexdigest()
+
 
 class SearchableDocument:
-    def __init__(self, pdf_path: str):
+    def __init__(
+        self,
+        pdf_path: str | list[str],
+        chunk_size: int = 1000,
+        chunk_overlap: int = 0,
+        separators: list = None,
+        workers: int = None,
+        batch_size: int = 64,
+        max_concurrency: int = 4,
+        embedding_cache: EmbeddingCache = None,
+        index_type: str = "flat",
+        mmap: bool = False,
+        cache_size: int = 1024,
+        cache_ttl: float = 3600,
+        search_mode: str = "vector",
+        progressive: bool = False,
+        embeddings: Embeddings | str = "openai",
+    ):
+        check_index_type(index_type)
+        check_search_mode(search_mode)
+        self.search_mode = search_mode
         home_dir = os.path.expanduser("~")
         self.__user_data_path = os.path.join(home_dir, ".tellar")
-        self.__vector_db = self.__get_vector_db(pdf_path)
-        self.__retriever = self.__vector_db.as_retriever()
-        
-    def __get_vector_db(self, pdf_path: str) -> FAISS:
-        pdf_name = os.path.basename(pdf_path)
-        db_path = os.path.join(self.__user_data_path, "db", pdf_name)
-
-        embeddings = OpenAIEmbeddings()
-        if exists(db_path):
-            vectordb = FAISS.load_local(
-                db_path, embeddings, allow_dangerous_deserialization=True
+        # A backend name (see EMBEDDINGS_BACKENDS) or any langchain embeddings
+        self.__embeddings = (
+            create_embeddings(embeddings) if isinstance(embeddings, str) else embeddings
+        )
+        self.__workers = workers
+        self.__batch_size = batch_size
+        self.__max_concurrency = max_concurrency
+        self.__embedding_cache = embedding_cache
+        self.__mmap = mmap
+        self.__lexical_index = None
+        self.__lexical_lock = threading.Lock()
+        # Several books can share one index: their chunks are tagged with their book name
+        self.pdf_paths = [pdf_path] if isinstance(pdf_path, str) else list(pdf_path)
+        self.manifest = IndexManifest(
+            content_hash=hash_files(self.pdf_paths),
+            embedding_model=embeddings_model_name(self.__embeddings),
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            separators=separators or [" ", ",", "\n"],
+            index_type=index_type,
+            source=", ".join(os.path.basename(p) for p in self.pdf_paths),
+        )
+        # Characters cloned from one another share this document, hence these caches
+        self.__embedding_lru = LRUCache(max_size=cache_size, ttl=cache_ttl)
+        self.__results_lru = LRUCache(max_size=cache_size, ttl=cache_ttl)
+        self.progress = IndexingProgress()
+        self.__vector_db = None
+        self.__vector_db_lock = threading.Lock()
+        self.__indexing_thread = None
+        self.__positions_lru = LRUCache(max_size=64)
+
+        if progressive and not self.__is_indexed():
+            # Serve searches over the pages indexed so far while the book is read
+            self.__indexing_thread = threading.Thread(
+                target=self.__index_in_background, daemon=True
             )
-        else:
-            loader = PyPDFLoader(pdf_path)
-            pages = loader.load_and_split(
-                text_splitter=RecursiveCharacterTextSplitter(
-                    chunk_size=1000, chunk_overlap=0, separators=[" ", ",", "\n"]
+            self.__indexing_thread.start()
+            return
+
+        self.__vector_db = self.__get_vector_db()
+        self.progress.ready = True
+        if search_mode != "vector":
+            self.__get_lexical_index()
+
+    @property
+    def db_path(self) -> str:
+        return os.path.join(self.__user_data_path, "db", self.manifest.key)
+
+    def __read_manifest(self, db_path: str) -> IndexManifest:
+        manifest_path = os.path.join(db_path, "manifest.json")
+        if not exists(manifest_path):
+            return None
+        try:
+            with open(manifest_path) as f:
+                return IndexManifest.from_json(json.load(f))
+        except (ValueError, TypeError):
+            return None
+
+    def __is_indexed(self) -> bool:
+        manifest = self.__read_manifest(self.db_path)
+        return manifest is not None and manifest.key == self.manifest.key
+
+    def wait_until_ready(self, timeout: float = None) -> bool:
+        if self.__indexing_thread is not None:
+            self.__indexing_thread.join(timeout)
+        return self.progress.ready
+
+    def __index_in_background(self):
+        try:
+            vector_db = self.__get_vector_db(on_batch=self.__add_partial)
+        except Exception as e:
+            logger.error(f"Indexing failed: {e}")
+            self.progress.error = str(e)
+            return
+        # Swap the partial index for the complete one
+        with self.__vector_db_lock:
+            self.__vector_db = vector_db
+            self.progress.ready = True
+        self.__results_lru.clear()
+        logger.info(f"Indexing done: {self.progress.chunks} chunks")
+
+    def __add_partial(self, batch: list, vectors: np.ndarray):
+        texts = [doc.page_content for doc in batch]
+        metadatas = [doc.metadata for doc in batch]
+        with self.__vector_db_lock:
+            if self.__vector_db is None:
+                self.__vector_db = build_vector_store(
+                    texts, vectors, metadatas, self.__embeddings
                 )
+            else:
+                self.__vector_db.add_embeddings(zip(texts, vectors), metadatas)
+
+    def __read_chunks(self, readers: list[BookReader]):
+        for pdf_path, reader in zip(self.pdf_paths, readers):
+            book = os.path.basename(pdf_path)
+            for chunk in reader.chunks():
+                chunk.metadata["book"] = book
+                yield chunk
+
+    def __get_vector_db(self, on_batch=None) -> FAISS:
+        db_path = self.db_path
+
+        if self.__is_indexed():
+            return load_vector_store(db_path, self.__embeddings, mmap=self.__mmap)
+
+        readers = [
+            BookReader(
+                pdf_path,
+                chunk_size=self.manifest.chunk_size,
+                chunk_overlap=self.manifest.chunk_overlap,
+                separators=self.manifest.separators,
+                workers=self.__workers,
             )
-            vectordb = FAISS.from_documents(pages, embeddings)
-            vectordb.save_local(db_path)
+            for pdf_path in self.pdf_paths
+        ]
+        # Shared by all books: rebuilds only pay for chunks never embedded before
+        if self.__embedding_cache is None:
+            self.__embedding_cache = EmbeddingCache(
+                os.path.join(self.__user_data_path, "embeddings.sqlite")
+            )
+
+        # Completed batches are checkpointed: an interrupted build resumes from there
+        embedder = BatchEmbedder(
+            self.__embeddings,
+            batch_size=self.__batch_size,
+            max_concurrency=self.__max_concurrency,
+            checkpoint_path=f"{db_path}.partial",
+            cache=self.__embedding_cache,
+        )
+        self.progress.total_pages = sum(reader.page_count for reader in readers)
+        pages_read = {}
+        texts, vectors, metadatas = [], [], []
+        for batch, batch_vectors in embedder.embed(self.__read_chunks(readers)):
+            texts.extend(doc.page_content for doc in batch)
+            metadatas.extend(doc.metadata for doc in batch)
+            vectors.append(batch_vectors)
+            if on_batch is not None:
+                on_batch(batch, batch_vectors)
+            self.progress.chunks += len(batch)
+            for doc in batch:
+                book = doc.metadata.get("book")
+                pages_read[book] = max(pages_read.get(book, 0), doc.metadata.get("page", -1) + 1)
+            self.progress.indexed_pages = sum(pages_read.values())
+        self.__lexical_index = LexicalIndex.build(texts)
+        vectordb = build_vector_store(
+            texts,
+            np.concatenate(vectors),
+            metadatas,
+            self.__embeddings,
+            index_type=self.manifest.index_type,
+        )
+        self.__save(vectordb, db_path)
+        embedder.clear_checkpoint()
         return vectordb
-    
-    def search(self, query: str):
-        return self.__retriever.invoke(query)
\ No newline at end of file
+
+    def __save(self, vectordb: FAISS, db_path: str):
+        # Build into a private directory, then move it in place:
+        # other processes never see a half written index
+        tmp_path = f"{db_path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        vectordb.save_local(tmp_path)
+        self.__lexical_index.save(os.path.join(tmp_path, "lexical.pkl"))
+        with open(os.path.join(tmp_path, "manifest.json"), "w") as f:
+            json.dump(self.manifest.to_json(), f, indent=2)
+        shutil.rmtree(db_path, ignore_errors=True)
+        try:
+            os.replace(tmp_path, db_path)
+        except OSError:
+            # Another process published the same index first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    @property
+    def chunk_count(self) -> int:
+        with self.__vector_db_lock:
+            if self.__vector_db is None:
+                return 0
+            return len(self.__vector_db.index_to_docstore_id)
+
+    @property
+    def cache_stats(self) -> dict:
+        return {
+            "embeddings": self.__embedding_lru.stats.to_json(),
+            "results": self.__results_lru.stats.to_json(),
+        }
+
+    def __positions(self, vector_db: FAISS, filter: SearchFilter) -> np.ndarray:
+        """Index positions of the chunks matching a filter (cached once the index is complete)."""
+        positions = self.__positions_lru.get(filter) if self.progress.ready else None
+        if positions is None:
+            docstore, ids = vector_db.docstore, vector_db.index_to_docstore_id
+            positions = np.fromiter(
+                (i for i in range(len(ids)) if filter.matches(docstore.search(ids[i]).metadata)),
+                dtype=np.int64,
+            )
+            if self.progress.ready:
+                self.__positions_lru.put(filter, positions)
+        return positions
+
+    def __vector_search(self, vector_db: FAISS, embedding, k: int, filter: SearchFilter):
+        if filter is None:
+            return vector_db.similarity_search_by_vector(embedding, k)
+        return filtered_search(vector_db, embedding, k, self.__positions(vector_db, filter))
+
+    def __search_by_vector(self, embedding, k: int, filter: SearchFilter = None):
+        if not self.progress.ready:
+            # Partial index: it grows under our feet, do not cache its results
+            with self.__vector_db_lock:
+                if self.__vector_db is None:
+                    return []
+                return self.__vector_search(self.__vector_db, embedding, k, filter)
+
+        key = (np.asarray(embedding, dtype=np.float32).tobytes(), k, filter)
+        docs = self.__results_lru.get(key)
+        if docs is None:
+            docs = self.__vector_search(self.__vector_db, embedding, k, filter)
+            self.__results_lru.put(key, docs)
+        return list(docs)
+
+    def __get_lexical_index(self) -> LexicalIndex:
+        with self.__lexical_lock:
+            if self.__lexical_index is None:
+                lexical_path = os.path.join(self.db_path, "lexical.pkl")
+                if exists(lexical_path):
+                    self.__lexical_index = LexicalIndex.load(lexical_path)
+                else:
+                    vector_db = self.__vector_db
+                    self.__lexical_index = LexicalIndex.build(
+                        [
+                            vector_db.docstore.search(vector_db.index_to_docstore_id[i]).page_content
+                            for i in range(len(vector_db.index_to_docstore_id))
+                        ]
+                    )
+            return self.__lexical_index
+
+    def __search_lexical(self, query: str, k: int, filter: SearchFilter = None):
+        vector_db = self.__vector_db
+        positions = self.__positions(vector_db, filter) if filter is not None else None
+        return [
+            vector_db.docstore.search(vector_db.index_to_docstore_id[i])
+            for i, _ in self.__get_lexical_index().search(query, k, positions=positions)
+        ]
+
+    def __search_by_embedding(
+        self, query: str, embedding, k: int, mode: str, filter: SearchFilter = None
+    ):
+        if mode == "vector":
+            return self.__search_by_vector(embedding, k, filter)
+        # Hybrid: fuse both rankings (reciprocal rank fusion), over a wider pool of candidates
+        scores, docs = {}, {}
+        for ranking in (
+            self.__search_by_vector(embedding, 2 * k, filter),
+            self.__search_lexical(query, 2 * k, filter),
+        ):
+            for rank, doc in enumerate(ranking):
+                key = (doc.page_content, doc.metadata.get("book"), doc.metadata.get("page"))
+                scores[key] = scores.get(key, 0.0) + 1 / (RRF_K + rank + 1)
+                docs[key] = doc
+        best = sorted(scores, key=scores.get, reverse=True)[:k]
+        return [docs[key] for key in best]
+
+    def __search_mode(self, mode: str) -> str:
+        mode = mode or self.search_mode
+        check_search_mode(mode)
+        # The lexical index is only built with the complete index
+        return mode if self.progress.ready else "vector"
+
+    def search(
+        self, query: str, k: int = 4, mode: str = None, filter: SearchFilter = None
+    ):
+        mode = self.__search_mode(mode)
+        if mode == "lexical":
+            return self.__search_lexical(query, k, filter)
+        key = normalize_query(query)
+        embedding = self.__embedding_lru.get(key)
+        if embedding is None:
+            embedding = self.__embeddings.embed_query(query)
+            self.__embedding_lru.put(key, embedding)
+        return self.__search_by_embedding(query, embedding, k, mode, filter)
+
+    async def asearch(
+        self, query: str, k: int = 4, mode: str = None, filter: SearchFilter = None
+    ):
+        mode = self.__search_mode(mode)
+        if mode == "lexical":
+            # No API call and sub-millisecond: not worth a thread hop
+            return self.__search_lexical(query, k, filter)
+        key = normalize_query(query)
+        embedding = self.__embedding_lru.get(key)
+        if embedding is None:
+            # Query embedding is an HTTP call: await it instead of blocking the event loop
+            embedding = await self.__embeddings.aembed_query(query)
+            self.__embedding_lru.put(key, embedding)
+        # FAISS search is CPU bound (and releases the GIL): run it off the loop
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.__search_by_embedding, query, embedding, k, mode, filter
+        )
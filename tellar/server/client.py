@@ -9,6 +9,7 @@ from colorama import Fore, Style
 from tellar.server.discovery import Discovery
 from tellar.server.model import Message
 from tellar.character import Answer, Character
+from tellar.warmup import Warmup
 import websockets
 
 from tellar.utils.network_utils import find_free_port
@@ -18,10 +19,14 @@ logger = logging.getLogger(__name__)
 
 
 class Client:
-    def __init__(self, char: Character):
+    def __init__(self, char: Character, warmup: Warmup = None):
         self.__char = char
+        self.__warmup = warmup or Warmup(char, jobs=("goal", "opener"))
 
     async def astart(self):
+        # Goal and opener are ready when somebody is found
+        self.__warmup.start()
+
         http_port = find_free_port()
         udp_port = find_free_port(start_port=9000, socket_kind=socket.SOCK_DGRAM)
 
@@ -30,8 +35,8 @@ class Client:
 
         # Wait for other servers to appear
         while not discovery.servers:
-            # Wait 1 second
-            time.sleep(1)
+            # Wait 1 second (warm up goes on meanwhile)
+            await asyncio.sleep(1)
 
         # Find first server in discovery that has server.info.name diffetent from char.name
         server = next(
@@ -52,20 +57,14 @@ class Client:
         url = urlparse(server.url)
         ws_url = f"ws://{url.netloc}/ws"
 
-        # Generate goal
-        goal = await self.__char.clone(language="english").answer(
-            "What is your main goal in life (write it at 3rd person) ?"
-        )
-        logger.info(f"Goal: {goal.text}")
-
-        # Generate intial message
-        initial_msg = await self.__char.clone().answer(
-            "What would you say to someone you just met to engage the conversation ? (say it as like you speak to this person)"
-        )
+        # Goal and intial message
+        goal = await self.__warmup.get("goal")
+        logger.info(f"Goal: {goal}")
+        initial_msg = Answer(text=await self.__warmup.get("opener"))
 
         # Clone character with new goal
         char = self.__char.clone(
-            goal=f"You are talking to {server.info.name}. Check if you know him/her. Try to follow your goal: {goal.text}"
+            goal=f"You are talking to {server.info.name}. Check if you know him/her. Try to follow your goal: {goal}"
         )
 
         retries = 0
@@ -96,8 +95,11 @@ class Client:
                     )
                     while True:
                         try:
-                            data = await websocket.recv()
-                            answer = Answer.from_json(json.loads(data))
+                            data = json.loads(await websocket.recv())
+                            # Only complete replies matter here
+                            if data.get("type") == "partial":
+                                continue
+                            answer = Answer.from_json(data)
                             logger.info(
                                 Style.BRIGHT
                                 + Fore.GREEN
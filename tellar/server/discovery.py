@@ -1,10 +1,11 @@
+import asyncio
 from dataclasses import dataclass
 from logging import Logger
 import logging
-import requests
 import socket
 import threading
 from tellar.server.model import Info
+from tellar.utils.http_client import HttpClientPool, default_http_pool
 
 # Logger
 logger = logging.getLogger(__name__)
@@ -22,11 +23,15 @@ class Discovery:
         def __hash__(self):
             return hash(self.url)
 
-    def __init__(self, udp_port: int, http_port: int):
+    def __init__(self, udp_port: int, http_port: int, http_pool: HttpClientPool = None):
         self.udp_port = udp_port
         self.http_port = http_port
         self.__running = False
         self.servers = set()
+        self.__http = http_pool or default_http_pool
+        # Discovery rounds run one after the other, in timer threads: they share
+        # this loop (and the keep-alive connections of its HTTP client)
+        self.__loop = asyncio.new_event_loop()
 
     def start(self):
         self.__running = True
@@ -43,6 +48,8 @@ class Discovery:
         self.__discovery_timer.join()
         self.__discovery_timer.cancel()
         self.__adv_thread.join()
+        self.__loop.run_until_complete(self.__http.aclose())
+        self.__loop.close()
 
     def __discover(self):
         logger.debug("Discovering servers...")
@@ -75,18 +82,9 @@ class Discovery:
                         logger.error(f"Error: {e}")
                         break
 
-        # Check for disconnected servers
+        # Check for disconnected servers (all at once)
         all_servers = self.servers.union(new_servers)
-        servers = set()
-        for s in all_servers:
-            try:
-                response = requests.get(s.url)
-                response.raise_for_status()
-                s.info = Info.from_json(response.json())
-                servers.add(s)
-            except Exception as e:
-                continue
-        self.servers = servers
+        self.servers = self.__loop.run_until_complete(self.__check_servers(all_servers))
 
         logger.debug(f"Discovered servers: {self.servers}")
 
@@ -95,6 +93,20 @@ class Discovery:
             self.__discovery_timer = threading.Timer(5, self.__discover)
             self.__discovery_timer.start()
 
+    async def __check_servers(self, servers: set) -> set:
+        results = await asyncio.gather(*[self.__check_server(s) for s in servers])
+        return {s for s, alive in zip(servers, results) if alive}
+
+    async def __check_server(self, server: "Discovery.Server") -> bool:
+        try:
+            response = await self.__http.client.get(server.url)
+            response.raise_for_status()
+            server.info = Info.from_json(response.json())
+            return True
+        except Exception as e:
+            logger.debug(f"Server {server.url} is not available: {e}")
+            return False
+
     def __advertise(self, udp_port: int, http_port: int):
         with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
             sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -0,0 +1,297 @@
+from collections import OrderedDict
+import contextlib
+from dataclasses import dataclass
+import hashlib
+import logging
+import os
+import re
+import threading
+from typing import AsyncIterable
+import uuid
+import aiofiles
+from fastapi import HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+
+# Logger
+logger = logging.getLogger(__name__)
+
+# Images are content addressed: a digest always designates the same bytes
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+MAGIC_NUMBERS = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF8", "image/gif"),
+    (b"RIFF", "image/webp"),
+]
+
+RANGE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+def content_type(head: bytes) -> str:
+    for magic, media_type in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return media_type
+    return "image/jpeg"
+
+
+@dataclass
+class CachedImage:
+    """What is needed to serve an image, read at once from the cache."""
+
+    path: str
+    size: int
+    media_type: str
+    # Content, when the image is in memory
+    data: bytes = None
+
+
+class ImageCache:
+    """Images kept on disk, named after the digest of their content, the most
+    recently used ones also in memory.
+
+    Both tiers are bounded in bytes and evict least recently used images: an
+    image evicted from memory is still served from disk, one evicted from disk
+    is gone.
+    """
+
+    def __init__(self, path: str = None, memory_bytes: int = 32 * 2**20, disk_bytes: int = 1024 * 2**20):
+        if path is None:
+            path = os.path.join(os.path.expanduser("~"), ".tellar", "images")
+        self.path = path
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.__memory = OrderedDict()
+        self.__memory_size = 0
+        self.__disk = OrderedDict()
+        self.__disk_size = 0
+        self.__lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+        self.__scan()
+
+    def __scan(self):
+        # Images of previous runs, least recently used first
+        entries = []
+        for name in os.listdir(self.path):
+            if re.fullmatch(r"[0-9a-f]{64}", name):
+                path = os.path.join(self.path, name)
+                with open(path, "rb") as file:
+                    media_type = content_type(file.read(16))
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name, stat.st_size, media_type))
+        for _, digest, size, media_type in sorted(entries):
+            self.__disk[digest] = (size, media_type)
+            self.__disk_size += size
+
+    def file_path(self, digest: str) -> str:
+        return os.path.join(self.path, digest)
+
+    @property
+    def memory_size(self) -> int:
+        return self.__memory_size
+
+    @property
+    def disk_size(self) -> int:
+        return self.__disk_size
+
+    def __contains__(self, digest: str) -> bool:
+        return digest in self.__disk
+
+    def put(self, data: bytes) -> str:
+        """Store an image, returning its digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        with self.__lock:
+            if digest not in self.__disk:
+                # Written aside then renamed: readers never see a partial file
+                temp_path = self.__temp_path()
+                with open(temp_path, "wb") as file:
+                    file.write(data)
+                self.__add(digest, temp_path, len(data), content_type(data[:16]))
+            self.__disk.move_to_end(digest)
+            self.__remember(digest, data)
+        return digest
+
+    async def aput_stream(self, chunks: AsyncIterable[bytes]) -> str:
+        """Store an image while it is downloaded, returning its digest."""
+        sha256 = hashlib.sha256()
+        size = 0
+        head = b""
+        # Kept in memory too, unless over the memory budget
+        kept = []
+        temp_path = self.__temp_path()
+        try:
+            async with aiofiles.open(temp_path, "wb") as file:
+                async for chunk in chunks:
+                    sha256.update(chunk)
+                    size += len(chunk)
+                    if len(head) < 16:
+                        head += chunk[: 16 - len(head)]
+                    if kept is not None and size <= self.memory_bytes:
+                        kept.append(chunk)
+                    else:
+                        kept = None
+                    await file.write(chunk)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(temp_path)
+            raise
+        digest = sha256.hexdigest()
+        with self.__lock:
+            if digest in self.__disk:
+                os.remove(temp_path)
+            else:
+                self.__add(digest, temp_path, size, content_type(head))
+            self.__disk.move_to_end(digest)
+            if kept is not None:
+                self.__remember(digest, b"".join(kept))
+        return digest
+
+    def __temp_path(self) -> str:
+        return os.path.join(self.path, f"{uuid.uuid4().hex}.tmp")
+
+    def __add(self, digest: str, temp_path: str, size: int, media_type: str):
+        os.replace(temp_path, self.file_path(digest))
+        self.__disk[digest] = (size, media_type)
+        self.__disk_size += size
+        self.__evict_disk(keep=digest)
+
+    def get(self, digest: str) -> bytes:
+        """Image content if it is in memory (None otherwise, even if it is on disk)."""
+        with self.__lock:
+            data = self.__memory.get(digest)
+            if data is not None:
+                self.__memory.move_to_end(digest)
+                self.__disk.move_to_end(digest)
+            return data
+
+    def lookup(self, digest: str) -> CachedImage:
+        """Image to serve (None if unknown), marked as recently used.
+
+        An image served from disk may still be evicted before its file is opened.
+        """
+        with self.__lock:
+            entry = self.__disk.get(digest)
+            if entry is None:
+                return None
+            self.__disk.move_to_end(digest)
+            data = self.__memory.get(digest)
+            if data is not None:
+                self.__memory.move_to_end(digest)
+        size, media_type = entry
+        if data is None:
+            # Least recently used order of the next runs
+            try:
+                os.utime(self.file_path(digest))
+            except OSError:
+                pass
+        return CachedImage(path=self.file_path(digest), size=size, media_type=media_type, data=data)
+
+    def __remember(self, digest: str, data: bytes):
+        if len(data) > self.memory_bytes:
+            return
+        if digest not in self.__memory:
+            self.__memory[digest] = data
+            self.__memory_size += len(data)
+        self.__memory.move_to_end(digest)
+        while self.__memory_size > self.memory_bytes:
+            _, evicted = self.__memory.popitem(last=False)
+            self.__memory_size -= len(evicted)
+
+    def __evict_disk(self, keep: str):
+        while self.__disk_size > self.disk_bytes and len(self.__disk) > 1:
+            digest = next(iter(self.__disk))
+            if digest == keep:
+                self.__disk.move_to_end(digest)
+                continue
+            size, _ = self.__disk.pop(digest)
+            self.__disk_size -= size
+            data = self.__memory.pop(digest, None)
+            if data is not None:
+                self.__memory_size -= len(data)
+            try:
+                os.remove(self.file_path(digest))
+            except OSError as e:
+                logger.warning(f"Could not remove cached image {digest}: {e}")
+
+
+def __etag_matches(header: str, etag: str) -> bool:
+    # Weak comparison (RFC 9110): W/"x" matches "x"
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+def __byte_range(request: Request, etag: str, size: int) -> tuple[int, int]:
+    """First and last byte asked for, None for the whole image; raises 416 when out of bounds."""
+    header = request.headers.get("range")
+    if header is None:
+        return None
+    # A range of another version of the image is irrelevant
+    if_range = request.headers.get("if-range")
+    if if_range is not None and if_range != etag:
+        return None
+    match = RANGE.match(header.strip())
+    # Several ranges are not supported: the whole image is sent
+    if match is None or match.groups() == ("", ""):
+        return None
+    start, end = match.groups()
+    if start == "":
+        # Last bytes
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=416, headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+async def __file_range(file, start: int, end: int, chunk_size: int = 64 * 1024):
+    try:
+        await file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await file.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await file.close()
+
+
+async def image_response(cache: ImageCache, digest: str, request: Request) -> Response:
+    """Serve a cached image, with HTTP caching (ETag, 304) and byte ranges."""
+    image = cache.lookup(digest)
+    if image is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    etag = f'"{digest}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Accept-Ranges": "bytes"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and __etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = __byte_range(request, etag, image.size)
+    if byte_range is not None:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{image.size}"
+    if image.data is not None:
+        # In memory: no disk read
+        content = image.data if byte_range is None else image.data[start : end + 1]
+        return Response(
+            content, status_code=200 if byte_range is None else 206, headers=headers, media_type=image.media_type
+        )
+
+    try:
+        # Once open, the content stays readable even if the image is evicted
+        file = await aiofiles.open(image.path, "rb")
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Image not found")
+    start, end = byte_range or (0, image.size - 1)
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        __file_range(file, start, end),
+        status_code=200 if byte_range is None else 206,
+        headers=headers,
+        media_type=image.media_type,
+    )
@@ -21,12 +21,37 @@ class Message(BaseModel):
         )
 
 
+class PartialMessage(BaseModel):
+    """Piece of a reply being written, sent to streaming clients before the final message."""
+
+    sender: str
+    text: str
+
+    def to_json(self):
+        return {"type": "partial", "sender": self.sender, "text": self.text}
+
+
 class Info(BaseModel):
     name: str
+    indexing: Optional[dict] = None
+    answer_cache: Optional[dict] = None
+    single_flight: Optional[dict] = None
 
     def to_json(self):
-        return {"name": self.name}
+        json = {"name": self.name}
+        if self.indexing is not None:
+            json["indexing"] = self.indexing
+        if self.answer_cache is not None:
+            json["answer_cache"] = self.answer_cache
+        if self.single_flight is not None:
+            json["single_flight"] = self.single_flight
+        return json
 
     @classmethod
     def from_json(cls, json):
-        return cls(name=json.get("name", None))
\ No newline at end of file
+        return cls(
+            name=json.get("name", None),
+            indexing=json.get("indexing"),
+            answer_cache=json.get("answer_cache"),
+            single_flight=json.get("single_flight"),
+        )
\ No newline at end of file
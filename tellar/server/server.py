@@ -1,16 +1,20 @@
 import asyncio
+from contextlib import asynccontextmanager
 import hashlib
-from io import BytesIO
 import logging
 import time
-from fastapi.responses import StreamingResponse
-import requests
 import uvicorn
 import socket
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
 from tellar.server.discovery import Discovery
-from tellar.server.model import Info, Message
-from tellar.character import Character
+from tellar.server.image_cache import ImageCache, image_response
+from tellar.server.model import Info, Message, PartialMessage
+from tellar.server.sessions import Session, SessionManager
+from tellar.character import Answer, AnswerDelta, Character
+from tellar.utils.http_client import HttpClientPool, default_http_pool
+from tellar.utils.lru_cache import LRUCache
+from tellar.utils.single_flight import SingleFlight
+from tellar.warmup import Warmup
 
 from tellar.utils.network_utils import find_free_port, get_ip
 
@@ -22,47 +26,83 @@ logger = logging.getLogger(__name__)
 class Server:
     class AppState:
         def __init__(self):
-            self.conversations_from = {}
-            self.history_from = {}
-            self.picture = None
-            self.description = None
-            self.images = {}
-            self.lock = asyncio.Lock()
+            # Image URL hash -> digest of the image content in the image cache
+            self.image_digests = LRUCache(max_size=4096)
+            self.picture_digest = None
+            # Lazy caches: one computation per key at a time
+            self.single_flight = SingleFlight()
   
-    def __init__(self, char: Character):
+    def __init__(
+        self,
+        char: Character,
+        warmup: Warmup = None,
+        image_cache: ImageCache = None,
+        http_pool: HttpClientPool = None,
+        sessions: SessionManager = None,
+    ):
         self.__char = char
         self.__state = Server.AppState()
+        self.__sessions = sessions if sessions is not None else SessionManager(char)
+        self.__images = image_cache or ImageCache()
+        self.__http = http_pool or default_http_pool
+        self.__warmup = warmup or Warmup(
+            char,
+            jobs=("description", "picture"),
+            single_flight=self.__state.single_flight,
+            http_pool=self.__http,
+        )
         self.__http_port = None
         self.__udp_port = None
         self.__app = self.__create_app()
 
-    async def __http_get(self, url: str) -> requests.Response:
-        response = await asyncio.to_thread(requests.get, url)
-        return response
-
-    def __handle_new_conversation(self, msg: Message):
-        logger.info(f"New conversation from [{msg.sender}]")
-        self.__state.conversations_from[msg.sender] = self.__char.clone()
-        self.__state.history_from[msg.sender] = []
-
     async def __get_cached_image(self, image_url: str) -> str:
         if image_url is None:
             return None
         # Genrerate image hash from url
         image_hash = hashlib.sha256(image_url.encode()).hexdigest()
         # Store it to cache if not present
-        if image_hash not in self.__state.images:
-            async with self.__state.lock:
-                if image_hash not in self.__state.images:
-                    response = await self.__http_get(image_url)
-                    self.__state.images[image_hash] = response.content
+        digest = self.__state.image_digests.get(image_hash)
+        if digest is None or digest not in self.__images:
+            digest = await self.__state.single_flight.do(
+                ("image", image_hash), lambda: self.__download_image(image_hash, image_url)
+            )
         # Retrieve local server address
-        return f"http://{get_ip()}:{self.__http_port}/image/{image_hash}"
-
-    async def __handle_new_message(self, msg: Message) -> Message:
+        return f"http://{get_ip()}:{self.__http_port}/image/{digest}"
+
+    async def __download_image(self, image_hash: str, image_url: str) -> str:
+        # Written to the image cache as it is received
+        async with self.__http.client.stream("GET", image_url) as response:
+            response.raise_for_status()
+            digest = await self.__images.aput_stream(response.aiter_bytes())
+        self.__state.image_digests.put(image_hash, digest)
+        return digest
+
+    async def __picture_digest(self) -> str:
+        if self.__state.picture_digest is None or self.__state.picture_digest not in self.__images:
+            picture = await self.__warmup.get("picture")
+            self.__state.picture_digest = await asyncio.to_thread(self.__images.put, picture)
+        return self.__state.picture_digest
+
+    async def __handle_new_message(self, session: Session, msg: Message) -> Message:
         logger.info(f"Received message from [{msg.sender}]: {msg.text}")
-        self.__state.history_from[msg.sender].append(msg)
-        answer = await self.__state.conversations_from[msg.sender].answer(msg.text)
+        session.history.append(msg)
+        answer = await session.character.answer(msg.text)
+        return await self.__reply(session, answer)
+
+    async def __stream_new_message(self, session: Session, msg: Message, websocket: WebSocket) -> Message:
+        logger.info(f"Received message from [{msg.sender}] (streaming): {msg.text}")
+        session.history.append(msg)
+        answer = None
+        async for item in session.character.astream(msg.text):
+            if isinstance(item, AnswerDelta):
+                await websocket.send_json(
+                    PartialMessage(sender=self.__char.name, text=item.text).to_json()
+                )
+            else:
+                answer = item
+        return await self.__reply(session, answer)
+
+    async def __reply(self, session: Session, answer: Answer) -> Message:
         logger.info(f"Answer: {answer.text} [{answer.image}]")
         # Convert answer to Message model
         reply_message = Message(
@@ -71,59 +111,72 @@ class Server:
             timestamp=int(time.time()),
             image=await self.__get_cached_image(answer.image),
         )
-        self.__state.history_from[msg.sender].append(reply_message)
+        session.history.append(reply_message)
         return reply_message
 
+    async def __expire_sessions(self):
+        # Idle sessions leave memory even when nobody writes anymore, old saved ones leave the disk
+        while True:
+            await asyncio.to_thread(self.__sessions.prune)
+            await asyncio.sleep(min(self.__sessions.idle_ttl, 60))
+            await self.__sessions.aexpire()
+
     def __create_app(self) -> FastAPI:
 
-        app = FastAPI()
+        @asynccontextmanager
+        async def lifespan(app: FastAPI):
+            # Description and picture are ready before the first visitor asks
+            self.__warmup.start()
+            expiry = asyncio.create_task(self.__expire_sessions())
+            yield
+            expiry.cancel()
+            # Conversations in memory are saved (with --persist-sessions) instead of lost
+            await self.__sessions.aclose()
+            self.__warmup.stop()
+            await self.__http.aclose()
+            await self.__char.openai_pool.aclose()
+
+        app = FastAPI(lifespan=lifespan)
 
         @app.get("/")
         async def read_root():
-            return Info(name=self.__char.name).to_json()
+            answer_cache = self.__char.answer_cache
+            return Info(
+                name=self.__char.name,
+                indexing=self.__char.searchable_doc.progress.to_json(),
+                answer_cache=answer_cache.stats.to_json() if answer_cache is not None else None,
+                single_flight=self.__state.single_flight.stats.to_json(),
+            ).to_json()
 
         @app.get("/picture")
-        async def read_picture():
-            if self.__state.picture is None:
-                async with self.__state.lock:
-                    if self.__state.picture is None:
-                        answer = await self.__char.clone().answer(
-                            "Draw the most accurate portrait picture of you based on the information from story_tool. Use a picture style matching the era and universe of your story."
-                        )
-                        logger.info(f"Picture: {answer.image}")
-                        response = await self.__http_get(answer.image)
-                        self.__state.picture = response.content
-
-            return StreamingResponse(
-                BytesIO(self.__state.picture), media_type="image/jpeg"
-            )
+        async def read_picture(request: Request):
+            return await image_response(self.__images, await self.__picture_digest(), request)
 
-        @app.get("/image/{hash}")
-        async def read_image(hash: str):
-            return StreamingResponse(
-                BytesIO(self.__state.images[hash]), media_type="image/jpeg"
-            )
+        @app.get("/image/{digest}")
+        async def read_image(digest: str, request: Request):
+            return await image_response(self.__images, digest, request)
 
         @app.get("/description")
         async def read_description():
-            if self.__state.description is None:
-                async with self.__state.lock:
-                    if self.__state.description is None:
-                        answer = await self.__char.clone().answer(
-                            "Describe yourself in a few words (no full sentence)."
-                        )
-                        logger.info(f"Description: {answer.text}")
-                        self.__state.description = answer.text
-            return self.__state.description
+            return await self.__warmup.get("description")
 
         @app.get("/history/{char_name}")
         async def read_history(char_name: str):
-            if char_name not in self.__state.conversations_from:
+            history = await self.__sessions.ahistory(char_name)
+            if history is None:
                 return []
-            return [msg.to_json() for msg in self.__state.history_from[char_name]]
+            return [msg.to_json() for msg in history]
+
+        @app.get("/sessions")
+        async def read_sessions():
+            await self.__sessions.aexpire()
+            return self.__sessions.to_json()
 
         @app.websocket("/ws")
         async def websocket_endpoint(websocket: WebSocket):
+            # Streaming clients (/ws?stream=true) get partial messages while the
+            # reply is written, then the final message, marked with "type": "final"
+            stream = websocket.query_params.get("stream", "").lower() in ("1", "true")
             await websocket.accept()
             try:
                 while True:
@@ -133,15 +186,20 @@ class Server:
                     msg = Message.from_json(data)
                     msg.timestamp = int(time.time())
 
-                    # Handle new conversation
-                    if msg.sender not in self.__state.conversations_from:
-                        self.__handle_new_conversation(msg)
-
-                    # Handle message
-                    reply_message = await self.__handle_new_message(msg)
-
-                    # Send reply
-                    await websocket.send_json(reply_message.to_json())
+                    # Conversation of the sender (new, live or restored)
+                    session = await self.__sessions.aget(msg.sender)
+
+                    # Handle message and send reply
+                    session.busy += 1
+                    try:
+                        if stream:
+                            reply_message = await self.__stream_new_message(session, msg, websocket)
+                            await websocket.send_json({"type": "final", **reply_message.to_json()})
+                        else:
+                            reply_message = await self.__handle_new_message(session, msg)
+                            await websocket.send_json(reply_message.to_json())
+                    finally:
+                        session.busy -= 1
 
             except WebSocketDisconnect:
                 logger.info("WebSocket disconnected")
@@ -0,0 +1,279 @@
+from collections import OrderedDict
+import asyncio
+from dataclasses import dataclass, field
+import json
+import logging
+import os
+import threading
+import time
+
+from tellar.character import Character
+from tellar.server.model import Message
+from tellar.utils.text_utils import hash_key
+
+# Logger
+logger = logging.getLogger(__name__)
+
+# Character session, chat history and message objects, besides their text
+SESSION_OVERHEAD_BYTES = 2048
+MESSAGE_OVERHEAD_BYTES = 200
+
+
+@dataclass
+class Session:
+    """Conversation of the server character with one sender."""
+
+    sender: str
+    character: Character
+    history: list = field(default_factory=list)
+    last_active: float = field(default_factory=time.monotonic)
+    # Messages being answered: a busy session is not evicted
+    busy: int = 0
+
+    @property
+    def approximate_bytes(self) -> int:
+        texts = [msg.text for msg in self.history]
+        texts += [str(message.content) for message in self.character.chat_history.messages]
+        return SESSION_OVERHEAD_BYTES + sum(
+            len(text.encode()) + MESSAGE_OVERHEAD_BYTES for text in texts
+        )
+
+    def to_json(self):
+        return {
+            "sender": self.sender,
+            "history": [msg.to_json() for msg in self.history],
+            "chat_history": self.character.chat_history.to_json(),
+        }
+
+
+@dataclass
+class SessionStats:
+    created: int = 0
+    expired: int = 0
+    evicted: int = 0
+    persisted: int = 0
+    rehydrated: int = 0
+    # Saved sessions removed from disk
+    pruned: int = 0
+
+    def to_json(self):
+        return {
+            "created": self.created,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "persisted": self.persisted,
+            "rehydrated": self.rehydrated,
+            "pruned": self.pruned,
+        }
+
+
+class SessionManager:
+    """Live conversations of a server, bounded in number and in time.
+
+    Sessions idle for more than idle_ttl seconds expire, and past max_sessions
+    the least recently used one is evicted. With persist, a session leaving
+    memory is saved under ~/.tellar/sessions (keyed by character, book and
+    language), and restored when its sender comes back. Saved sessions are
+    bounded too: prune() removes the ones older than saved_ttl, then the
+    oldest ones past max_saved_sessions.
+
+    Saving and restoring read and write files: on an event loop, use the
+    async methods (aget, ahistory, aexpire, aclose), run in a thread.
+    """
+
+    def __init__(
+        self,
+        char: Character,
+        max_sessions: int = 1000,
+        idle_ttl: float = 3600,
+        persist: bool = False,
+        user_data_path: str = None,
+        max_saved_sessions: int = 10000,
+        saved_ttl: float = 30 * 24 * 3600,
+    ):
+        self.__char = char
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_saved_sessions = max_saved_sessions
+        self.saved_ttl = saved_ttl
+        self.stats = SessionStats()
+        self.__sessions = OrderedDict()
+        # Sessions are used from the event loop and from the threads saving them
+        self.__lock = threading.RLock()
+        self.store_path = None
+        if persist:
+            if user_data_path is None:
+                user_data_path = os.path.join(os.path.expanduser("~"), ".tellar")
+            self.store_path = os.path.join(user_data_path, "sessions", char.identity)
+            os.makedirs(self.store_path, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self.__sessions)
+
+    def __contains__(self, sender: str) -> bool:
+        return sender in self.__sessions
+
+    def get(self, sender: str) -> Session:
+        """Session of a sender, created (or restored) on its first message."""
+        with self.__lock:
+            self.expire()
+            session = self.__sessions.get(sender)
+            if session is None:
+                session = self.__restore(sender) or self.__create(sender)
+                self.__sessions[sender] = session
+                self.__evict_over_capacity(keep=sender)
+            session.last_active = time.monotonic()
+            self.__sessions.move_to_end(sender)
+            return session
+
+    async def aget(self, sender: str) -> Session:
+        return await asyncio.to_thread(self.get, sender)
+
+    def history(self, sender: str) -> list[Message]:
+        """Messages of a conversation, live or saved (None if unknown)."""
+        with self.__lock:
+            session = self.__sessions.get(sender)
+            if session is not None:
+                return session.history
+            data = self.__load(sender)
+        if data is None:
+            return None
+        return [Message.from_json(msg) for msg in data.get("history", [])]
+
+    async def ahistory(self, sender: str) -> list[Message]:
+        return await asyncio.to_thread(self.history, sender)
+
+    def expire(self):
+        """Remove the sessions idle for more than idle_ttl."""
+        with self.__lock:
+            now = time.monotonic()
+            for sender, session in list(self.__sessions.items()):
+                if now - session.last_active > self.idle_ttl and session.busy == 0:
+                    logger.info(f"Conversation from [{sender}] expired")
+                    self.__remove(sender)
+                    self.stats.expired += 1
+
+    async def aexpire(self):
+        await asyncio.to_thread(self.expire)
+
+    def prune(self):
+        """Remove the saved sessions older than saved_ttl, then the oldest ones past max_saved_sessions."""
+        if self.store_path is None:
+            return
+        entries = []
+        for name in os.listdir(self.store_path):
+            if name.endswith(".json"):
+                path = os.path.join(self.store_path, name)
+                try:
+                    entries.append((os.stat(path).st_mtime, path))
+                except FileNotFoundError:
+                    # Restored meanwhile
+                    continue
+        entries.sort(reverse=True)
+        now = time.time()
+        for rank, (mtime, path) in enumerate(entries):
+            if rank >= self.max_saved_sessions or now - mtime > self.saved_ttl:
+                try:
+                    os.remove(path)
+                    self.stats.pruned += 1
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning(f"Could not remove the saved conversation {path}: {e}")
+
+    def close(self):
+        """Remove every session from memory (saved when persisting, e.g. on shutdown)."""
+        with self.__lock:
+            for sender in list(self.__sessions):
+                self.__remove(sender)
+
+    async def aclose(self):
+        await asyncio.to_thread(self.close)
+
+    def __evict_over_capacity(self, keep: str):
+        # Least recently used first, never the ones being answered
+        for sender, session in list(self.__sessions.items()):
+            if len(self.__sessions) <= self.max_sessions:
+                break
+            if session.busy == 0 and sender != keep:
+                logger.info(f"Conversation from [{sender}] evicted")
+                self.__remove(sender)
+                self.stats.evicted += 1
+
+    def __create(self, sender: str) -> Session:
+        logger.info(f"New conversation from [{sender}]")
+        self.stats.created += 1
+        return Session(sender=sender, character=self.__char.clone())
+
+    def __remove(self, sender: str):
+        session = self.__sessions.pop(sender)
+        if self.store_path is not None:
+            try:
+                self.__save(session)
+                self.stats.persisted += 1
+            except OSError as e:
+                logger.warning(f"Could not save the conversation from [{sender}]: {e}")
+        session.character.close()
+
+    def __file_path(self, sender: str) -> str:
+        return os.path.join(self.store_path, f"{hash_key(sender)}.json")
+
+    def __save(self, session: Session):
+        file_path = self.__file_path(session.sender)
+        temp_path = f"{file_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(session.to_json(), f)
+        os.replace(temp_path, file_path)
+
+    def __load(self, sender: str) -> dict:
+        if self.store_path is None:
+            return None
+        try:
+            with open(self.__file_path(sender)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read the conversation from [{sender}]: {e}")
+            return None
+
+    def __restore(self, sender: str) -> Session:
+        data = self.__load(sender)
+        if data is None:
+            return None
+        session = Session(
+            sender=sender,
+            character=self.__char.clone(),
+            history=[Message.from_json(msg) for msg in data.get("history", [])],
+        )
+        session.character.chat_history.restore(data.get("chat_history", {}))
+        # Live again: the saved copy is outdated from now on
+        try:
+            os.remove(self.__file_path(sender))
+        except FileNotFoundError:
+            # Pruned meanwhile
+            pass
+        self.stats.rehydrated += 1
+        logger.info(f"Conversation from [{sender}] restored")
+        return session
+
+    def to_json(self):
+        now = time.monotonic()
+        with self.__lock:
+            sessions = [
+                {
+                    "sender": session.sender,
+                    "messages": len(session.history),
+                    "idle_seconds": round(now - session.last_active, 1),
+                    "approximate_bytes": session.approximate_bytes,
+                }
+                for session in self.__sessions.values()
+            ]
+        return {
+            "live": len(sessions),
+            "max_sessions": self.max_sessions,
+            "idle_ttl": self.idle_ttl,
+            "approximate_bytes": sum(session["approximate_bytes"] for session in sessions),
+            **self.stats.to_json(),
+            "sessions": sessions,
+        }
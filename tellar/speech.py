@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import re
+from typing import AsyncIterable, AsyncIterator
+
+from tellar.utils.openai_client import OpenAIClientPool, default_pool
+
+# Logger
+logger = logging.getLogger(__name__)
+
+# End of a sentence: punctuation (and closing quotes) followed by a space, or a line break
+SENTENCE_END = re.compile(r"""[.!?…。！？]+["'»”)\]]*\s+|\n+""")
+
+
+class SentenceSplitter:
+    """Split text into sentences while it is being written.
+
+    Sentences shorter than min_length are kept with the next one, so that the
+    synthesis of "Yes." is not a request of its own.
+    """
+
+    def __init__(self, min_length: int = 20):
+        self.min_length = min_length
+        self.__buffer = ""
+
+    def feed(self, piece: str) -> list[str]:
+        """Add the next piece of text, returning the sentences it completed."""
+        self.__buffer += piece
+        sentences, start = [], 0
+        for match in SENTENCE_END.finditer(self.__buffer):
+            sentence = self.__buffer[start : match.end()].strip()
+            if len(sentence) >= self.min_length:
+                sentences.append(sentence)
+                start = match.end()
+        self.__buffer = self.__buffer[start:]
+        return sentences
+
+    def flush(self) -> str:
+        """The rest of the text (the last sentence, maybe unfinished)."""
+        rest, self.__buffer = self.__buffer.strip(), ""
+        return rest
+
+
+class SpeechPipeline:
+    """Text to speech, sentence by sentence.
+
+    Sentences are synthesized as soon as they are complete, max_parallel at a
+    time, and their audio comes out in the order of the text: the first
+    sentence can be played while the next ones are being synthesized.
+    """
+
+    def __init__(
+        self,
+        openai_pool: OpenAIClientPool = None,
+        model: str = "tts-1",
+        voice: str = "onyx",
+        max_parallel: int = 3,
+        min_sentence_length: int = 20,
+    ):
+        self.openai_pool = openai_pool or default_pool
+        self.model = model
+        self.voice = voice
+        self.max_parallel = max_parallel
+        self.min_sentence_length = min_sentence_length
+
+    async def synthesize(self, sentence: str) -> bytes:
+        async with self.openai_pool.limit() as client:
+            response = await client.audio.speech.create(
+                model=self.model,
+                voice=self.voice,
+                input=sentence,
+            )
+        logger.debug(f"Synthesized {len(sentence)} characters")
+        return response.content
+
+    async def astream(self, text: str | AsyncIterable[str]) -> AsyncIterator[bytes]:
+        """Audio (MP3) of each sentence of a text, or of a stream of text pieces, in order."""
+        semaphore = asyncio.Semaphore(self.max_parallel)
+        # Synthesis tasks, in the order of the sentences (None: end of the text)
+        tasks = asyncio.Queue()
+
+        async def synthesize(sentence: str) -> bytes:
+            async with semaphore:
+                return await self.synthesize(sentence)
+
+        async def split():
+            splitter = SentenceSplitter(self.min_sentence_length)
+            try:
+                async for piece in self.__pieces(text):
+                    for sentence in splitter.feed(piece):
+                        tasks.put_nowait(asyncio.create_task(synthesize(sentence)))
+                rest = splitter.flush()
+                if rest:
+                    tasks.put_nowait(asyncio.create_task(synthesize(rest)))
+            finally:
+                tasks.put_nowait(None)
+
+        splitter_task = asyncio.create_task(split())
+        try:
+            while (task := await tasks.get()) is not None:
+                yield await task
+            # Text stream errors
+            await splitter_task
+        finally:
+            # The consumer stopped early or a synthesis failed: stop the others
+            splitter_task.cancel()
+            while not tasks.empty():
+                task = tasks.get_nowait()
+                if task is not None:
+                    task.cancel()
+
+    @staticmethod
+    async def __pieces(text: str | AsyncIterable[str]) -> AsyncIterator[str]:
+        if isinstance(text, str):
+            yield text
+        else:
+            async for piece in text:
+                yield piece
@@ -0,0 +1,61 @@
+import asyncio
+import importlib.util
+import threading
+import weakref
+import httpx
+
+# HTTP/2 needs the optional h2 package (the http2 extra)
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class HttpClientPool:
+    """Long-lived httpx.AsyncClient, with keep-alive connections and timeouts.
+
+    Like OpenAIClientPool, there is one client per event loop (connections
+    belong to the loop that opened them).
+    """
+
+    def __init__(
+        self,
+        timeout: float = 30.0,
+        connect_timeout: float = 5.0,
+        max_connections: int = 20,
+        http2: bool = None,
+        transport: httpx.AsyncBaseTransport = None,
+    ):
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_connections
+        )
+        self.http2 = HTTP2_AVAILABLE if http2 is None else http2
+        self.__transport = transport
+        self.__clients = weakref.WeakKeyDictionary()
+        self.__lock = threading.Lock()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Client of the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self.__lock:
+            client = self.__clients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(
+                    timeout=self.timeout,
+                    limits=self.limits,
+                    http2=self.http2,
+                    follow_redirects=True,
+                    transport=self.__transport,
+                )
+                self.__clients[loop] = client
+            return client
+
+    async def aclose(self):
+        """Close the client of the running event loop."""
+        with self.__lock:
+            client = self.__clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+# Shared by the servers, clients and discoveries created without a pool of their own
+default_http_pool = HttpClientPool()
@@ -0,0 +1,93 @@
+import json
+import re
+
+ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class JsonFieldStreamer:
+    """Extract a string field from a JSON object while it is being streamed.
+
+    feed() takes the next piece of the document and returns the characters of
+    the field value decoded so far, escapes included, even when a piece ends in
+    the middle of one. Like Answer.from_json_str, a document that does not
+    start like a JSON object (after an eventual "```json" fence) is plain text:
+    it is streamed as is.
+    """
+
+    def __init__(self, field: str = "text"):
+        self.__key = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self.__buffer = ""
+        self.__position = 0
+        self.__state = "start"
+
+    @property
+    def done(self) -> bool:
+        return self.__state == "done"
+
+    def feed(self, piece: str) -> str:
+        self.__buffer += piece
+        if self.__state == "start":
+            self.__detect_format()
+        if self.__state == "plain":
+            delta = self.__buffer[self.__position :]
+            self.__position = len(self.__buffer)
+            return delta
+        if self.__state == "key":
+            match = self.__key.search(self.__buffer, self.__position)
+            if match is None:
+                return ""
+            self.__position = match.end()
+            self.__state = "value"
+        if self.__state == "value":
+            return self.__read_value()
+        return ""
+
+    def __detect_format(self):
+        content = self.__buffer.lstrip()
+        if content.startswith("```json"):
+            content = content[7:].lstrip()
+        elif "```json".startswith(content):
+            # Maybe the beginning of a fence: wait for more
+            return
+        if not content:
+            return
+        self.__state = "key" if content.startswith("{") else "plain"
+
+    def __read_value(self) -> str:
+        delta = []
+        buffer, position = self.__buffer, self.__position
+        while position < len(buffer):
+            char = buffer[position]
+            if char == '"':
+                self.__state = "done"
+                position += 1
+                break
+            if char != "\\":
+                delta.append(char)
+                position += 1
+                continue
+            # Escape sequence: wait until it is complete
+            if position + 1 >= len(buffer):
+                break
+            escape = buffer[position + 1]
+            if escape == "u":
+                # Characters outside the BMP are two escaped UTF-16 surrogates
+                length = 6
+                if buffer[position + 2 : position + 4].lower() in ("d8", "d9", "da", "db"):
+                    length = 12
+                if position + length > len(buffer):
+                    break
+                delta.append(self.__decode_unicode(buffer[position : position + length]))
+                position += length
+            else:
+                delta.append(ESCAPES.get(escape, escape))
+                position += 2
+        self.__position = position
+        return "".join(delta)
+
+    @staticmethod
+    def __decode_unicode(escape: str) -> str:
+        try:
+            return json.loads(f'"{escape}"')
+        except json.JSONDecodeError:
+            return ""
@@ -0,0 +1,64 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+import threading
+import time
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def to_json(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate,
+        }
+
+
+class LRUCache:
+    """Thread safe, size bounded cache evicting least recently used entries, with optional TTL."""
+
+    def __init__(self, max_size: int = 1024, ttl: float = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self.__entries.move_to_end(key)
+                    self.stats.hits += 1
+                    return value
+                del self.__entries[key]
+            self.stats.misses += 1
+            return default
+
+    def put(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self.__lock:
+            self.__entries[key] = (value, expires_at)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.max_size:
+                self.__entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.__entries)
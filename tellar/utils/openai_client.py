@@ -0,0 +1,74 @@
+import asyncio
+from contextlib import asynccontextmanager
+import threading
+from typing import AsyncIterator
+import weakref
+import httpx
+import openai
+
+
+class OpenAIClientPool:
+    """Long-lived AsyncOpenAI clients, shared by all the conversations.
+
+    Connections are reused from one call to the next. An AsyncOpenAI client (its
+    connections and the concurrency semaphore) belongs to an event loop, so there
+    is one client per loop: a single one in server mode, where every call runs in
+    the same loop.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        timeout: float = 60.0,
+        max_connections: int = 20,
+        max_retries: int = 2,
+    ):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.__clients = weakref.WeakKeyDictionary()
+        self.__lock = threading.Lock()
+
+    def __loop_state(self) -> tuple[openai.AsyncOpenAI, asyncio.Semaphore]:
+        loop = asyncio.get_running_loop()
+        with self.__lock:
+            state = self.__clients.get(loop)
+            if state is None:
+                client = openai.AsyncOpenAI(
+                    timeout=self.timeout,
+                    max_retries=self.max_retries,
+                    http_client=httpx.AsyncClient(
+                        timeout=self.timeout,
+                        limits=httpx.Limits(
+                            max_connections=self.max_connections,
+                            max_keepalive_connections=self.max_connections,
+                        ),
+                    ),
+                )
+                state = (client, asyncio.Semaphore(self.max_concurrency))
+                self.__clients[loop] = state
+            return state
+
+    @property
+    def client(self) -> openai.AsyncOpenAI:
+        """Client of the running event loop."""
+        return self.__loop_state()[0]
+
+    @asynccontextmanager
+    async def limit(self) -> AsyncIterator[openai.AsyncOpenAI]:
+        """Wait for a free slot (at most max_concurrency calls at a time) and get the client."""
+        client, semaphore = self.__loop_state()
+        async with semaphore:
+            yield client
+
+    async def aclose(self):
+        """Close the client of the running event loop."""
+        with self.__lock:
+            state = self.__clients.pop(asyncio.get_running_loop(), None)
+        if state is not None:
+            await state[0].close()
+
+
+# Shared by the characters created without a pool of their own
+default_pool = OpenAIClientPool()
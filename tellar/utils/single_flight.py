@@ -0,0 +1,83 @@
+import asyncio
+from dataclasses import dataclass
+import logging
+import time
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+# Logger
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class SingleFlightStats:
+    calls: int = 0
+    # Computations actually run
+    executions: int = 0
+    # Calls that waited for the computation of another one
+    coalesced: int = 0
+    coalesced_wait_seconds: float = 0.0
+    failures: int = 0
+
+    def to_json(self):
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "coalesced_wait_seconds": self.coalesced_wait_seconds,
+            "failures": self.failures,
+        }
+
+
+class SingleFlight:
+    """Run at most one computation per key at a time.
+
+    Concurrent calls with the same key wait for the computation started by the
+    first one and get its result (or its exception), calls with other keys run
+    in parallel. A computation runs in a task of its own: a caller being
+    cancelled does not cancel it for the others. Once it is done, the next call
+    starts a new one (results are to be cached by the caller).
+    """
+
+    def __init__(self):
+        self.stats = SingleFlightStats()
+        self.__flights = {}
+
+    @property
+    def in_flight(self) -> int:
+        """Number of computations running."""
+        return len(self.__flights)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.__flights
+
+    async def do(self, key: Hashable, function: Callable[[], Awaitable[T]]) -> T:
+        self.stats.calls += 1
+        task = self.__flights.get(key)
+        if task is None:
+            self.stats.executions += 1
+            task = asyncio.create_task(function())
+            self.__flights[key] = task
+            task.add_done_callback(lambda task: self.__land(key, task))
+            return await asyncio.shield(task)
+
+        self.stats.coalesced += 1
+        start = time.perf_counter()
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self.stats.coalesced_wait_seconds += time.perf_counter() - start
+
+    def cancel(self):
+        """Cancel every computation in flight."""
+        for task in list(self.__flights.values()):
+            task.cancel()
+
+    def __land(self, key: Hashable, task: asyncio.Task):
+        if self.__flights.get(key) is task:
+            del self.__flights[key]
+        # Retrieving the exception here: no warning when every caller gave up
+        if not task.cancelled() and task.exception() is not None:
+            self.stats.failures += 1
+            logger.debug(f"Computation of {key} failed: {task.exception()}")
@@ -0,0 +1,19 @@
+import hashlib
+import re
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased words of a text."""
+    return WORD_PATTERN.findall(text.lower())
+
+
+def normalize_query(query: str) -> str:
+    # "Who are you ?" and "who are you" are the same question
+    return " ".join(query.lower().split()).strip(" ?!.")
+
+
+def hash_key(*parts) -> str:
+    """Stable key of a list of values (None included), for cache and file names."""
+    return hashlib.sha256("\x00".join(str(part) for part in parts).encode()).hexdigest()
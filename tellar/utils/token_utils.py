@@ -0,0 +1,37 @@
+from functools import lru_cache
+import logging
+import math
+import tiktoken
+
+# Logger
+logger = logging.getLogger(__name__)
+
+# Average characters per token, when the real encoding is not available
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str) -> tiktoken.Encoding:
+    """Return the tiktoken encoding of a model, or None if it cannot be loaded (offline host)."""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception as e:
+        logger.warning(f"No tokenizer for {model} ({e}): token counts are estimated")
+        return None
+
+
+class TokenCounter:
+    def __init__(self, model: str = "gpt-4o-mini"):
+        self.model = model
+        self.encoding = get_encoding(model)
+
+    def count(self, text: str) -> int:
+        if self.encoding is None:
+            return math.ceil(len(text) / CHARS_PER_TOKEN)
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if self.encoding is None:
+            return text[: max_tokens * CHARS_PER_TOKEN]
+        tokens = self.encoding.encode(text, disallowed_special=())
+        return self.encoding.decode(tokens[:max_tokens])
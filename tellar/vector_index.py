@@ -0,0 +1,139 @@
+import logging
+import math
+import os
+import pickle
+import uuid
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+# Logger
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+
+# Below this many vectors, IVF-PQ cannot be trained properly: a flat scan is used instead
+MIN_IVFPQ_VECTORS = 1000
+
+
+def __pq_subquantizers(dimension: int, target: int = 64) -> int:
+    # PQ needs a number of sub-quantizers dividing the vector dimension
+    return max(m for m in range(1, min(target, dimension) + 1) if dimension % m == 0)
+
+
+def check_index_type(index_type: str):
+    if index_type not in INDEX_TYPES:
+        raise ValueError(
+            f"Unknown index type: {index_type} (expected one of {', '.join(INDEX_TYPES)})"
+        )
+
+
+def build_index(
+    vectors: np.ndarray,
+    index_type: str = "flat",
+    hnsw_m: int = 32,
+    hnsw_ef_search: int = 64,
+    ivf_nprobe: int = None,
+) -> faiss.Index:
+    """Build a FAISS index of the given type, trained on the vectors themselves."""
+    check_index_type(index_type)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dimension = vectors.shape
+
+    if index_type == "ivfpq" and count < MIN_IVFPQ_VECTORS:
+        logger.info(f"Only {count} vectors: using a flat index instead of IVF-PQ")
+        index_type = "flat"
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dimension)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, hnsw_m)
+        index.hnsw.efSearch = hnsw_ef_search
+    else:
+        # Keep at least 39 training points per centroid (FAISS recommendation)
+        nlist = max(1, min(int(4 * math.sqrt(count)), count // 39))
+        nbits = min(8, int(math.log2(count // 39)))
+        quantizer = faiss.IndexFlatL2(dimension)
+        index = faiss.IndexIVFPQ(
+            quantizer, dimension, nlist, __pq_subquantizers(dimension), nbits
+        )
+        index.train(vectors)
+        index.nprobe = ivf_nprobe or max(1, nlist // 8)
+    index.add(vectors)
+    return index
+
+
+def build_vector_store(
+    texts: list[str],
+    vectors: np.ndarray,
+    metadatas: list[dict],
+    embeddings: Embeddings,
+    index_type: str = "flat",
+    **index_params,
+) -> FAISS:
+    index = build_index(vectors, index_type, **index_params)
+    ids = [str(uuid.uuid4()) for _ in texts]
+    docstore = InMemoryDocstore(
+        {
+            id: Document(page_content=text, metadata=metadata)
+            for id, text, metadata in zip(ids, texts, metadatas)
+        }
+    )
+    return FAISS(embeddings, index, docstore, dict(enumerate(ids)))
+
+
+def load_vector_store(
+    folder_path: str, embeddings: Embeddings, mmap: bool = False
+) -> FAISS:
+    """Load a saved FAISS store, optionally memory-mapping its vectors read-only.
+
+    Memory-mapped indexes are served from the page cache: processes loading the
+    same index share a single copy of it.
+    """
+    if not mmap:
+        return FAISS.load_local(
+            folder_path, embeddings, allow_dangerous_deserialization=True
+        )
+
+    index_path = os.path.join(folder_path, "index.faiss")
+    with open(index_path, "rb") as f:
+        fourcc = f.read(4)
+    # IO_FLAG_MMAP maps IVF lists ("Iw.." indexes), IO_FLAG_MMAP_IFC (recent
+    # FAISS only) maps flat storage, the two cannot be combined
+    if fourcc.startswith(b"Iw"):
+        flags = faiss.IO_FLAG_MMAP
+    else:
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+    index = faiss.read_index(index_path, flags | faiss.IO_FLAG_READ_ONLY)
+    with open(os.path.join(folder_path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+
+def __search_parameters(index: faiss.Index, selector) -> faiss.SearchParameters:
+    # Keep the index's own search settings, only restricting the candidates
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+    return faiss.SearchParameters(sel=selector)
+
+
+def filtered_search(
+    store: FAISS, embedding: list[float], k: int, positions: np.ndarray
+) -> list[Document]:
+    """Search only among the vectors at the given positions of the index."""
+    if len(positions) == 0:
+        return []
+    selector = faiss.IDSelectorBatch(np.asarray(positions, dtype=np.int64))
+    _, found = store.index.search(
+        np.asarray([embedding], dtype=np.float32),
+        min(k, len(positions)),
+        params=__search_parameters(store.index, selector),
+    )
+    return [
+        store.docstore.search(store.index_to_docstore_id[i]) for i in found[0] if i != -1
+    ]
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import os
+import aiofiles
+
+from tellar.character import Character
+from tellar.utils.http_client import HttpClientPool, default_http_pool
+from tellar.utils.single_flight import SingleFlight
+from tellar.utils.text_utils import hash_key
+
+# Logger
+logger = logging.getLogger(__name__)
+
+DESCRIPTION_PROMPT = "Describe yourself in a few words (no full sentence)."
+PICTURE_PROMPT = "Draw the most accurate portrait picture of you based on the information from story_tool. Use a picture style matching the era and universe of your story."
+GOAL_PROMPT = "What is your main goal in life (write it at 3rd person) ?"
+OPENER_PROMPT = "What would you say to someone you just met to engage the conversation ? (say it as like you speak to this person)"
+
+# Job: (file name, prompt)
+JOBS = {
+    "description": ("description.txt", DESCRIPTION_PROMPT),
+    "picture": ("picture.jpg", PICTURE_PROMPT),
+    "goal": ("goal.txt", GOAL_PROMPT),
+    "opener": ("opener.txt", OPENER_PROMPT),
+}
+
+
+class Warmup:
+    """Answers that do not depend on a conversation, computed once and kept on disk.
+
+    start() runs the jobs concurrently in the background; get() waits for the
+    result of a job (running it if needed). Results are saved under
+    ~/.tellar/warmup, keyed by character, book and language (and the prompts),
+    so restarts and other replicas with the same book do not compute them again.
+    Jobs wait for a progressive index to be complete: saved results are never
+    drawn from part of the book.
+    """
+
+    def __init__(
+        self,
+        char: Character,
+        jobs: tuple = tuple(JOBS),
+        user_data_path: str = None,
+        single_flight: SingleFlight = None,
+        http_pool: HttpClientPool = None,
+    ):
+        self.__char = char
+        self.jobs = jobs
+        if user_data_path is None:
+            user_data_path = os.path.join(os.path.expanduser("~"), ".tellar")
+        self.__user_data_path = user_data_path
+        self.__single_flight = single_flight or SingleFlight()
+        self.__http = http_pool or default_http_pool
+        self.__results = {}
+        self.__tasks = []
+
+    @property
+    def key(self) -> str:
+        return hash_key(self.__char.identity, *[prompt for _, prompt in JOBS.values()])
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.__user_data_path, "warmup", self.key)
+
+    def start(self):
+        """Run the jobs in the background (in the running event loop)."""
+        for job in self.jobs:
+            task = asyncio.create_task(self.get(job))
+            task.add_done_callback(lambda task, job=job: self.__log_failure(job, task))
+            self.__tasks.append(task)
+
+    def stop(self):
+        for task in self.__tasks:
+            task.cancel()
+        self.__single_flight.cancel()
+
+    async def get(self, job: str) -> str | bytes:
+        if job not in self.__results:
+            # Concurrent requests share the job (failed jobs run again when asked for)
+            self.__results[job] = await self.__single_flight.do(
+                ("warmup", job), lambda: self.__run(job)
+            )
+        return self.__results[job]
+
+    async def __run(self, job: str) -> str | bytes:
+        file_name, prompt = JOBS[job]
+        file_path = os.path.join(self.path, file_name)
+        binary = job == "picture"
+        if os.path.exists(file_path):
+            async with aiofiles.open(file_path, "rb" if binary else "r") as file:
+                return await file.read()
+
+        if not await asyncio.to_thread(self.__char.searchable_doc.wait_until_ready):
+            raise RuntimeError(f"The book could not be indexed: {self.__char.searchable_doc.progress.error}")
+
+        if job == "picture":
+            answer = await self.__char.clone().answer(prompt)
+            logger.info(f"Picture: {answer.image}")
+            response = await self.__http.client.get(answer.image)
+            response.raise_for_status()
+            result = response.content
+        elif job == "goal":
+            # Goals are given to the character itself: always in english
+            answer = await self.__char.clone(language="english").answer(prompt)
+            result = answer.text or ""
+        else:
+            answer = await self.__char.clone().answer(prompt)
+            result = answer.text or ""
+        logger.info(f"Warmed up {job}")
+
+        # Written aside then renamed: readers never see a partial file
+        os.makedirs(self.path, exist_ok=True)
+        temp_path = f"{file_path}.{os.getpid()}.tmp"
+        async with aiofiles.open(temp_path, "wb" if binary else "w") as file:
+            await file.write(result)
+        os.replace(temp_path, file_path)
+        return result
+
+    @staticmethod
+    def __log_failure(job: str, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Could not warm up {job}: {task.exception()}")
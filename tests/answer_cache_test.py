@@ -0,0 +1,83 @@
+import time
+import pytest
+from tellar.answer_cache import AnswerCache, content_words, normalize_query
+from tellar.utils.text_utils import hash_key
+
+
+@pytest.fixture
+def cache():
+    cache = AnswerCache(ttl=60, max_size=10)
+    yield cache
+    cache.close()
+
+
+def test_normalize_query():
+    assert normalize_query("  Who are   YOU ? ") == "who are you"
+
+
+def test_content_words():
+    assert content_words("Who is he, in chapter 2?") == {"who", "chapter", "2"}
+
+
+def test_answer_cache_similar_questions(cache):
+    context = hash_key("Harry", "english", None)
+    cache.put(context, "Tell me about your family", '{"text": "The Potters", "image": null}')
+
+    assert cache.get(context, "tell me about your family ?") == '{"text": "The Potters", "image": null}'
+    assert cache.get(context, "So, tell me about your family") is not None
+    assert cache.get(context, "Who are you?") is None
+    assert cache.stats.hits == 2
+    assert cache.stats.misses == 1
+    assert cache.stats.to_json()["saved_llm_calls"] == 2
+
+
+def test_answer_cache_one_different_word(cache):
+    context = hash_key("Harry", "english", None)
+    question = (
+        "Tell me everything you remember about the great battle at the river where your {} "
+        "fought against the northern armies during that long and terrible winter"
+    )
+    cache.put(context, question.format("father"), "My father...")
+
+    # Close embeddings, but another question
+    assert cache.get(context, question.format("brother")) is None
+    assert cache.get(context, question.format("father")) == "My father..."
+
+
+@pytest.mark.asyncio
+async def test_answer_cache_async(cache):
+    context = hash_key("Harry")
+    await cache.aput(context, "Who are you?", "I am Harry")
+
+    assert await cache.aget(context, "who are you") == "I am Harry"
+    assert await cache.aget(context, "who are you", cacheable=False) is None
+
+
+def test_answer_cache_contexts_are_separate(cache):
+    english = hash_key("Harry", "english", None)
+    french = hash_key("Harry", "french", None)
+    cache.put(english, "Who are you?", "I am Harry")
+
+    assert cache.get(french, "Who are you?") is None
+    assert cache.get(english, "Who are you?") == "I am Harry"
+
+
+def test_answer_cache_bypass(cache):
+    context = hash_key("Harry")
+    cache.put(context, "Who are you?", "I am Harry")
+
+    assert cache.get(context, "Who are you?", cacheable=False) is None
+    assert cache.stats.bypassed == 1
+    assert cache.stats.hits == 0
+
+
+def test_answer_cache_ttl():
+    cache = AnswerCache(ttl=0.1)
+    context = hash_key("Harry")
+    cache.put(context, "Who are you?", "I am Harry")
+    assert cache.get(context, "Who are you?") == "I am Harry"
+
+    time.sleep(0.2)
+
+    assert cache.get(context, "Who are you?") is None
+    cache.close()
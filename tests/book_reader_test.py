@@ -0,0 +1,64 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from langchain_community.document_loaders import PyPDFLoader
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from tellar.book_reader import BookReader
+
+
+@pytest.fixture
+def pdf_path(tmp_path, write_text_pdf):
+    path = str(tmp_path / "book.pdf")
+    pages = [
+        f"Page {i}, chapter {i // 10}. " + " ".join(f"word{i}x{j}," for j in range(150))
+        for i in range(40)
+    ]
+    write_text_pdf(path, pages)
+    return path
+
+
+def serial_chunks(pdf_path):
+    return PyPDFLoader(pdf_path).load_and_split(
+        text_splitter=RecursiveCharacterTextSplitter(
+            chunk_size=300, chunk_overlap=20, separators=[" ", ",", "\n"]
+        )
+    )
+
+
+def test_page_count(pdf_path):
+    reader = BookReader(pdf_path)
+    assert reader.page_count == 40
+
+
+def test_chunks_match_serial_loader(pdf_path):
+    reader = BookReader(
+        pdf_path, chunk_size=300, chunk_overlap=20, workers=1, pages_per_task=7
+    )
+    assert list(reader.chunks()) == serial_chunks(pdf_path)
+
+
+def test_parallel_chunks_match_serial_loader(pdf_path):
+    reader = BookReader(
+        pdf_path, chunk_size=300, chunk_overlap=20, workers=3, pages_per_task=5
+    )
+    chunks = list(reader.chunks())
+    assert chunks == serial_chunks(pdf_path)
+    assert [c.metadata["page"] for c in chunks] == sorted(
+        c.metadata["page"] for c in chunks
+    )
+
+
+def test_parallel_chunks_from_a_thread(pdf_path):
+    # Indexing threads start the reading processes: spawned, not forked
+    reader = BookReader(pdf_path, chunk_size=300, chunk_overlap=20, workers=2, pages_per_task=10)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        chunks = executor.submit(lambda: list(reader.chunks())).result()
+    assert chunks == serial_chunks(pdf_path)
+
+
+def test_stats(pdf_path):
+    reader = BookReader(pdf_path, chunk_size=300, workers=2, pages_per_task=10)
+    chunks = list(reader.chunks())
+    assert reader.stats.pages == 40
+    assert reader.stats.chunks == len(chunks)
+    assert reader.stats.seconds > 0
+    assert reader.stats.pages_per_second > 0
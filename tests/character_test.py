@@ -1,7 +1,12 @@
 import pytest
 from unittest.mock import Mock, patch, AsyncMock
 from pathlib import Path
-from tellar.character import Character, Answer
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessageChunk
+from tellar.answer_cache import AnswerCache
+from tellar.character import AnswerDelta, Character, Answer
+from tellar.library import LibraryView
+from tellar.searchable_document import SearchFilter
 
 
 class TestCharacter:
@@ -11,6 +16,7 @@ class TestCharacter:
     @patch("tellar.character.AgentExecutor")
     def setup(self, mock_agent_executor, mock_create_agent, mock_chat_openai):
         self.mock_searchable_doc = Mock()
+        self.mock_create_agent = mock_create_agent
         self.mock_model = Mock()
         mock_chat_openai.return_value = self.mock_model
         self.character = Character(
@@ -35,6 +41,21 @@ class TestCharacter:
         assert cloned.language == "French"
         assert cloned.goal == "New Goal"
         assert id(cloned) != id(self.character)
+        # The prompt, tools, agent and executor are shared
+        mock_create_agent.assert_not_called()
+        mock_agent_executor.assert_not_called()
+        assert cloned.template is self.character.template
+        assert cloned.executor is self.character.executor
+        assert cloned.chat_history is not self.character.chat_history
+
+    def test_template_session(self):
+        session = self.character.template.session(language="French", goal="Find the ring")
+        assert isinstance(session, Character)
+        assert session.name == "Test"
+        assert session.char_name == "TestChar"
+        assert session.language == "French"
+        assert session.searchable_doc is self.mock_searchable_doc
+        assert len(session.chat_history) == 0
 
     def test_answer_from_json_str(self):
         json_str = '{"text": "Hello", "image": "http://example.com/image.jpg"}'
@@ -60,5 +81,180 @@ class TestCharacter:
         assert isinstance(answer, Answer)
         assert answer.text == "Test answer"
         assert answer.image is None
+        inputs = self.character.executor.ainvoke.call_args.args[0]
+        assert inputs["input"] == "Test question"
+        assert inputs["language"] == "English"
+        assert inputs["goal"] == ""
         assert len(self.character.chat_history) == 2
-        
+        # History size sent with the turn (empty for the first one)
+        assert self.character.chat_history.stats.turn_tokens == [0]
+
+
+    @pytest.mark.asyncio
+    async def test_answer_cache(self):
+        answer_cache = AnswerCache()
+        self.character.answer_cache = answer_cache
+        self.character.executor = AsyncMock()
+        self.character.executor.ainvoke.return_value = {
+            "output": '{"text": "I am Harry", "image": null}'
+        }
+        # Another conversation with the same character
+        other = self.character.clone()
+        other.executor = self.character.executor
+
+        await self.character.answer("Who are you?")
+        answer = await other.answer("who are you")
+
+        assert answer.text == "I am Harry"
+        assert self.character.executor.ainvoke.call_count == 1
+        assert len(other.chat_history) == 2
+        # Once the conversation started, answers are not shared anymore
+        await other.answer("Who are you?")
+        assert self.character.executor.ainvoke.call_count == 2
+        assert answer_cache.stats.hits == 1
+        assert answer_cache.stats.bypassed == 1
+        answer_cache.close()
+
+    @pytest.mark.asyncio
+    async def test_answer_cache_partial_index(self):
+        answer_cache = AnswerCache()
+        self.character.answer_cache = answer_cache
+        self.character.executor = AsyncMock()
+        self.character.executor.ainvoke.return_value = {
+            "output": '{"text": "I am Harry", "image": null}'
+        }
+        self.mock_searchable_doc.progress.ready = False
+
+        other = self.character.clone()
+        other.executor = self.character.executor
+
+        await self.character.answer("Who are you?")
+        await other.answer("Who are you?")
+
+        # Not cached while the book is being indexed
+        assert self.character.executor.ainvoke.call_count == 2
+        assert answer_cache.stats.hits == 0
+        answer_cache.close()
+
+    def test_answer_context_of_library_views(self):
+        document = Mock()
+        document.manifest.key = "library-index"
+        contexts = []
+        for view in [
+            LibraryView(document),
+            LibraryView(document, SearchFilter(books=("book1.pdf",))),
+            LibraryView(document, SearchFilter(books=("book2.pdf",))),
+        ]:
+            self.character.template.searchable_doc = view
+            contexts.append(self.character.answer_context)
+
+        # Characters restricted to other books never share answers
+        assert len(set(contexts)) == 3
+        document.manifest.key = "other-index"
+        assert self.character.answer_context != contexts[-1]
+
+    def test_identity(self):
+        identity = self.character.identity
+        assert self.character.clone().identity == identity
+        self.character.language = "french"
+        assert self.character.identity != identity
+
+    def test_speech_file_per_session(self):
+        cloned = self.character.clone()
+        assert cloned.temp_speech_file_path != self.character.temp_speech_file_path
+        assert cloned.temp_speech_file_path.parent == self.character.temp_speech_file_path.parent
+        assert cloned.temp_speech_file_path.suffix == ".mp3"
+
+    @pytest.mark.asyncio
+    async def test_speak(self, tmp_path):
+        async def astream(text):
+            for audio in [b"first", b"second"]:
+                yield audio
+
+        self.character.template.speech = Mock()
+        self.character.template.speech.astream = Mock(side_effect=astream)
+        self.character.temp_speech_file_path = tmp_path / "speech" / "session.mp3"
+
+        path = await self.character.speak("Hello. How are you?")
+
+        assert path == tmp_path / "speech" / "session.mp3"
+        assert path.read_bytes() == b"firstsecond"
+        self.character.template.speech.astream.assert_called_once_with("Hello. How are you?")
+
+        # Removed with the conversation
+        self.character.close()
+        assert not path.exists()
+        self.character.close()
+
+    @pytest.mark.asyncio
+    async def test_astream(self):
+        def model_event(run_id, content):
+            return {"event": "on_chat_model_stream", "run_id": run_id, "parent_ids": ["root"], "data": {"chunk": AIMessageChunk(content=content)}}
+
+        async def events(*args, **kwargs):
+            # Tool calling step (no text), then the answer
+            yield model_event("step-1", "")
+            yield {"event": "on_tool_end", "run_id": "tool", "parent_ids": ["root"], "data": {"output": "passages"}}
+            for piece in ['{"te', 'xt": "Hel', 'lo\\n', 'Harry", "image": ', 'null}']:
+                yield model_event("step-2", piece)
+            yield {"event": "on_chain_end", "run_id": "sequence", "parent_ids": ["root"], "data": {"output": "not this one"}}
+            yield {"event": "on_chain_end", "run_id": "root", "parent_ids": [], "data": {"output": {"output": '{"text": "Hello\\nHarry", "image": null}'}}}
+
+        self.character.executor = Mock()
+        self.character.executor.astream_events = Mock(side_effect=events)
+
+        items = [item async for item in self.character.astream("Test question")]
+
+        deltas, answer = items[:-1], items[-1]
+        assert all(isinstance(delta, AnswerDelta) for delta in deltas)
+        assert "".join(delta.text for delta in deltas) == "Hello\nHarry"
+        assert answer == Answer(text="Hello\nHarry", image=None)
+        assert len(self.character.chat_history) == 2
+        assert self.character.executor.astream_events.call_args.kwargs == {"version": "v2"}
+
+    @pytest.mark.asyncio
+    async def test_astream_without_root_end_event(self):
+        async def events(*args, **kwargs):
+            for piece in ['{"text": "Hel', 'lo Harry"', ', "image": null}']:
+                yield {"event": "on_chat_model_stream", "run_id": "step-1", "parent_ids": ["root"], "data": {"chunk": AIMessageChunk(content=piece)}}
+
+        self.character.executor = Mock()
+        self.character.executor.astream_events = Mock(side_effect=events)
+
+        items = [item async for item in self.character.astream("Test question")]
+
+        # Answer rebuilt from the streamed text
+        assert items[-1] == Answer(text="Hello Harry", image=None)
+        assert len(self.character.chat_history) == 2
+
+    @pytest.mark.asyncio
+    async def test_astream_without_answer(self):
+        async def events(*args, **kwargs):
+            yield {"event": "on_tool_end", "run_id": "tool", "parent_ids": ["root"], "data": {"output": "passages"}}
+
+        self.character.executor = Mock()
+        self.character.executor.astream_events = Mock(side_effect=events)
+
+        with pytest.raises(RuntimeError, match="without an answer"):
+            [item async for item in self.character.astream("Test question")]
+        assert len(self.character.chat_history) == 0
+
+    @pytest.mark.asyncio
+    async def test_story_tool_is_async(self):
+        tools = self.mock_create_agent.call_args.args[1]
+        story_tool = next(t for t in tools if t.name == "story_tool")
+        self.mock_searchable_doc.asearch = AsyncMock(
+            return_value=[
+                Document(page_content="I live  in\nPrivet Drive.", metadata={"page": 3, "source": "book.pdf"}),
+                Document(page_content="I live in Privet Drive.", metadata={"page": 4, "source": "book.pdf"}),
+            ]
+        )
+
+        result = await story_tool.ainvoke({"query": "who am I"})
+
+        assert story_tool.coroutine is not None
+        self.mock_searchable_doc.asearch.assert_awaited_once_with("who am I", k=8)
+        self.mock_searchable_doc.search.assert_not_called()
+        # Deduplicated, without metadata
+        assert result == "I live in Privet Drive."
+        assert self.character.context_packer.stats.saved_tokens > 0
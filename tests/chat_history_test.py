@@ -0,0 +1,162 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from tellar.chat_history import MESSAGE_OVERHEAD_TOKENS, ChatHistory
+from tellar.utils.token_utils import TokenCounter
+
+
+class WordCounter(TokenCounter):
+    """One token per word: predictable budgets."""
+
+    def __init__(self):
+        self.encoding = None
+
+    def count(self, text):
+        return len(text.split())
+
+    def truncate(self, text, max_tokens):
+        return " ".join(text.split()[:max_tokens])
+
+
+def words(prefix, count):
+    return " ".join(f"{prefix}{i}" for i in range(count))
+
+
+@pytest.fixture
+def model():
+    model = AsyncMock()
+    model.ainvoke.return_value = AIMessage(content="They talked about wands and owls")
+    return model
+
+
+@pytest.mark.asyncio
+async def test_history_within_budget(model):
+    history = ChatHistory(model=model, token_budget=1000, token_counter=WordCounter())
+
+    await history.aadd_turn("Hello", "Hi there")
+
+    assert len(history) == 2
+    assert isinstance(history.messages[0], HumanMessage)
+    # Answers are the model's own messages
+    assert history.messages[1] == AIMessage(content="Hi there")
+    assert history.tokens == 3 + 2 * MESSAGE_OVERHEAD_TOKENS
+    model.ainvoke.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_history_folds_old_turns(model):
+    history = ChatHistory(model=model, token_budget=200, keep_turns=2, token_counter=WordCounter())
+
+    for turn in range(10):
+        history.record_turn_tokens()
+        await history.aadd_turn(words(f"q{turn}-", 20), words(f"a{turn}-", 30))
+
+    assert history.summary == "They talked about wands and owls"
+    assert isinstance(history.messages[0], SystemMessage)
+    assert "wands and owls" in history.messages[0].content
+    # Last turns kept verbatim
+    assert history.messages[-1].content == words("a9-", 30)
+    assert len(history) <= 1 + 2 * 2
+    assert history.stats.summarizations > 0
+    # The ceiling holds on every turn
+    assert history.stats.max_turn_tokens <= 200
+    assert len(history.stats.turn_tokens) == 10
+
+
+@pytest.mark.asyncio
+async def test_history_folds_in_the_background(model):
+    summarized = asyncio.Event()
+
+    async def summarize(messages):
+        await summarized.wait()
+        return AIMessage(content="They talked about wands and owls")
+
+    model.ainvoke.side_effect = summarize
+    history = ChatHistory(model=model, token_budget=100, keep_turns=1, token_counter=WordCounter())
+    history.add_turn(words("q0-", 30), words("a0-", 30))
+
+    # The reply does not wait for the summary, and the history stays whole meanwhile
+    history.add_turn(words("q1-", 30), words("a1-", 30))
+    await asyncio.sleep(0)
+    model.ainvoke.assert_awaited_once()
+    assert history.summary is None
+    assert len(history) == 4
+
+    summarized.set()
+    await history.wait_folded()
+    assert history.summary == "They talked about wands and owls"
+    assert len(history) == 3
+    assert history.tokens <= 100
+
+
+@pytest.mark.asyncio
+async def test_history_summary_is_incremental(model):
+    history = ChatHistory(model=model, token_budget=100, keep_turns=1, token_counter=WordCounter())
+
+    for turn in range(4):
+        await history.aadd_turn(words(f"q{turn}-", 20), words(f"a{turn}-", 20))
+
+    last_prompt = model.ainvoke.call_args.args[0][1].content
+    assert "Current summary: They talked about wands and owls" in last_prompt
+    assert "New lines:" in last_prompt
+
+
+@pytest.mark.asyncio
+async def test_history_summary_is_bounded(model):
+    model.ainvoke.return_value = AIMessage(content=words("s", 500))
+    history = ChatHistory(model=model, token_budget=100, keep_turns=1, summary_tokens=20, token_counter=WordCounter())
+
+    for turn in range(3):
+        await history.aadd_turn(words(f"q{turn}-", 20), words(f"a{turn}-", 20))
+
+    assert len(history.summary.split()) == 20
+
+
+@pytest.mark.asyncio
+async def test_history_keeps_last_turn(model):
+    history = ChatHistory(model=model, token_budget=50, keep_turns=2, token_counter=WordCounter())
+
+    await history.aadd_turn(words("q", 100), words("a", 100))
+
+    # Nothing older to fold
+    assert len(history) == 2
+    model.ainvoke.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_history_without_model():
+    history = ChatHistory(token_budget=100, keep_turns=1, token_counter=WordCounter())
+
+    for turn in range(4):
+        await history.aadd_turn(words(f"q{turn}-", 20), words(f"a{turn}-", 20))
+
+    # Old turns are dropped
+    assert history.summary is None
+    assert history.messages[0].content == words("q2-", 20)
+    assert history.tokens <= 100
+
+
+@pytest.mark.asyncio
+async def test_history_summary_failure(model):
+    model.ainvoke.side_effect = Exception("API down")
+    history = ChatHistory(model=model, token_budget=100, keep_turns=1, token_counter=WordCounter())
+
+    for turn in range(4):
+        await history.aadd_turn(words(f"q{turn}-", 20), words(f"a{turn}-", 20))
+
+    assert history.summary is None
+    assert history.tokens <= 100
+
+
+@pytest.mark.asyncio
+async def test_history_to_json_restore(model):
+    history = ChatHistory(model=model, token_budget=100, keep_turns=1, token_counter=WordCounter())
+    for i in range(3):
+        await history.aadd_turn(words("q", 20), words("a", 20))
+
+    restored = ChatHistory(model=model, token_budget=100, keep_turns=1, token_counter=WordCounter())
+    restored.restore(history.to_json())
+
+    assert restored.summary == history.summary
+    assert restored.messages == history.messages
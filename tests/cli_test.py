@@ -1,18 +1,22 @@
+import os
 import pytest
 from click.testing import CliRunner
-from unittest.mock import call, patch, MagicMock
+import asyncio
+from unittest.mock import AsyncMock, call, patch, MagicMock
+from tellar.character import Answer, AnswerDelta
 from tellar.cli import cli
+from tellar.indexer import IndexReport
 
 @pytest.fixture
 def runner():
     return CliRunner()
 
-@patch('tellar.cli.SearchableDocument')
+@patch('tellar.cli.Library')
 @patch('tellar.cli.Character')
 @patch('tellar.cli.Server')
 @patch('tellar.cli.os.path.isfile')
 @patch('tellar.cli.os.getenv')
-def test_cli_server_mode(mock_getenv, mock_isfile, mock_server, mock_character, mock_searchable_doc, runner):
+def test_cli_server_mode(mock_getenv, mock_isfile, mock_server, mock_character, mock_library, runner):
     mock_getenv.return_value = 'fake_api_key'
     mock_isfile.return_value = True
     mock_server_instance = MagicMock()
@@ -21,12 +25,28 @@ def test_cli_server_mode(mock_getenv, mock_isfile, mock_server, mock_character,
     result = runner.invoke(cli, ['--character', 'TestChar', '--pdf', 'test.pdf', '--serve'])
 
     assert result.exit_code == 0
-    mock_searchable_doc.assert_called_once_with('test.pdf')
+    mock_library.open.assert_called_once_with(('test.pdf',), search_mode='vector', progressive=False, embeddings='openai')
+    mock_library.open.return_value.view.assert_called_once_with(books=None)
     mock_character.assert_called_once()
     mock_server.assert_called_once()
     mock_server_instance.start.assert_called_once()
 
 
+@patch('tellar.cli.Library')
+@patch('tellar.cli.Character')
+@patch('tellar.cli.Server')
+@patch('tellar.cli.os.path.isfile')
+@patch('tellar.cli.os.getenv')
+def test_cli_search_options(mock_getenv, mock_isfile, mock_server, mock_character, mock_library, runner):
+    mock_getenv.return_value = 'fake_api_key'
+    mock_isfile.return_value = True
+
+    result = runner.invoke(cli, ['--character', 'TestChar', '--pdf', 'test.pdf', '--serve', '--search-mode', 'hybrid', '--progressive', '--embeddings', 'hashing'])
+
+    assert result.exit_code == 0
+    mock_library.open.assert_called_once_with(('test.pdf',), search_mode='hybrid', progressive=True, embeddings='hashing')
+
+
 @patch('tellar.cli.os.getenv')
 def test_cli_missing_api_key(mock_getenv, runner):
     mock_getenv.return_value = None
@@ -46,3 +66,155 @@ def test_cli_missing_pdf(mock_isfile, mock_getenv, runner):
 
     assert result.exit_code == 1
     assert "PDF file not found." in result.output
+
+
+@patch('tellar.cli.Library')
+@patch('tellar.cli.Character')
+@patch('tellar.cli.Server')
+@patch('tellar.cli.os.path.isfile')
+@patch('tellar.cli.os.getenv')
+def test_cli_library(mock_getenv, mock_isfile, mock_server, mock_character, mock_library, runner):
+    mock_getenv.return_value = 'fake_api_key'
+    mock_isfile.return_value = True
+    library = mock_library.open.return_value
+
+    result = runner.invoke(cli, ['--character', 'TestChar', '--pdf', 'book1.pdf', '--pdf', 'book2.pdf', '--book', 'book2.pdf', '--serve'])
+
+    assert result.exit_code == 0
+    mock_library.open.assert_called_once_with(('book1.pdf', 'book2.pdf'), search_mode='vector', progressive=False, embeddings='openai')
+    library.view.assert_called_once_with(books=['book2.pdf'])
+    assert mock_character.call_args.kwargs['searchable_doc'] == library.view.return_value
+
+
+@patch('tellar.cli.Character')
+@patch('tellar.cli.Server')
+@patch('tellar.cli.os.path.isfile')
+@patch('tellar.cli.os.getenv')
+def test_cli_unknown_book_with_single_pdf(mock_getenv, mock_isfile, mock_server, mock_character, runner, tmp_path, monkeypatch, write_text_pdf):
+    mock_getenv.return_value = 'fake_api_key'
+    mock_isfile.return_value = True
+    monkeypatch.setenv('HOME', str(tmp_path))
+    path = str(tmp_path / 'book1.pdf')
+    write_text_pdf(path, ['The wizard walks to the castle'])
+
+    result = runner.invoke(cli, ['--character', 'TestChar', '--pdf', path, '--book', 'bok1.pdf', '--serve', '--embeddings', 'hashing'])
+
+    assert result.exit_code == 1
+    assert 'Unknown books: bok1.pdf' in result.output
+    mock_character.assert_not_called()
+
+
+@patch('tellar.cli.Library')
+@patch('tellar.cli.Character')
+@patch('tellar.cli.os.path.isfile')
+@patch('tellar.cli.os.getenv')
+def test_cli_interactive_mode_single_event_loop(mock_getenv, mock_isfile, mock_character, mock_library, runner):
+    mock_getenv.return_value = 'fake_api_key'
+    mock_isfile.return_value = True
+    char = mock_character.return_value
+    char.name = 'TestChar'
+    char.openai_pool.aclose = AsyncMock()
+    loops = []
+
+    async def astream(message):
+        loops.append(asyncio.get_running_loop())
+        yield AnswerDelta(text=f'Re: {message}')
+        yield Answer(text=f'Re: {message}')
+
+    char.astream = astream
+
+    result = runner.invoke(cli, ['--character', 'TestChar', '--pdf', 'test.pdf'], input='Hello\nBye\n')
+
+    # Input exhausted: the prompt loop ends (aborted)
+    assert result.exit_code == 1
+    assert 'Re: Hello' in result.output and 'Re: Bye' in result.output
+    assert len(loops) == 2 and loops[0] is loops[1]
+    char.openai_pool.aclose.assert_awaited_once()
+
+
+@patch('tellar.cli.os.system')
+@patch('tellar.cli.Library')
+@patch('tellar.cli.Character')
+@patch('tellar.cli.os.path.isfile')
+@patch('tellar.cli.os.getenv')
+def test_cli_voice_mode_removes_speech_file(mock_getenv, mock_isfile, mock_character, mock_library, mock_system, runner, tmp_path, monkeypatch):
+    mock_getenv.return_value = 'fake_api_key'
+    mock_isfile.return_value = True
+    monkeypatch.setattr('tempfile.tempdir', str(tmp_path))
+    char = mock_character.return_value
+    char.name = 'TestChar'
+    char.openai_pool.aclose = AsyncMock()
+    played = []
+
+    async def astream(message):
+        yield Answer(text='Hello. Bye.')
+
+    async def astream_speech(pieces):
+        async for _ in pieces:
+            pass
+        for audio in [b'first', b'second']:
+            yield audio
+
+    def system(command):
+        path = command.split(' ', 1)[1]
+        with open(path, 'rb') as file:
+            played.append(file.read())
+
+    char.astream = astream
+    char.astream_speech = astream_speech
+    mock_system.side_effect = system
+
+    runner.invoke(cli, ['--character', 'TestChar', '--pdf', 'test.pdf', '--voice'], input='Hello\n')
+
+    assert played == [b'first', b'second']
+    # Played, then removed
+    assert list(tmp_path.iterdir()) == []
+
+
+@patch('tellar.cli.build_indexes')
+@patch('tellar.cli.find_pdfs')
+@patch('tellar.cli.Character')
+def test_cli_index(mock_character, mock_find_pdfs, mock_build_indexes, runner, tmp_path):
+    mock_find_pdfs.return_value = ['book1.pdf', 'book2.pdf']
+    mock_build_indexes.return_value = [
+        IndexReport('book1.pdf', 'built', 1.5, pages=10, chunks=20, size=2_000_000),
+        IndexReport('book2.pdf', 'cached', 0.1, pages=0, chunks=30, size=3_000_000),
+    ]
+
+    result = runner.invoke(cli, ['index', str(tmp_path), '--jobs', '4', '--embeddings', 'hashing'])
+
+    assert result.exit_code == 0
+    mock_find_pdfs.assert_called_once_with((str(tmp_path),))
+    mock_build_indexes.assert_called_once_with(['book1.pdf', 'book2.pdf'], jobs=4, embeddings='hashing')
+    assert 'book1.pdf' in result.output and 'cached' in result.output
+    # No character, no LLM
+    mock_character.assert_not_called()
+
+
+@patch('tellar.cli.build_library')
+@patch('tellar.cli.build_indexes')
+@patch('tellar.cli.find_pdfs')
+def test_cli_index_library(mock_find_pdfs, mock_build_indexes, mock_build_library, runner, tmp_path):
+    mock_find_pdfs.return_value = ['book1.pdf', 'book2.pdf']
+    mock_build_library.return_value = IndexReport(
+        os.pathsep.join(['book1.pdf', 'book2.pdf']), 'built', 2.0, pages=20, chunks=50, size=5_000_000
+    )
+
+    result = runner.invoke(cli, ['index', str(tmp_path), '--library', '--embeddings', 'hashing'])
+
+    assert result.exit_code == 0
+    mock_build_library.assert_called_once_with(['book1.pdf', 'book2.pdf'], embeddings='hashing')
+    mock_build_indexes.assert_not_called()
+    assert 'book1.pdf, book2.pdf' in result.output
+
+
+@patch('tellar.cli.build_indexes')
+@patch('tellar.cli.find_pdfs')
+def test_cli_index_failure(mock_find_pdfs, mock_build_indexes, runner, tmp_path):
+    mock_find_pdfs.return_value = ['book1.pdf']
+    mock_build_indexes.return_value = [IndexReport('book1.pdf', 'failed', 0.1, error='broken PDF')]
+
+    result = runner.invoke(cli, ['index', str(tmp_path), '--embeddings', 'hashing'])
+
+    assert result.exit_code == 1
+    assert 'broken PDF' in result.output
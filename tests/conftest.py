@@ -0,0 +1,9 @@
+import pytest
+
+from benchmarks.synthetic import write_text_pdf as _write_text_pdf
+
+
+@pytest.fixture
+def write_text_pdf():
+    """Writer of minimal PDF books, one page per text."""
+    return _write_text_pdf
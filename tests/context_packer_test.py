@@ -0,0 +1,109 @@
+import pytest
+from langchain_core.documents import Document
+from tellar.context_packer import BASELINE_PASSAGES, ContextPacker
+from tellar.utils.token_utils import TokenCounter
+
+
+class WordCounter(TokenCounter):
+    """One token per word: predictable budgets."""
+
+    def __init__(self):
+        self.encoding = None
+
+    def count(self, text):
+        return len(text.split())
+
+    def truncate(self, text, max_tokens):
+        return " ".join(text.split()[:max_tokens])
+
+
+def doc(text, page=0):
+    return Document(page_content=text, metadata={"source": "/books/book.pdf", "page": page})
+
+
+def words(prefix, count):
+    return " ".join(f"{prefix}{i}" for i in range(count))
+
+
+@pytest.fixture
+def packer():
+    return ContextPacker(token_budget=100, min_passage_tokens=10, token_counter=WordCounter())
+
+
+def test_strip_metadata_and_whitespace(packer):
+    packed = packer.pack([doc("Harry  lives\nin Privet   Drive.")])
+
+    assert packed.text == "Harry lives in Privet Drive."
+    assert "page" not in packed.text
+    assert packed.passages == 1
+
+
+def test_deduplicate(packer):
+    passage = words("a", 30)
+    packed = packer.pack(
+        [
+            doc(passage),
+            doc(passage + " extra", page=1),
+            # Contained in the first passage
+            doc(words("a", 20), page=2),
+            doc(words("b", 30), page=3),
+        ]
+    )
+
+    assert packed.passages == 2
+    assert packed.text == passage + "\n\n" + words("b", 30)
+
+
+def test_token_budget(packer):
+    packed = packer.pack([doc(words("a", 60)), doc(words("b", 60)), doc(words("c", 60))])
+
+    # Second passage is truncated to what is left of the budget, third is dropped
+    assert packed.tokens <= 100
+    assert packed.passages == 2
+    assert packed.text.split("\n\n")[1] == words("b", 39)
+    assert "c0" not in packed.text
+
+
+def test_budget_too_small_for_truncated_passage(packer):
+    packed = packer.pack([doc(words("a", 95)), doc(words("b", 60))])
+
+    assert packed.passages == 1
+    assert packed.text == words("a", 95)
+
+
+def test_saved_tokens(packer):
+    docs = [doc(words("a", 60)), doc(words("a", 60), page=1)]
+    packed = packer.pack(docs)
+
+    assert packed.raw_tokens == WordCounter().count(str(docs))
+    assert packed.saved_tokens == packed.raw_tokens - packed.tokens
+    assert packer.stats.calls == 1
+    assert packer.stats.saved_tokens == packed.saved_tokens
+
+
+def test_saved_tokens_against_baseline_passages(packer):
+    # Only the passages story_tool used to return are counted as saved
+    docs = [doc(words(prefix, 10), page=page) for page, prefix in enumerate("abcdefgh")]
+    packed = packer.pack(docs)
+
+    assert packed.raw_tokens == WordCounter().count(str(docs[:BASELINE_PASSAGES]))
+
+
+def test_default_budget_fits_baseline_passages():
+    # 1000 character chunks: about 250 tokens each
+    packer = ContextPacker(token_counter=WordCounter())
+    docs = [doc(words(prefix, 250), page=page) for page, prefix in enumerate("abcdefgh")]
+
+    packed = packer.pack(docs)
+
+    assert packed.passages >= BASELINE_PASSAGES
+    assert packed.text.split("\n\n")[:BASELINE_PASSAGES] == [
+        words(prefix, 250) for prefix in "abcd"
+    ]
+
+
+def test_empty(packer):
+    packed = packer.pack([])
+
+    assert packed.text == ""
+    assert packed.passages == 0
@@ -0,0 +1,156 @@
+import os
+import threading
+import time
+import httpx
+import numpy as np
+import openai
+import pytest
+from unittest.mock import patch
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_core.documents import Document
+from tellar.embedder import BatchEmbedder
+from tellar.embedding_cache import EmbeddingCache
+
+
+class FlakyEmbeddings(DeterministicFakeEmbedding):
+    """Fake embeddings failing on demand, recording calls."""
+
+    fail_on: set = set()
+    rate_limited: int = 0
+    calls: list = []
+
+    def embed_documents(self, texts):
+        self.calls.append(texts)
+        if self.rate_limited > 0:
+            self.rate_limited -= 1
+            raise openai.RateLimitError(
+                "Rate limit reached",
+                response=httpx.Response(429, request=httpx.Request("POST", "http://test")),
+                body=None,
+            )
+        if any(text in self.fail_on for text in texts):
+            raise RuntimeError("Embedding failed")
+        return super().embed_documents(texts)
+
+
+@pytest.fixture
+def chunks():
+    return [Document(page_content=f"chunk {i}", metadata={"page": i}) for i in range(10)]
+
+
+@pytest.fixture
+def embeddings():
+    return FlakyEmbeddings(size=8, fail_on=set(), calls=[])
+
+
+def test_embed_in_ordered_batches(embeddings, chunks):
+    embedder = BatchEmbedder(embeddings, batch_size=4, max_concurrency=3)
+
+    results = list(embedder.embed(iter(chunks)))
+
+    assert [len(batch) for batch, _ in results] == [4, 4, 2]
+    assert [doc for batch, _ in results for doc in batch] == chunks
+    vectors = np.concatenate([vectors for _, vectors in results])
+    assert vectors.dtype == np.float32
+    np.testing.assert_allclose(
+        vectors, embeddings.embed_documents([c.page_content for c in chunks]), rtol=1e-6
+    )
+    assert embedder.stats.batches == 3
+    assert embedder.stats.chunks == 10
+
+
+def test_bounded_concurrency(chunks):
+    lock = threading.Lock()
+    running = [0, 0]
+
+    class SlowEmbeddings(DeterministicFakeEmbedding):
+        def embed_documents(self, texts):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+            return super().embed_documents(texts)
+
+    embedder = BatchEmbedder(SlowEmbeddings(size=4), batch_size=1, max_concurrency=2)
+    list(embedder.embed(chunks))
+
+    assert running[1] <= 2
+
+
+@patch("tellar.embedder.time.sleep")
+def test_retry_on_rate_limit(mock_sleep, embeddings, chunks):
+    embeddings.rate_limited = 2
+    embedder = BatchEmbedder(embeddings, batch_size=10, max_concurrency=1, initial_backoff=1.0)
+
+    results = list(embedder.embed(chunks))
+
+    assert len(results) == 1
+    assert embedder.stats.retries == 2
+    delays = [c.args[0] for c in mock_sleep.call_args_list]
+    assert 0.5 <= delays[0] <= 1.0
+    assert 1.0 <= delays[1] <= 2.0
+
+
+@patch("tellar.embedder.time.sleep")
+def test_retry_gives_up(mock_sleep, embeddings, chunks):
+    embeddings.rate_limited = 10
+    embedder = BatchEmbedder(embeddings, batch_size=10, max_retries=3)
+
+    with pytest.raises(openai.RateLimitError):
+        list(embedder.embed(chunks))
+    assert embedder.stats.retries == 3
+
+
+def test_resume_from_checkpoint(embeddings, chunks, tmp_path):
+    checkpoint_path = str(tmp_path / "checkpoint")
+    embeddings.fail_on = {"chunk 7"}
+    embedder = BatchEmbedder(
+        embeddings, batch_size=3, max_concurrency=1, checkpoint_path=checkpoint_path
+    )
+
+    with pytest.raises(RuntimeError):
+        list(embedder.embed(chunks))
+    assert len(os.listdir(checkpoint_path)) == 2
+
+    # Second run only embeds the missing batches
+    embeddings.fail_on = set()
+    embeddings.calls.clear()
+    results = list(embedder.embed(chunks))
+
+    assert [doc for batch, _ in results for doc in batch] == chunks
+    assert embedder.stats.resumed_batches == 2
+    assert embeddings.calls == [["chunk 6", "chunk 7", "chunk 8"], ["chunk 9"]]
+
+    embedder.clear_checkpoint()
+    assert not os.path.exists(checkpoint_path)
+
+
+def test_checkpoint_ignores_changed_chunks(embeddings, chunks, tmp_path):
+    checkpoint_path = str(tmp_path / "checkpoint")
+    embedder = BatchEmbedder(embeddings, batch_size=5, checkpoint_path=checkpoint_path)
+    list(embedder.embed(chunks))
+
+    chunks[0] = Document(page_content="edited chunk")
+    list(embedder.embed(chunks))
+
+    assert embedder.stats.resumed_batches == 1
+
+
+def test_embedding_cache(embeddings, chunks, tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"))
+    embedder = BatchEmbedder(embeddings, batch_size=4, cache=cache)
+    first = np.concatenate([vectors for _, vectors in embedder.embed(chunks)])
+
+    # A new edition: one chunk changed, one added
+    chunks[3] = Document(page_content="edited chunk")
+    chunks.append(Document(page_content="new chunk"))
+    embeddings.calls.clear()
+    second = np.concatenate([vectors for _, vectors in embedder.embed(chunks)])
+
+    assert sorted(text for call in embeddings.calls for text in call) == ["edited chunk", "new chunk"]
+    assert embedder.stats.cached_chunks == 9
+    np.testing.assert_array_equal(first[:3], second[:3])
+    np.testing.assert_array_equal(first[4:], second[4:10])
+    cache.close()
@@ -0,0 +1,72 @@
+import threading
+import numpy as np
+import pytest
+from tellar.embedding_cache import EmbeddingCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache" / "embeddings.sqlite"))
+    yield cache
+    cache.close()
+
+
+def test_get_missing(cache):
+    assert cache.get_many("model", ["a", "b"]) == [None, None]
+    assert cache.stats.misses == 2
+    assert cache.stats.hits == 0
+
+
+def test_put_and_get(cache):
+    cache.put_many("model", ["a", "b"], [[1.0, 2.0], [3.0, 4.0]])
+
+    vectors = cache.get_many("model", ["b", "c", "a"])
+
+    np.testing.assert_array_equal(vectors[0], [3.0, 4.0])
+    assert vectors[1] is None
+    np.testing.assert_array_equal(vectors[2], [1.0, 2.0])
+    assert vectors[0].dtype == np.float32
+    assert cache.stats.hits == 2
+    assert cache.stats.misses == 1
+    assert len(cache) == 2
+
+
+def test_keyed_by_model(cache):
+    cache.put_many("model-a", ["a"], [[1.0]])
+
+    assert cache.get_many("model-b", ["a"]) == [None]
+
+
+def test_persistent(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    cache = EmbeddingCache(path)
+    cache.put_many("model", ["a"], [[1.0, 2.0]])
+    cache.close()
+
+    cache = EmbeddingCache(path)
+    np.testing.assert_array_equal(cache.get_many("model", ["a"])[0], [1.0, 2.0])
+    cache.close()
+
+
+def test_large_batches(cache):
+    texts = [f"text {i}" for i in range(1200)]
+    cache.put_many("model", texts, np.arange(1200, dtype=np.float32).reshape(-1, 1))
+
+    vectors = cache.get_many("model", texts)
+
+    assert [v[0] for v in vectors] == list(range(1200))
+
+
+def test_concurrent_access(cache):
+    def worker(n):
+        texts = [f"{n}-{i}" for i in range(50)]
+        cache.put_many("model", texts, [[float(i)] for i in range(50)])
+        assert all(v is not None for v in cache.get_many("model", texts))
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(cache) == 200
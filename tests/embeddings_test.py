@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from unittest.mock import patch
+from tellar.embeddings import HashingEmbeddings, create_embeddings
+
+
+def cosine(a, b):
+    return float(np.dot(a, b))
+
+
+def test_hashing_embeddings_shape_and_norm():
+    embeddings = HashingEmbeddings(dimension=128)
+
+    vectors = embeddings.embed_documents(["The wizard walks to the castle", "Dinner is served"])
+
+    assert len(vectors) == 2
+    assert all(len(vector) == 128 for vector in vectors)
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0, atol=1e-5)
+
+
+def test_hashing_embeddings_are_deterministic():
+    first = HashingEmbeddings().embed_query("Who lives in Privet Drive?")
+    second = HashingEmbeddings().embed_query("Who lives in Privet Drive?")
+
+    assert first == second
+
+
+def test_hashing_embeddings_similarity():
+    embeddings = HashingEmbeddings()
+    query = embeddings.embed_query("where does Harry live")
+    related = embeddings.embed_query("Harry lives with his uncle, Harry does not live at Hogwarts in summer")
+    unrelated = embeddings.embed_query("Quidditch is played on broomsticks")
+
+    assert cosine(query, related) > cosine(query, unrelated)
+
+
+def test_hashing_embeddings_empty_text():
+    assert HashingEmbeddings(dimension=16).embed_query("") == [0.0] * 16
+
+
+def test_hashing_embeddings_model_name():
+    assert HashingEmbeddings().model != HashingEmbeddings(dimension=256).model
+
+
+def test_hashing_embeddings_invalid_settings():
+    with pytest.raises(ValueError):
+        HashingEmbeddings(dimension=384, nonzeros=7)
+
+
+@pytest.mark.asyncio
+async def test_hashing_embeddings_async():
+    embeddings = HashingEmbeddings()
+
+    assert await embeddings.aembed_query("castle") == embeddings.embed_query("castle")
+    assert await embeddings.aembed_documents(["castle"]) == embeddings.embed_documents(["castle"])
+
+
+def test_create_embeddings():
+    assert isinstance(create_embeddings("hashing"), HashingEmbeddings)
+    with patch("tellar.embeddings.OpenAIEmbeddings") as mock_openai:
+        assert create_embeddings("openai") == mock_openai.return_value
+    with pytest.raises(ValueError):
+        create_embeddings("unknown")
+
+
+def test_hashing_embeddings_uniform_columns():
+    embeddings = HashingEmbeddings(dimension=384, bigrams=False)
+    vectors = np.array(embeddings.embed_documents([f"word{i}" for i in range(20000)]))
+
+    # Each column is used about as often (384 is not a power of two)
+    usage = (vectors != 0).sum(axis=0)
+    assert usage[:128].mean() / usage[128:].mean() == pytest.approx(1.0, abs=0.05)
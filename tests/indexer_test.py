@@ -0,0 +1,87 @@
+import os
+from unittest.mock import patch
+import pytest
+from tellar.indexer import build_indexes, build_library, find_pdfs
+from tellar.searchable_document import SearchableDocument
+
+
+@pytest.fixture(autouse=True)
+def home_dir(tmp_path, monkeypatch):
+    home = tmp_path / "home"
+    home.mkdir()
+    monkeypatch.setenv("HOME", str(home))
+    return home
+
+
+@pytest.fixture
+def books_dir(tmp_path, write_text_pdf):
+    books = tmp_path / "books"
+    (books / "series").mkdir(parents=True)
+    write_text_pdf(str(books / "book1.pdf"), [f"Book one, page {p}" for p in range(3)])
+    write_text_pdf(str(books / "series" / "book2.PDF"), [f"Book two, page {p}" for p in range(2)])
+    (books / "notes.txt").write_text("not a book")
+    return books
+
+
+def test_find_pdfs(books_dir):
+    other = str(books_dir / "notes.txt")
+
+    pdf_paths = find_pdfs([str(books_dir), other])
+
+    assert [os.path.basename(p) for p in pdf_paths] == ["book1.pdf", "book2.PDF", "notes.txt"]
+
+
+def test_build_indexes(books_dir):
+    pdf_paths = find_pdfs([str(books_dir)])
+
+    reports = build_indexes(pdf_paths, jobs=2, embeddings="hashing", workers=1)
+
+    assert [r.pdf_path for r in reports] == pdf_paths
+    assert [r.status for r in reports] == ["built", "built"]
+    assert [r.pages for r in reports] == [3, 2]
+    assert [r.chunks for r in reports] == [3, 2]
+    assert all(r.size > 0 for r in reports)
+
+    # Second run only loads the indexes
+    reports = build_indexes(pdf_paths, embeddings="hashing", workers=1)
+
+    assert [r.status for r in reports] == ["cached", "cached"]
+    assert [r.chunks for r in reports] == [3, 2]
+
+
+def test_build_library(books_dir):
+    pdf_paths = find_pdfs([str(books_dir)])
+
+    report = build_library(pdf_paths, embeddings="hashing", workers=1)
+
+    assert report.name == "book1.pdf, book2.PDF"
+    assert report.status == "built"
+    assert report.pages == 5
+    assert report.chunks == 5
+    # What the chat command opens with these books
+    assert build_library(pdf_paths, embeddings="hashing", workers=1).status == "cached"
+    doc = SearchableDocument(pdf_paths, embeddings="hashing", workers=1)
+    assert doc.progress.total_pages == 0 and doc.chunk_count == 5
+
+
+def test_build_indexes_failure(books_dir, tmp_path):
+    broken = tmp_path / "broken.pdf"
+    broken.write_text("not a pdf")
+
+    reports = build_indexes([str(broken), str(books_dir / "book1.pdf")], embeddings="hashing", workers=1)
+
+    assert reports[0].status == "failed"
+    assert reports[0].error
+    assert reports[1].status == "built"
+
+
+def test_build_indexes_shares_processes(books_dir):
+    pdf_paths = find_pdfs([str(books_dir)])
+
+    with patch("tellar.indexer.os.cpu_count", return_value=8), patch("tellar.indexer.SearchableDocument") as mock_doc:
+        mock_doc.return_value.db_path = str(books_dir)
+        mock_doc.return_value.progress.total_pages = 0
+        build_indexes(pdf_paths, jobs=4, embeddings="hashing")
+
+    # 4 books at a time, 2 reading processes each
+    assert {call.kwargs["workers"] for call in mock_doc.call_args_list} == {2}
@@ -0,0 +1,51 @@
+from tellar.lexical_index import LexicalIndex, tokenize
+
+TEXTS = [
+    "Harry Potter lives with the Dursleys in Privet Drive.",
+    "Hogwarts School of Witchcraft and Wizardry.",
+    "Hermione Granger casts Wingardium Leviosa in the Hogwarts classroom.",
+    "The Dursleys hate magic, Dursleys Dursleys.",
+]
+
+
+def test_tokenize():
+    assert tokenize("Wingardium Leviosa, Hermione!") == ["wingardium", "leviosa", "hermione"]
+
+
+def test_search():
+    index = LexicalIndex.build(TEXTS)
+
+    results = index.search("Leviosa", k=4)
+
+    assert [i for i, _ in results] == [2]
+    assert results[0][1] > 0
+
+
+def test_search_ranking():
+    index = LexicalIndex.build(TEXTS)
+
+    results = index.search("Dursleys Hogwarts", k=4)
+
+    # Term frequency counts: the chunk repeating "Dursleys" comes first
+    assert results[0][0] == 3
+    assert {i for i, _ in results} == {0, 1, 2, 3}
+    scores = [score for _, score in results]
+    assert scores == sorted(scores, reverse=True)
+    assert index.search("Dursleys Hogwarts", k=2) == results[:2]
+
+
+def test_search_unknown_terms():
+    index = LexicalIndex.build(TEXTS)
+
+    assert index.search("Voldemort") == []
+    assert index.search("") == []
+
+
+def test_save_and_load(tmp_path):
+    index = LexicalIndex.build(TEXTS)
+    path = str(tmp_path / "lexical.pkl")
+    index.save(path)
+
+    loaded = LexicalIndex.load(path)
+
+    assert loaded.search("hogwarts classroom") == index.search("hogwarts classroom")
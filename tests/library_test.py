@@ -0,0 +1,98 @@
+import pytest
+from tellar.library import Library, LibraryView
+from tellar.searchable_document import SearchFilter
+
+
+@pytest.fixture(autouse=True)
+def home_dir(tmp_path, monkeypatch):
+    home = tmp_path / "home"
+    home.mkdir()
+    monkeypatch.setenv("HOME", str(home))
+    yield home
+    Library.close_all()
+
+
+@pytest.fixture
+def books(tmp_path, write_text_pdf):
+    paths = []
+    for number in (1, 2):
+        path = str(tmp_path / f"book{number}.pdf")
+        write_text_pdf(
+            path,
+            [f"Book {number} page {page}: the wizard walks to the castle" for page in range(4)],
+        )
+        paths.append(path)
+    return paths
+
+
+@pytest.fixture
+def library(books):
+    return Library.open(books, workers=1, search_mode="hybrid", embeddings="hashing")
+
+
+def test_library_indexes_all_books(library):
+    assert library.books == ["book1.pdf", "book2.pdf"]
+    assert library.document.progress.total_pages == 8
+    assert library.document.progress.indexed_pages == 8
+
+    results = library.view().search("wizard castle", k=8)
+
+    assert len(results) == 8
+    assert {doc.metadata["book"] for doc in results} == {"book1.pdf", "book2.pdf"}
+
+
+def test_library_is_loaded_once(library, books):
+    assert Library.open(books, workers=1, search_mode="hybrid", embeddings="hashing") is library
+    assert Library.open(books, workers=1, search_mode="vector", embeddings="hashing") is not library
+
+
+@pytest.mark.parametrize("mode", ["vector", "lexical", "hybrid"])
+def test_library_view_filters_books(library, mode):
+    view = library.view(books=["book2.pdf"])
+
+    results = view.search("wizard castle", k=8, mode=mode)
+
+    assert len(results) == 4
+    assert {doc.metadata["book"] for doc in results} == {"book2.pdf"}
+
+
+def test_library_view_filters_pages(library):
+    view = library.view(books=["book1.pdf"], pages=(1, 3))
+
+    results = view.search("wizard castle", k=8, mode="vector")
+
+    assert sorted(doc.metadata["page"] for doc in results) == [1, 2]
+    assert all(doc.metadata["book"] == "book1.pdf" for doc in results)
+
+
+@pytest.mark.asyncio
+async def test_library_view_asearch(library):
+    view = library.view(books=["book1.pdf"])
+
+    results = await view.asearch("wizard castle", k=2)
+
+    assert len(results) == 2
+    assert all(doc.metadata["book"] == "book1.pdf" for doc in results)
+    assert view.progress is library.document.progress
+
+
+def test_library_views_share_the_index(library):
+    first, second = library.view(books=["book1.pdf"]), library.view(books=["book2.pdf"])
+
+    assert isinstance(first, LibraryView)
+    assert first.document is second.document
+    assert first.filter == SearchFilter(books=("book1.pdf",))
+
+
+def test_library_view_unknown_book(library):
+    with pytest.raises(ValueError):
+        library.view(books=["book3.pdf"])
+
+
+def test_search_filter_matches():
+    search_filter = SearchFilter(books=("book1.pdf",), pages=(2, 4))
+
+    assert search_filter.matches({"book": "book1.pdf", "page": 2})
+    assert not search_filter.matches({"book": "book1.pdf", "page": 4})
+    assert not search_filter.matches({"book": "book2.pdf", "page": 3})
+    assert SearchFilter().matches({"page": 0})
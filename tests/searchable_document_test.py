@@ -1,13 +1,26 @@
+import json
+import threading
+import time
 import pytest
 import os
 from unittest.mock import Mock, patch
-from tellar.searchable_document import SearchableDocument
+from tellar.searchable_document import IndexManifest, SearchableDocument
 from langchain_community.vectorstores import FAISS
 from langchain_core.documents import Document
+from langchain_community.embeddings import DeterministicFakeEmbedding
+
+@pytest.fixture(autouse=True)
+def home_dir(tmp_path, monkeypatch):
+    home = tmp_path / "home"
+    home.mkdir()
+    monkeypatch.setenv("HOME", str(home))
+    return home
 
 @pytest.fixture
-def mock_pdf_path():
-    return "/path/to/mock.pdf"
+def mock_pdf_path(tmp_path):
+    pdf_path = tmp_path / "mock.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4 mock content")
+    return str(pdf_path)
 
 @pytest.fixture
 def mock_faiss():
@@ -15,38 +28,285 @@ def mock_faiss():
     mock.as_retriever.return_value = Mock()
     return mock
 
-@patch("tellar.searchable_document.OpenAIEmbeddings")
-@patch("tellar.searchable_document.FAISS")
-@patch("tellar.searchable_document.PyPDFLoader")
-@patch("tellar.searchable_document.exists")
-def test_searchable_document_init_existing_db(mock_exists, mock_loader, mock_faiss, mock_embeddings, mock_pdf_path):
-    mock_exists.return_value = True
-    mock_faiss.load_local.return_value = mock_faiss
+def fake_embed_documents(texts):
+    return [[float(len(text)), 1.0] for text in texts]
+
+def write_index(db_path, manifest: IndexManifest):
+    os.makedirs(db_path, exist_ok=True)
+    with open(os.path.join(db_path, "manifest.json"), "w") as f:
+        json.dump(manifest.to_json(), f)
+
+@patch("tellar.embeddings.OpenAIEmbeddings")
+@patch("tellar.searchable_document.load_vector_store")
+@patch("tellar.searchable_document.build_vector_store")
+@patch("tellar.searchable_document.BookReader")
+def test_searchable_document_init_existing_db(mock_loader, mock_build, mock_load, mock_embeddings, mock_pdf_path):
+    mock_build.return_value = Mock(spec=FAISS)
+    mock_embeddings.return_value.embed_documents.side_effect = fake_embed_documents
+    mock_load.return_value = Mock(spec=FAISS)
+    mock_loader.return_value.chunks.return_value = [Document(page_content="test content")]
+
+    # First run builds the index
+    SearchableDocument(mock_pdf_path)
+    mock_loader.reset_mock()
 
     doc = SearchableDocument(mock_pdf_path)
 
     assert isinstance(doc._SearchableDocument__vector_db, Mock)
-    mock_faiss.load_local.assert_called_once()
+    mock_load.assert_called_once()
     mock_loader.assert_not_called()
 
-@patch("tellar.searchable_document.OpenAIEmbeddings")
-@patch("tellar.searchable_document.FAISS")
-@patch("tellar.searchable_document.PyPDFLoader")
-@patch("tellar.searchable_document.exists")
-def test_searchable_document_init_new_db(mock_exists, mock_loader, mock_faiss, mock_embeddings, mock_pdf_path):
-    mock_exists.return_value = False
-    mock_loader.return_value.load_and_split.return_value = [Document(page_content="test content")]
-    mock_faiss.from_documents.return_value = mock_faiss
+@patch("tellar.embeddings.OpenAIEmbeddings")
+@patch("tellar.searchable_document.load_vector_store")
+@patch("tellar.searchable_document.build_vector_store")
+@patch("tellar.searchable_document.BookReader")
+def test_searchable_document_init_new_db(mock_loader, mock_build, mock_load, mock_embeddings, mock_pdf_path):
+    mock_loader.return_value.chunks.return_value = [Document(page_content="test content")]
+    mock_build.return_value = Mock(spec=FAISS)
+    mock_embeddings.return_value.embed_documents.side_effect = fake_embed_documents
 
     doc = SearchableDocument(mock_pdf_path)
 
     assert isinstance(doc._SearchableDocument__vector_db, Mock)
-    mock_loader.assert_called_once_with(mock_pdf_path)
-    mock_faiss.from_documents.assert_called_once()
+    mock_loader.assert_called_once()
+    assert mock_loader.call_args.args == (mock_pdf_path,)
+    mock_build.assert_called_once()
+    mock_build.return_value.save_local.assert_called_once()
+
+@patch("tellar.embeddings.OpenAIEmbeddings")
+@patch("tellar.searchable_document.load_vector_store")
+@patch("tellar.searchable_document.build_vector_store")
+@patch("tellar.searchable_document.BookReader")
+def test_searchable_document_saves_manifest(mock_loader, mock_build, mock_load, mock_embeddings, mock_pdf_path):
+    mock_embeddings.return_value.model = "test-model"
+    mock_loader.return_value.chunks.return_value = [Document(page_content="test content")]
+    mock_build.return_value = Mock(spec=FAISS)
+    mock_embeddings.return_value.embed_documents.side_effect = fake_embed_documents
+
+    doc = SearchableDocument(mock_pdf_path, chunk_size=500)
+
+    with open(os.path.join(doc.db_path, "manifest.json")) as f:
+        manifest = IndexManifest.from_json(json.load(f))
+    assert manifest == doc.manifest
+    assert manifest.embedding_model == "test-model"
+    assert manifest.chunk_size == 500
+    assert manifest.source == "mock.pdf"
+
+@patch("tellar.embeddings.OpenAIEmbeddings")
+@patch("tellar.searchable_document.load_vector_store")
+@patch("tellar.searchable_document.build_vector_store")
+@patch("tellar.searchable_document.BookReader")
+def test_searchable_document_index_key(mock_loader, mock_build, mock_load, mock_embeddings, mock_pdf_path, tmp_path):
+    mock_loader.return_value.chunks.return_value = [Document(page_content="test content")]
+    mock_build.return_value = Mock(spec=FAISS)
+    mock_embeddings.return_value.embed_documents.side_effect = fake_embed_documents
+
+    # Same content under another name shares the index
+    other_dir = tmp_path / "other"
+    other_dir.mkdir()
+    same_pdf_path = other_dir / "renamed.pdf"
+    same_pdf_path.write_bytes(b"%PDF-1.4 mock content")
+    assert SearchableDocument(mock_pdf_path).db_path == SearchableDocument(str(same_pdf_path)).db_path
+
+    # Changed content or settings do not
+    edited_pdf_path = other_dir / "mock.pdf"
+    edited_pdf_path.write_bytes(b"%PDF-1.4 edited content")
+    assert SearchableDocument(mock_pdf_path).db_path != SearchableDocument(str(edited_pdf_path)).db_path
+    assert SearchableDocument(mock_pdf_path).db_path != SearchableDocument(mock_pdf_path, chunk_overlap=100).db_path
+
+@patch("tellar.embeddings.OpenAIEmbeddings")
+@patch("tellar.searchable_document.load_vector_store")
+@patch("tellar.searchable_document.build_vector_store")
+@patch("tellar.searchable_document.BookReader")
+def test_searchable_document_rebuilds_on_manifest_mismatch(mock_loader, mock_build, mock_load, mock_embeddings, mock_pdf_path):
+    mock_loader.return_value.chunks.return_value = [Document(page_content="test content")]
+    mock_build.return_value = Mock(spec=FAISS)
+    mock_embeddings.return_value.embed_documents.side_effect = fake_embed_documents
+
+    doc = SearchableDocument(mock_pdf_path)
+    write_index(doc.db_path, IndexManifest(content_hash="stale", embedding_model="stale"))
+    mock_build.reset_mock()
+    mock_load.reset_mock()
+
+    SearchableDocument(mock_pdf_path)
+
+    mock_load.assert_not_called()
+    mock_build.assert_called_once()
+
+@patch("tellar.embeddings.OpenAIEmbeddings")
+@patch("tellar.searchable_document.load_vector_store")
+@patch("tellar.searchable_document.build_vector_store")
+@patch("tellar.searchable_document.BookReader")
+def test_searchable_document_embeds_in_batches(mock_loader, mock_build, mock_load, mock_embeddings, mock_pdf_path):
+    chunks = [Document(page_content=f"chunk {i}", metadata={"page": i}) for i in range(10)]
+    mock_loader.return_value.chunks.return_value = iter(chunks)
+    mock_build.return_value = Mock(spec=FAISS)
+    mock_embeddings.return_value.embed_documents.side_effect = fake_embed_documents
+
+    doc = SearchableDocument(mock_pdf_path, batch_size=3)
+
+    assert mock_embeddings.return_value.embed_documents.call_count == 4
+    texts, vectors, metadatas, _ = mock_build.call_args.args
+    assert texts == [c.page_content for c in chunks]
+    assert vectors.shape == (10, 2)
+    assert metadatas == [c.metadata for c in chunks]
+    # Checkpoint is dropped once the index is saved
+    assert not os.path.exists(f"{doc.db_path}.partial")
+
+@patch("tellar.embeddings.OpenAIEmbeddings")
+@patch("tellar.searchable_document.load_vector_store")
+@patch("tellar.searchable_document.build_vector_store")
+@patch("tellar.searchable_document.BookReader")
+def test_searchable_document_index_type(mock_loader, mock_build, mock_load, mock_embeddings, mock_pdf_path):
+    mock_loader.return_value.chunks.return_value = [Document(page_content="test content")]
+    mock_build.return_value = Mock(spec=FAISS)
+    mock_embeddings.return_value.embed_documents.side_effect = fake_embed_documents
+
+    flat = SearchableDocument(mock_pdf_path)
+    hnsw = SearchableDocument(mock_pdf_path, index_type="hnsw")
+    SearchableDocument(mock_pdf_path, index_type="hnsw", mmap=True)
+
+    assert flat.db_path != hnsw.db_path
+    assert mock_build.call_args_list[-1].kwargs["index_type"] == "hnsw"
+    assert mock_load.call_args.kwargs["mmap"] is True
+    with pytest.raises(ValueError):
+        SearchableDocument(mock_pdf_path, index_type="unknown")
 
 def test_search(mock_pdf_path, mock_faiss):
-    with patch("tellar.searchable_document.SearchableDocument._SearchableDocument__get_vector_db", return_value=mock_faiss):
+    mock_faiss.similarity_search_by_vector.return_value = [Document(page_content="result")]
+    with patch("tellar.embeddings.OpenAIEmbeddings") as mock_embeddings, patch("tellar.searchable_document.SearchableDocument._SearchableDocument__get_vector_db", return_value=mock_faiss):
+        mock_embeddings.return_value.embed_query.return_value = [1.0, 2.0]
         doc = SearchableDocument(mock_pdf_path)
-        doc.search("test query")
+        results = doc.search("test query")
+
+        mock_embeddings.return_value.embed_query.assert_called_once_with("test query")
+        mock_faiss.similarity_search_by_vector.assert_called_once_with([1.0, 2.0], 4)
+        assert results == [Document(page_content="result")]
+
+def test_search_cache(mock_pdf_path, mock_faiss):
+    mock_faiss.similarity_search_by_vector.return_value = [Document(page_content="result")]
+    with patch("tellar.embeddings.OpenAIEmbeddings") as mock_embeddings, patch("tellar.searchable_document.SearchableDocument._SearchableDocument__get_vector_db", return_value=mock_faiss):
+        mock_embeddings.return_value.embed_query.return_value = [1.0, 2.0]
+        doc = SearchableDocument(mock_pdf_path, cache_size=2)
+
+        doc.search("Who am I?")
+        doc.search("  who am i ")
+        doc.search("who am I", k=2)
+
+        mock_embeddings.return_value.embed_query.assert_called_once()
+        assert mock_faiss.similarity_search_by_vector.call_count == 2
+        assert doc.cache_stats["embeddings"]["hits"] == 2
+        assert doc.cache_stats["embeddings"]["misses"] == 1
+        assert doc.cache_stats["results"]["hits"] == 1
+
+        # Cached results cannot be altered by callers
+        doc.search("who am I").append(Document(page_content="other"))
+        assert doc.search("who am I") == [Document(page_content="result")]
+
+@pytest.mark.asyncio
+async def test_asearch(mock_pdf_path):
+    embeddings = DeterministicFakeEmbedding(size=8)
+    texts = ["Harry lives in Privet Drive", "Hogwarts is a school", "Quidditch is a sport"]
+    vector_db = FAISS.from_texts(texts, embeddings)
+    with patch("tellar.embeddings.OpenAIEmbeddings", return_value=embeddings), patch("tellar.searchable_document.SearchableDocument._SearchableDocument__get_vector_db", return_value=vector_db):
+        doc = SearchableDocument(mock_pdf_path)
+
+        results = await doc.asearch("Hogwarts is a school", k=2)
+
+        assert len(results) == 2
+        assert results[0].page_content == "Hogwarts is a school"
+        assert results == doc.search("Hogwarts is a school", k=2)
+        assert doc.cache_stats["embeddings"]["hits"] == 1
+
+@pytest.fixture
+def story_doc(mock_pdf_path):
+    embeddings = DeterministicFakeEmbedding(size=8)
+    texts = ["Harry lives in Privet Drive", "Hogwarts is a school", "Hermione casts Wingardium Leviosa"]
+    vector_db = FAISS.from_texts(texts, embeddings, metadatas=[{"page": i} for i in range(3)])
+    with patch("tellar.embeddings.OpenAIEmbeddings", return_value=embeddings), patch("tellar.searchable_document.SearchableDocument._SearchableDocument__get_vector_db", return_value=vector_db):
+        yield SearchableDocument(mock_pdf_path, search_mode="hybrid")
+
+def test_search_lexical(story_doc):
+    with patch.object(DeterministicFakeEmbedding, "embed_query") as mock_embed_query:
+        results = story_doc.search("leviosa", mode="lexical")
+
+    assert [doc.page_content for doc in results] == ["Hermione casts Wingardium Leviosa"]
+    # No embedding call in lexical mode
+    mock_embed_query.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_asearch_lexical(story_doc):
+    results = await story_doc.asearch("Privet Drive", mode="lexical")
+
+    assert [doc.page_content for doc in results] == ["Harry lives in Privet Drive"]
+
+def test_search_hybrid(story_doc):
+    results = story_doc.search("Leviosa", k=2)
+
+    assert len(results) == 2
+    # Fake embeddings carry no meaning: the lexical hit wins the fusion
+    assert results[0].page_content == "Hermione casts Wingardium Leviosa"
+    assert len({doc.page_content for doc in results}) == 2
+
+def test_search_unknown_mode(story_doc):
+    with pytest.raises(ValueError):
+        story_doc.search("Harry", mode="unknown")
+
+@patch("tellar.embeddings.OpenAIEmbeddings")
+@patch("tellar.searchable_document.BookReader")
+def test_lexical_index_saved_with_vectors(mock_loader, mock_embeddings, mock_pdf_path):
+    mock_loader.return_value.chunks.return_value = [
+        Document(page_content="Harry lives in Privet Drive", metadata={"page": 0}),
+        Document(page_content="Hogwarts is a school", metadata={"page": 1}),
+    ]
+    mock_embeddings.return_value.embed_documents.side_effect = fake_embed_documents
+
+    doc = SearchableDocument(mock_pdf_path)
+    assert os.path.exists(os.path.join(doc.db_path, "lexical.pkl"))
+
+    # Loaded from disk on the next run
+    mock_loader.reset_mock()
+    doc = SearchableDocument(mock_pdf_path, search_mode="lexical")
+    mock_loader.assert_not_called()
+    assert [d.page_content for d in doc.search("hogwarts")] == ["Hogwarts is a school"]
+
+def test_progressive_indexing(mock_pdf_path, tmp_path):
+    embeddings = DeterministicFakeEmbedding(size=8)
+    chunks = [Document(page_content=f"chunk {i}", metadata={"page": i}) for i in range(6)]
+    release = threading.Event()
+
+    def slow_chunks():
+        yield from chunks[:3]
+        release.wait(5)
+        yield from chunks[3:]
+
+    with patch("tellar.embeddings.OpenAIEmbeddings", return_value=embeddings), patch("tellar.searchable_document.BookReader") as mock_reader:
+        mock_reader.return_value.chunks.side_effect = slow_chunks
+        mock_reader.return_value.page_count = 6
+        doc = SearchableDocument(mock_pdf_path, batch_size=3, max_concurrency=1, progressive=True, search_mode="hybrid")
+
+        # First batch is searchable while the rest of the book is read
+        deadline = time.monotonic() + 5
+        while doc.progress.chunks < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert not doc.progress.ready
+        assert doc.progress.ratio == 0.5
+        assert len(doc.search("chunk 1", k=10)) == 3
+
+        release.set()
+        assert doc.wait_until_ready(5)
+        assert doc.progress.ratio == 1.0
+        assert len(doc.search("chunk 1", k=10)) == 6
+        assert os.path.exists(os.path.join(doc.db_path, "manifest.json"))
+
+def test_progressive_indexing_of_indexed_book(mock_pdf_path):
+    embeddings = DeterministicFakeEmbedding(size=8)
+    with patch("tellar.embeddings.OpenAIEmbeddings", return_value=embeddings), patch("tellar.searchable_document.BookReader") as mock_reader:
+        mock_reader.return_value.chunks.return_value = [Document(page_content="chunk", metadata={"page": 0})]
+        SearchableDocument(mock_pdf_path)
+
+        doc = SearchableDocument(mock_pdf_path, progressive=True)
 
-        doc._SearchableDocument__retriever.invoke.assert_called_once_with("test query")
+        # Nothing to index: ready right away
+        assert doc.progress.ready
+        assert doc.wait_until_ready(0)
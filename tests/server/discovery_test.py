@@ -1,14 +1,26 @@
 import socket
 import unittest
+import httpx
 from unittest.mock import Mock, patch
 from tellar.server.discovery import Discovery
 from tellar.server.model import Info
+from tellar.utils.http_client import HttpClientPool
 
 
 class TestDiscovery(unittest.TestCase):
 
     def setUp(self):
-        self.discovery = Discovery(udp_port=9000, http_port=8000)
+        self.http_handler = lambda request: httpx.Response(200, json={"name": "Test Server"})
+        self.discovery = Discovery(
+            udp_port=9000,
+            http_port=8000,
+            http_pool=HttpClientPool(
+                transport=httpx.MockTransport(lambda request: self.http_handler(request))
+            ),
+        )
+
+    def tearDown(self):
+        self.discovery._Discovery__loop.close()
 
     def test_init(self):
         self.assertEqual(self.discovery.udp_port, 9000)
@@ -39,21 +51,25 @@ class TestDiscovery(unittest.TestCase):
         mock_thread.return_value.join.assert_called_once()
 
     @patch("socket.socket")
-    @patch("requests.get")
     @patch("tellar.server.discovery.range")
     @patch("threading.Timer")
-    def test_discover(self, mock_timer, mock_range, mock_get, mock_socket):
+    def test_discover(self, mock_timer, mock_range, mock_socket):
         # Set up the range mock to only iterate once
         mock_range.return_value = range(9000, 9001)
 
         mock_socket_instance = mock_socket.return_value.__enter__.return_value
         mock_socket_instance.recvfrom.side_effect = [
             (b"http://test.com", ("127.0.0.1", 9000)),
+            (b"http://down.com", ("127.0.0.1", 9000)),
             socket.timeout,  # Simulate a timeout to exit the inner while loop
         ]
-        mock_get.return_value.json.return_value = {"name": "Test Server"}
-        mock_get.return_value.raise_for_status = Mock()
 
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.host == "down.com":
+                return httpx.Response(503)
+            return httpx.Response(200, json={"name": "Test Server"})
+
+        self.http_handler = handler
         self.discovery._Discovery__running = True
 
         # Directly call the __discover method
@@ -62,11 +78,12 @@ class TestDiscovery(unittest.TestCase):
         # Stop the discovery process
         self.discovery._Discovery__running = False
 
-        # Check the results
+        # Check the results: unavailable servers are left out
         self.assertEqual(len(self.discovery.servers), 1)
         server = list(self.discovery.servers)[0]
         self.assertEqual(server.url, "http://test.com")
         self.assertIsInstance(server.info, Info)
+        self.assertEqual(server.info.name, "Test Server")
 
     @patch("socket.socket")
     @patch("socket.gethostbyname")
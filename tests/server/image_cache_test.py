@@ -0,0 +1,184 @@
+import hashlib
+import os
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from tellar.server.image_cache import ImageCache, image_response
+
+IMAGE = b"\xff\xd8\xff" + bytes(range(256)) * 4
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ImageCache(str(tmp_path), memory_bytes=2048, disk_bytes=4096)
+
+
+@pytest.fixture
+def client(cache):
+    app = FastAPI()
+
+    @app.get("/image/{digest}")
+    async def read_image(digest: str, request: Request):
+        return await image_response(cache, digest, request)
+
+    return TestClient(app)
+
+
+def test_put(cache, tmp_path):
+    digest = cache.put(IMAGE)
+
+    assert digest == hashlib.sha256(IMAGE).hexdigest()
+    assert digest in cache
+    assert cache.get(digest) == IMAGE
+    assert (tmp_path / digest).read_bytes() == IMAGE
+    # Content addressed: stored once
+    assert cache.put(IMAGE) == digest
+    assert cache.disk_size == len(IMAGE)
+
+
+@pytest.mark.asyncio
+async def test_aput_stream(cache, tmp_path):
+    async def chunks(data):
+        for i in range(0, len(data), 100):
+            yield data[i : i + 100]
+
+    digest = await cache.aput_stream(chunks(IMAGE))
+
+    assert digest == hashlib.sha256(IMAGE).hexdigest()
+    assert (tmp_path / digest).read_bytes() == IMAGE
+    assert cache.get(digest) == IMAGE
+    assert await cache.aput_stream(chunks(IMAGE)) == digest
+    # Larger than the memory budget: on disk only
+    large = await cache.aput_stream(chunks(IMAGE * 2))
+    assert cache.get(large) is None
+    assert large in cache
+    assert sorted(os.listdir(tmp_path)) == sorted([digest, large])
+
+
+@pytest.mark.asyncio
+async def test_aput_stream_error(cache, tmp_path):
+    async def chunks():
+        yield IMAGE
+        raise ConnectionError("connection lost")
+
+    with pytest.raises(ConnectionError):
+        await cache.aput_stream(chunks())
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.asyncio
+async def test_aput_stream_open_error(cache, monkeypatch):
+    def refuse(*args, **kwargs):
+        raise PermissionError("read only")
+
+    async def chunks():
+        yield IMAGE
+
+    monkeypatch.setattr("tellar.server.image_cache.aiofiles.open", refuse)
+    # The temp file was never created: the original error comes through
+    with pytest.raises(PermissionError):
+        await cache.aput_stream(chunks())
+
+
+def test_memory_tier_spills_to_disk(cache):
+    first = cache.put(IMAGE)
+    second = cache.put(IMAGE + b"2")
+
+    # Over the memory budget: the least recently used image is only on disk
+    assert cache.get(first) is None
+    assert cache.get(second) is not None
+    assert first in cache
+    assert cache.memory_size <= 2048
+
+
+def test_disk_eviction(cache, tmp_path):
+    digests = [cache.put(IMAGE + bytes([i])) for i in range(5)]
+
+    assert cache.disk_size <= 4096
+    assert digests[0] not in cache
+    assert not (tmp_path / digests[0]).exists()
+    assert digests[-1] in cache
+
+
+def test_scan_previous_images(cache, tmp_path):
+    digest = cache.put(IMAGE)
+
+    reopened = ImageCache(str(tmp_path))
+
+    assert digest in reopened
+    assert reopened.disk_size == len(IMAGE)
+
+
+@pytest.mark.parametrize("in_memory", [True, False])
+def test_image_response(client, cache, in_memory):
+    cache.memory_bytes = len(IMAGE) if in_memory else 0
+    digest = cache.put(IMAGE)
+
+    response = client.get(f"/image/{digest}")
+
+    assert response.status_code == 200
+    assert response.content == IMAGE
+    assert response.headers["Content-Type"] == "image/jpeg"
+    assert response.headers["ETag"] == f'"{digest}"'
+    assert response.headers["Accept-Ranges"] == "bytes"
+
+    response = client.get(f"/image/{digest}", headers={"If-None-Match": f'"other", W/"{digest}"'})
+    assert response.status_code == 304
+
+    response = client.get(f"/image/{digest}", headers={"Range": "bytes=3-10"})
+    assert response.status_code == 206
+    assert response.content == IMAGE[3:11]
+    assert response.headers["Content-Range"] == f"bytes 3-10/{len(IMAGE)}"
+
+    response = client.get(f"/image/{digest}", headers={"Range": "bytes=-4"})
+    assert response.content == IMAGE[-4:]
+
+    response = client.get(f"/image/{digest}", headers={"Range": "bytes=1000-"})
+    assert response.content == IMAGE[1000:]
+
+    response = client.get(f"/image/{digest}", headers={"Range": f"bytes={len(IMAGE)}-"})
+    assert response.status_code == 416
+    assert response.headers["Content-Range"] == f"bytes */{len(IMAGE)}"
+
+    # Range of another version
+    response = client.get(f"/image/{digest}", headers={"Range": "bytes=3-10", "If-Range": '"other"'})
+    assert response.status_code == 200
+    assert response.content == IMAGE
+
+
+def test_image_response_not_found(client):
+    assert client.get(f"/image/{'0' * 64}").status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_lookup_media_type(cache, tmp_path):
+    png = b"\x89PNG\r\n\x1a\n" + IMAGE
+
+    async def chunks():
+        # Magic number split between chunks
+        yield png[:4]
+        yield png[4:]
+
+    digest = await cache.aput_stream(chunks())
+    image = cache.lookup(digest)
+
+    assert image.media_type == "image/png"
+    assert image.size == len(png)
+    assert image.path == str(tmp_path / digest)
+    assert ImageCache(str(tmp_path)).lookup(digest).media_type == "image/png"
+    assert cache.lookup("0" * 64) is None
+
+
+def test_image_response_evicted_while_served(client, cache):
+    cache.memory_bytes = 0
+    digest = cache.put(IMAGE)
+    lookup = cache.lookup
+
+    def lookup_then_evict(digest):
+        image = lookup(digest)
+        os.remove(image.path)
+        return image
+
+    cache.lookup = lookup_then_evict
+
+    assert client.get(f"/image/{digest}").status_code == 404
@@ -1,7 +1,11 @@
 import unittest
-from tellar.server.model import Message, Info
+from tellar.server.model import Message, Info, PartialMessage
 
 class TestModel(unittest.TestCase):
+    def test_partial_message(self):
+        msg = PartialMessage(sender="Alice", text="Hel")
+        self.assertEqual(msg.to_json(), {"type": "partial", "sender": "Alice", "text": "Hel"})
+
     def test_message(self):
         msg = Message(sender="Alice", text="Hello", timestamp=1234567890, image="image.jpg")
         json_data = msg.to_json()
@@ -18,6 +22,32 @@ class TestModel(unittest.TestCase):
         reconstructed_info = Info.from_json(json_data)
         self.assertEqual(reconstructed_info, info)
 
+    def test_info_with_indexing(self):
+        info = Info(name="Test Bot", indexing={"ready": False, "progress": 0.5})
+        json_data = info.to_json()
+        self.assertEqual(json_data, {"name": "Test Bot", "indexing": {"ready": False, "progress": 0.5}})
+
+        reconstructed_info = Info.from_json(json_data)
+        self.assertEqual(reconstructed_info, info)
+
+    def test_info_with_answer_cache(self):
+        stats = {"hits": 1, "misses": 1, "bypassed": 0, "hit_rate": 0.5, "saved_llm_calls": 1}
+        info = Info(name="Test Bot", answer_cache=stats)
+        json_data = info.to_json()
+        self.assertEqual(json_data, {"name": "Test Bot", "answer_cache": stats})
+
+        reconstructed_info = Info.from_json(json_data)
+        self.assertEqual(reconstructed_info, info)
+
+    def test_info_with_single_flight(self):
+        stats = {"calls": 3, "executions": 1, "coalesced": 2, "coalesced_wait_seconds": 0.5, "failures": 0}
+        info = Info(name="Test Bot", single_flight=stats)
+        json_data = info.to_json()
+        self.assertEqual(json_data, {"name": "Test Bot", "single_flight": stats})
+
+        reconstructed_info = Info.from_json(json_data)
+        self.assertEqual(reconstructed_info, info)
+
     def test_message_without_image(self):
         msg = Message(sender="Bob", text="Hi", timestamp=1234567890)
         json_data = msg.to_json()
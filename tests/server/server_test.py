@@ -1,31 +1,93 @@
 import asyncio
 import time
+from urllib.parse import urlparse
 from fastapi import WebSocketDisconnect
+import httpx
 import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import Mock, patch, AsyncMock
+from tellar.answer_cache import AnswerCache
+from tellar.chat_history import ChatHistory
+from tellar.server.image_cache import ImageCache
 from tellar.server.model import Message
 from tellar.server.server import Server
-from tellar.character import Character, Answer
+from tellar.server.sessions import SessionManager
+from tellar.utils.http_client import HttpClientPool
+from tellar.warmup import Warmup
+from tellar.character import AnswerDelta, Character, Answer
+from tellar.searchable_document import IndexingProgress
 
 
 @pytest.fixture
 def mock_character():
     char = AsyncMock(spec=Character)
     char.name = "Test Character"
+    char.char_name = "Test Character"
+    char.language = "english"
+    char.book_key = "book"
+    char.identity = "identity"
+    char.searchable_doc = Mock()
+    char.searchable_doc.progress = IndexingProgress(total_pages=10, indexed_pages=4, chunks=12)
+    char.searchable_doc.wait_until_ready.return_value = True
+    char.answer_cache = None
+    char.chat_history = ChatHistory()
     char.clone.return_value = char
+    char.close = Mock()
+    char.openai_pool = Mock()
+    char.openai_pool.aclose = AsyncMock()
 
     # Set up answer as a coroutine
     async def mock_answer(*args, **kwargs):
         return Answer(text="Test answer", image=None)
 
     char.answer.side_effect = mock_answer
+
+    async def mock_astream(*args, **kwargs):
+        yield AnswerDelta(text="Test ")
+        yield AnswerDelta(text="answer")
+        yield Answer(text="Test answer", image=None)
+
+    char.astream = Mock(side_effect=mock_astream)
     return char
 
 
 @pytest.fixture
-def server(mock_character):
-    return Server(mock_character)
+def remote_images():
+    # Image URL -> content, and the URLs requested
+    images = {"http://fake.image.url": b"fake image data"}
+    images["requested"] = []
+    return images
+
+
+@pytest.fixture
+def http_pool(remote_images):
+    def handler(request: httpx.Request) -> httpx.Response:
+        remote_images["requested"].append(str(request.url))
+        if str(request.url) not in remote_images:
+            return httpx.Response(404)
+        return httpx.Response(200, content=remote_images[str(request.url)])
+
+    return HttpClientPool(transport=httpx.MockTransport(handler))
+
+
+@pytest.fixture
+def warmup(mock_character, tmp_path, http_pool):
+    return Warmup(
+        mock_character,
+        jobs=("description", "picture"),
+        user_data_path=str(tmp_path),
+        http_pool=http_pool,
+    )
+
+
+@pytest.fixture
+def image_cache(tmp_path):
+    return ImageCache(str(tmp_path / "images"))
+
+
+@pytest.fixture
+def server(mock_character, warmup, image_cache, http_pool):
+    return Server(mock_character, warmup=warmup, image_cache=image_cache, http_pool=http_pool)
 
 
 @pytest.fixture
@@ -36,18 +98,97 @@ def client(server):
 def test_read_root(client, mock_character):
     response = client.get("/")
     assert response.status_code == 200
-    assert response.json() == {"name": mock_character.name}
+    assert response.json() == {
+        "name": mock_character.name,
+        "indexing": {
+            "ready": False,
+            "progress": 0.4,
+            "indexed_pages": 4,
+            "total_pages": 10,
+            "chunks": 12,
+            "error": None,
+        },
+        "single_flight": {
+            "calls": 0,
+            "executions": 0,
+            "coalesced": 0,
+            "coalesced_wait_seconds": 0.0,
+            "failures": 0,
+        },
+    }
+
+
+def test_read_root_with_answer_cache(client, mock_character):
+    mock_character.answer_cache = AnswerCache()
+    mock_character.answer_cache.stats.hits = 3
+    mock_character.answer_cache.stats.misses = 1
+
+    response = client.get("/")
+
+    assert response.json()["answer_cache"] == {
+        "hits": 3,
+        "misses": 1,
+        "bypassed": 0,
+        "hit_rate": 0.75,
+        "saved_llm_calls": 3,
+    }
+    mock_character.answer_cache.close()
 
 
-@patch("requests.get")
-def test_read_picture(mock_get, client, mock_character):
-    mock_get.return_value.content = b"fake image data"
+def test_read_picture(client, mock_character):
+    mock_character.answer.side_effect = None
     mock_character.answer.return_value = Answer(text="", image="http://fake.image.url")
 
     response = client.get("/picture")
     assert response.status_code == 200
     assert response.headers["Content-Type"] == "image/jpeg"
     assert response.content == b"fake image data"
+    assert response.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+
+    # Not modified
+    response = client.get("/picture", headers={"If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_read_image_not_found(client):
+    response = client.get("/image/unknown")
+    assert response.status_code == 404
+
+
+def test_websocket_image(client, mock_character, remote_images):
+    remote_images["http://fake.image.url"] = b"\x89PNG\r\n\x1a\nfake png"
+    mock_character.answer.side_effect = None
+    mock_character.answer.return_value = Answer(text="Look", image="http://fake.image.url")
+
+    with client.websocket_connect("/ws") as websocket:
+        websocket.send_json({"sender": "user", "text": "Draw", "timestamp": 0})
+        first = websocket.receive_json()
+        websocket.send_json({"sender": "user", "text": "Again", "timestamp": 0})
+        second = websocket.receive_json()
+
+    # Downloaded once, served under the digest of its content
+    assert first["image"] == second["image"]
+    assert remote_images["requested"] == ["http://fake.image.url"]
+    response = client.get(urlparse(first["image"]).path)
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "image/png"
+    assert response.content == b"\x89PNG\r\n\x1a\nfake png"
+
+
+def test_read_root_single_flight(client, mock_character):
+    mock_character.answer.side_effect = None
+    mock_character.answer.return_value = Answer(text="Look", image="http://fake.image.url")
+
+    with client.websocket_connect("/ws") as websocket:
+        websocket.send_json({"sender": "user", "text": "Draw", "timestamp": 0})
+        websocket.receive_json()
+
+    # The image download went through the single-flight
+    stats = client.get("/").json()["single_flight"]
+    assert stats["calls"] == 1
+    assert stats["executions"] == 1
+    assert stats["coalesced"] == 0
 
 
 def test_read_description(client, mock_character):
@@ -60,6 +201,77 @@ def test_read_description(client, mock_character):
         "Describe yourself in a few words (no full sentence)."
     )
 
+    # Computed once
+    assert client.get("/description").json() == "Test answer"
+    mock_character.answer.assert_called_once()
+
+
+def test_warmup_on_startup(server, warmup, mock_character, image_cache, http_pool, tmp_path):
+    mock_character.answer.side_effect = None
+    mock_character.answer.return_value = Answer(text="Test answer", image="http://fake.image.url")
+
+    with TestClient(server._Server__app) as client:
+        assert client.get("/description").json() == "Test answer"
+        assert client.get("/picture").content == b"fake image data"
+    # The OpenAI clients are closed on shutdown
+    mock_character.openai_pool.aclose.assert_awaited_once()
+
+    # A replica (or a restart) serving the same character reads the saved results
+    mock_character.answer.reset_mock()
+    replica = Server(
+        mock_character,
+        warmup=Warmup(mock_character, user_data_path=str(tmp_path), http_pool=http_pool),
+        image_cache=image_cache,
+        http_pool=http_pool,
+    )
+    client = TestClient(replica._Server__app)
+
+    assert client.get("/description").json() == "Test answer"
+    assert client.get("/picture").content == b"fake image data"
+    mock_character.answer.assert_not_called()
+
+
+def test_read_history(client):
+    with client.websocket_connect("/ws") as websocket:
+        websocket.send_json({"sender": "user", "text": "Hello", "timestamp": 0})
+        websocket.receive_json()
+
+    response = client.get("/history/user")
+
+    assert [msg["text"] for msg in response.json()] == ["Hello", "Test answer"]
+
+
+def test_read_sessions(client):
+    with client.websocket_connect("/ws") as websocket:
+        websocket.send_json({"sender": "user", "text": "Hello", "timestamp": 0})
+        websocket.receive_json()
+
+    response = client.get("/sessions")
+
+    assert response.status_code == 200
+    sessions = response.json()
+    assert sessions["live"] == 1
+    assert sessions["created"] == 1
+    assert sessions["sessions"][0]["sender"] == "user"
+    assert sessions["sessions"][0]["messages"] == 2
+    assert sessions["approximate_bytes"] > 0
+
+
+def test_sessions_saved_on_shutdown(mock_character, warmup, image_cache, http_pool, tmp_path):
+    sessions = SessionManager(mock_character, persist=True, user_data_path=str(tmp_path))
+    server = Server(mock_character, warmup=warmup, image_cache=image_cache, http_pool=http_pool, sessions=sessions)
+
+    with TestClient(server._Server__app) as client:
+        with client.websocket_connect("/ws") as websocket:
+            websocket.send_json({"sender": "user", "text": "Hello", "timestamp": 0})
+            websocket.receive_json()
+        assert len(sessions) == 1
+
+    # Out of memory, but not lost
+    assert len(sessions) == 0
+    assert sessions.stats.persisted == 1
+    assert [msg.text for msg in sessions.history("user")] == ["Hello", "Test answer"]
+
 
 def test_read_history_empty(client):
     response = client.get("/history/test_user")
@@ -67,6 +279,32 @@ def test_read_history_empty(client):
     assert response.json() == []
 
 
+def test_websocket(client, mock_character):
+    with client.websocket_connect("/ws") as websocket:
+        websocket.send_json({"sender": "user", "text": "Hello", "timestamp": 0})
+        reply = websocket.receive_json()
+
+    assert reply["text"] == "Test answer"
+    assert "type" not in reply
+    mock_character.astream.assert_not_called()
+
+
+def test_websocket_stream(client, mock_character):
+    with client.websocket_connect("/ws?stream=true") as websocket:
+        websocket.send_json({"sender": "user", "text": "Hello", "timestamp": 0})
+        frames = [websocket.receive_json() for _ in range(3)]
+
+    assert frames[0] == {"type": "partial", "sender": "Test Character", "text": "Test "}
+    assert frames[1] == {"type": "partial", "sender": "Test Character", "text": "answer"}
+    assert frames[2]["type"] == "final"
+    assert frames[2]["text"] == "Test answer"
+    assert frames[2]["sender"] == "Test Character"
+    mock_character.astream.assert_called_once_with("Hello")
+
+    history = client.get("/history/user").json()
+    assert [msg["text"] for msg in history] == ["Hello", "Test answer"]
+
+
 @patch("tellar.server.server.find_free_port")
 @patch("tellar.server.server.Discovery")
 @patch("uvicorn.run")
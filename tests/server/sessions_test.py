@@ -0,0 +1,175 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from unittest.mock import Mock, patch
+import pytest
+from tellar.chat_history import ChatHistory
+from tellar.server.model import Message
+from tellar.server.sessions import SESSION_OVERHEAD_BYTES, SessionManager
+
+
+@pytest.fixture
+def char():
+    def clone():
+        session = Mock()
+        session.chat_history = ChatHistory()
+        return session
+
+    char = Mock()
+    char.name = "Harry"
+    char.char_name = "Harry"
+    char.book_key = "book"
+    char.identity = "identity"
+    char.language = "english"
+    char.clone.side_effect = clone
+    return char
+
+
+def test_get(char):
+    sessions = SessionManager(char)
+
+    session = sessions.get("Ron")
+
+    assert sessions.get("Ron") is session
+    assert session.sender == "Ron"
+    assert "Ron" in sessions
+    assert char.clone.call_count == 1
+    assert sessions.stats.created == 1
+    assert sessions.history("Ron") == []
+    assert sessions.history("Hermione") is None
+
+
+def test_lru_eviction(char):
+    sessions = SessionManager(char, max_sessions=2)
+    ron = sessions.get("Ron")
+    hermione = sessions.get("Hermione")
+    sessions.get("Ron")
+    # Being answered: not evicted
+    sessions.get("Hermione").busy = 1
+    sessions.get("Ron")
+
+    sessions.get("Ginny")
+
+    assert len(sessions) == 2
+    assert "Hermione" in sessions
+    assert "Ron" not in sessions
+    assert sessions.stats.evicted == 1
+    # Conversation over: its speech file is removed
+    ron.character.close.assert_called_once()
+    hermione.character.close.assert_not_called()
+
+
+def test_idle_ttl(char):
+    sessions = SessionManager(char, idle_ttl=60)
+    with patch("tellar.server.sessions.time.monotonic", return_value=1000):
+        sessions.get("Ron")
+    with patch("tellar.server.sessions.time.monotonic", return_value=1030):
+        sessions.get("Hermione")
+
+    with patch("tellar.server.sessions.time.monotonic", return_value=1070):
+        sessions.expire()
+
+    assert "Ron" not in sessions
+    assert "Hermione" in sessions
+    assert sessions.stats.expired == 1
+
+
+@pytest.mark.asyncio
+async def test_persist_and_rehydrate(char, tmp_path):
+    sessions = SessionManager(char, max_sessions=1, persist=True, user_data_path=str(tmp_path))
+    session = sessions.get("Ron")
+    session.history.append(Message(sender="Ron", text="Hi Harry", timestamp=1))
+    session.history.append(Message(sender="Harry", text="Hi Ron", timestamp=2))
+    await session.character.chat_history.aadd_turn("Hi Harry", "Hi Ron")
+
+    # Ron leaves memory, his conversation is saved
+    sessions.get("Hermione")
+    assert "Ron" not in sessions
+    assert sessions.stats.persisted == 1
+    assert [msg.text for msg in sessions.history("Ron")] == ["Hi Harry", "Hi Ron"]
+
+    # And restored when he comes back
+    restored = sessions.get("Ron")
+    assert restored is not session
+    assert restored.history == session.history
+    assert restored.character.chat_history.to_json() == {"summary": None, "turns": [["Hi Harry", "Hi Ron"]]}
+    assert sessions.stats.rehydrated == 1
+
+
+def test_prune_saved_sessions(char, tmp_path):
+    sessions = SessionManager(
+        char, max_sessions=1, persist=True, user_data_path=str(tmp_path), max_saved_sessions=2, saved_ttl=3600
+    )
+    senders = ["Ron", "Hermione", "Ginny", "Neville", "Luna"]
+    for sender in senders:
+        sessions.get(sender)
+    # Saved 2 hours, 3, 2 and 1 minutes ago
+    now = time.time()
+    for sender, age in zip(senders, [7200, 180, 120, 60]):
+        path = os.path.join(sessions.store_path, f"{hashlib.sha256(sender.encode()).hexdigest()}.json")
+        os.utime(path, (now - age, now - age))
+
+    sessions.prune()
+
+    # Ron is too old, Hermione one too many
+    assert [sender for sender in senders if sessions.history(sender) is not None] == ["Ginny", "Neville", "Luna"]
+    assert len(os.listdir(sessions.store_path)) == 2
+    assert sessions.stats.pruned == 2
+
+
+def test_close_saves_live_sessions(char, tmp_path):
+    sessions = SessionManager(char, persist=True, user_data_path=str(tmp_path))
+    session = sessions.get("Ron")
+    session.history.append(Message(sender="Ron", text="Hi Harry", timestamp=1))
+
+    sessions.close()
+
+    assert len(sessions) == 0
+    assert [msg.text for msg in sessions.history("Ron")] == ["Hi Harry"]
+    session.character.close.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_async_methods_off_the_loop(char, tmp_path):
+    sessions = SessionManager(char, max_sessions=1, persist=True, user_data_path=str(tmp_path))
+    thread = threading.get_ident()
+    saved = []
+
+    def save(session):
+        saved.append(threading.get_ident())
+        save.wrapped(session)
+
+    save.wrapped = sessions._SessionManager__save
+    sessions._SessionManager__save = save
+
+    # Concurrent messages of one sender share a session
+    ron, again = await asyncio.gather(sessions.aget("Ron"), sessions.aget("Ron"))
+    assert ron is again
+    ron.history.append(Message(sender="Ron", text="Hi Harry", timestamp=1))
+    await sessions.aget("Hermione")
+    assert [msg.text for msg in await sessions.ahistory("Ron")] == ["Hi Harry"]
+    await sessions.aclose()
+
+    # Saved outside of the event loop thread
+    assert len(saved) == 2 and thread not in saved
+    assert (await sessions.aget("Ron")).history == ron.history
+
+
+def test_to_json(char):
+    sessions = SessionManager(char, max_sessions=10, idle_ttl=60)
+    sessions.get("Ron").history.append(Message(sender="Ron", text="Hi", timestamp=1))
+    sessions.get("Hermione")
+
+    stats = sessions.to_json()
+
+    assert stats["live"] == 2
+    assert stats["max_sessions"] == 10
+    assert stats["idle_ttl"] == 60
+    assert stats["created"] == 2
+    assert [session["sender"] for session in stats["sessions"]] == ["Ron", "Hermione"]
+    assert stats["sessions"][0]["messages"] == 1
+    assert stats["sessions"][0]["approximate_bytes"] > stats["sessions"][1]["approximate_bytes"]
+    assert stats["sessions"][1]["approximate_bytes"] == SESSION_OVERHEAD_BYTES
+    assert stats["approximate_bytes"] == sum(session["approximate_bytes"] for session in stats["sessions"])
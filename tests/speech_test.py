@@ -0,0 +1,88 @@
+import asyncio
+from unittest.mock import AsyncMock, Mock
+import pytest
+from tellar.speech import SentenceSplitter, SpeechPipeline
+
+
+def test_sentence_splitter():
+    splitter = SentenceSplitter(min_length=10)
+    assert splitter.feed("Hello Harry, how") == []
+    assert splitter.feed(" are you? Yes. I am ") == ["Hello Harry, how are you?"]
+    # Short sentences are kept with the next one
+    assert splitter.feed("fine, thank you!\nAnd") == ["Yes. I am fine, thank you!"]
+    assert splitter.flush() == "And"
+    assert splitter.flush() == ""
+
+
+def test_sentence_splitter_quotes():
+    splitter = SentenceSplitter(min_length=0)
+    assert splitter.feed('He said "Run!" and left. Then') == ['He said "Run!"', "and left."]
+
+
+class FakeSpeech:
+    """Synthesis taking longer for the first sentences."""
+
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+
+    async def create(self, model: str, voice: str, input: str):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.05 if input.startswith("First") else 0.01)
+        self.running -= 1
+        return Mock(content=input.encode())
+
+
+@pytest.fixture
+def speech():
+    return FakeSpeech()
+
+
+@pytest.fixture
+def pipeline(speech):
+    client = Mock()
+    client.audio.speech = speech
+    limit = Mock()
+    limit.__aenter__ = AsyncMock(return_value=client)
+    limit.__aexit__ = AsyncMock(return_value=None)
+    pool = Mock()
+    pool.limit.return_value = limit
+    return SpeechPipeline(openai_pool=pool, max_parallel=2, min_sentence_length=0)
+
+
+@pytest.mark.asyncio
+async def test_speech_pipeline_order(pipeline, speech):
+    text = "First sentence. Second sentence. Third sentence. Fourth"
+
+    audio = [chunk async for chunk in pipeline.astream(text)]
+
+    assert audio == [b"First sentence.", b"Second sentence.", b"Third sentence.", b"Fourth"]
+    assert speech.max_running == 2
+
+
+@pytest.mark.asyncio
+async def test_speech_pipeline_text_stream(pipeline):
+    synthesized = asyncio.Event()
+
+    async def pieces():
+        yield "First sentence. Sec"
+        # The first sentence is synthesized before the end of the text
+        await asyncio.wait_for(synthesized.wait(), 1)
+        yield "ond sentence."
+
+    audio = []
+    async for chunk in pipeline.astream(pieces()):
+        audio.append(chunk)
+        synthesized.set()
+
+    assert audio == [b"First sentence.", b"Second sentence."]
+
+
+@pytest.mark.asyncio
+async def test_speech_pipeline_error(pipeline, speech):
+    speech.create = AsyncMock(side_effect=RuntimeError("TTS down"))
+
+    with pytest.raises(RuntimeError):
+        async for _ in pipeline.astream("First sentence. Second sentence."):
+            pass
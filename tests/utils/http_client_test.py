@@ -0,0 +1,35 @@
+import asyncio
+import httpx
+from tellar.utils.http_client import HttpClientPool
+
+
+def test_client_per_event_loop():
+    pool = HttpClientPool(timeout=10, connect_timeout=2, http2=False)
+
+    async def clients():
+        first, second = pool.client, pool.client
+        await pool.aclose()
+        return first, second
+
+    first, second = asyncio.run(clients())
+    other, _ = asyncio.run(clients())
+
+    assert first is second
+    assert first is not other
+    assert first.timeout == httpx.Timeout(10, connect=2)
+    assert first.is_closed
+
+
+def test_concurrent_requests():
+    requests = []
+    pool = HttpClientPool(
+        transport=httpx.MockTransport(lambda request: requests.append(request) or httpx.Response(200, text="ok"))
+    )
+
+    async def get_all():
+        responses = await asyncio.gather(*[pool.client.get(f"http://peer/{i}") for i in range(3)])
+        await pool.aclose()
+        return [response.text for response in responses]
+
+    assert asyncio.run(get_all()) == ["ok"] * 3
+    assert len(requests) == 3
@@ -0,0 +1,51 @@
+import json
+import pytest
+from tellar.utils.json_stream import JsonFieldStreamer
+
+
+def stream(document: str, piece_size: int) -> tuple[str, JsonFieldStreamer]:
+    parser = JsonFieldStreamer("text")
+    text = "".join(
+        parser.feed(document[i : i + piece_size]) for i in range(0, len(document), piece_size)
+    )
+    return text, parser
+
+
+@pytest.mark.parametrize("piece_size", [1, 2, 3, 5, 1000])
+def test_json_field_streamer(piece_size):
+    document = json.dumps(
+        {"image": None, "text": 'Hello "Harry",\nwelcome to Hogwarts \\o/ é 😀 ✨'},
+        ensure_ascii=True,
+    )
+
+    text, parser = stream(document, piece_size)
+
+    assert text == json.loads(document)["text"]
+    assert parser.done
+
+
+def test_json_field_streamer_stops_after_field():
+    text, _ = stream('{"text": "Hi", "image": "http://image", "other": {"text": "no"}}', 1)
+
+    assert text == "Hi"
+
+
+def test_json_field_streamer_fenced():
+    text, parser = stream('```json\n{"text": "Hi there", "image": null}\n```', 2)
+
+    assert text == "Hi there"
+    assert parser.done
+
+
+def test_json_field_streamer_plain_text():
+    text, parser = stream("I am not JSON, sorry", 3)
+
+    assert text == "I am not JSON, sorry"
+    assert not parser.done
+
+
+def test_json_field_streamer_missing_field():
+    text, parser = stream('{"image": null}', 1)
+
+    assert text == ""
+    assert not parser.done
@@ -0,0 +1,50 @@
+from unittest.mock import patch
+from tellar.utils.lru_cache import LRUCache
+
+
+def test_get_and_put():
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("b", "default") == "default"
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 2
+    assert cache.stats.hit_rate == 1 / 3
+
+
+def test_lru_eviction():
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+    assert cache.stats.evictions == 1
+
+
+@patch("tellar.utils.lru_cache.time.monotonic")
+def test_ttl(mock_monotonic):
+    mock_monotonic.return_value = 100.0
+    cache = LRUCache(ttl=10)
+    cache.put("a", 1)
+
+    mock_monotonic.return_value = 109.0
+    assert cache.get("a") == 1
+    mock_monotonic.return_value = 111.0
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_clear():
+    cache = LRUCache()
+    cache.put("a", 1)
+    cache.clear()
+
+    assert cache.get("a") is None
+    assert cache.stats.to_json() == {"hits": 0, "misses": 1, "evictions": 0, "hit_rate": 0.0}
@@ -0,0 +1,45 @@
+import asyncio
+import pytest
+from tellar.utils.openai_client import OpenAIClientPool
+
+
+@pytest.fixture(autouse=True)
+def api_key(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+
+
+def test_client_per_event_loop():
+    pool = OpenAIClientPool(timeout=5)
+
+    async def clients():
+        first, second = pool.client, pool.client
+        await pool.aclose()
+        return first, second
+
+    first, second = asyncio.run(clients())
+    other, _ = asyncio.run(clients())
+
+    assert first is second
+    assert first is not other
+    assert first.timeout == 5
+    assert first.is_closed()
+
+
+@pytest.mark.asyncio
+async def test_limit():
+    pool = OpenAIClientPool(max_concurrency=2)
+    running, max_running = 0, 0
+
+    async def call():
+        nonlocal running, max_running
+        async with pool.limit() as client:
+            assert client is pool.client
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    await asyncio.gather(*[call() for _ in range(6)])
+
+    assert max_running == 2
+    await pool.aclose()
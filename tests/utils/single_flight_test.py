@@ -0,0 +1,91 @@
+import asyncio
+import pytest
+from tellar.utils.single_flight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_coalesce_same_key():
+    flight = SingleFlight()
+    calls = []
+
+    async def compute(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key.upper()
+
+    results = await asyncio.gather(
+        *[flight.do("a", lambda: compute("a")) for _ in range(5)],
+        flight.do("b", lambda: compute("b")),
+    )
+
+    assert results == ["A"] * 5 + ["B"]
+    assert sorted(calls) == ["a", "b"]
+    assert flight.stats.calls == 6
+    assert flight.stats.executions == 2
+    assert flight.stats.coalesced == 4
+    assert flight.stats.coalesced_wait_seconds > 0
+    assert flight.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_keys_in_parallel():
+    flight = SingleFlight()
+    slow_started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow():
+        slow_started.set()
+        await release.wait()
+        return "slow"
+
+    slow_call = asyncio.create_task(flight.do("slow", slow))
+    await slow_started.wait()
+
+    # Not blocked by the slow key
+    assert await asyncio.wait_for(flight.do("fast", lambda: asyncio.sleep(0, "fast")), 1) == "fast"
+    release.set()
+    assert await slow_call == "slow"
+
+
+@pytest.mark.asyncio
+async def test_error_propagation():
+    flight = SingleFlight()
+    attempts = 0
+
+    async def failing():
+        nonlocal attempts
+        attempts += 1
+        await asyncio.sleep(0.01)
+        if attempts == 1:
+            raise RuntimeError("download failed")
+        return "ok"
+
+    results = await asyncio.gather(
+        flight.do("a", failing), flight.do("a", failing), return_exceptions=True
+    )
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flight.stats.failures == 1
+    # The next call starts a new computation
+    assert await flight.do("a", failing) == "ok"
+    assert attempts == 2
+
+
+@pytest.mark.asyncio
+async def test_cancellation_safety():
+    flight = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    first = asyncio.create_task(flight.do("a", compute))
+    second = asyncio.create_task(flight.do("a", compute))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    # The computation goes on for the other caller
+    assert await second == "done"
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    assert flight.stats.executions == 1
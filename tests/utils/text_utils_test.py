@@ -0,0 +1,16 @@
+from tellar.utils.text_utils import hash_key, normalize_query, tokenize
+
+
+def test_tokenize():
+    assert tokenize("Wingardium Leviosa, Hermione!") == ["wingardium", "leviosa", "hermione"]
+
+
+def test_normalize_query():
+    assert normalize_query("  Who are   YOU ? ") == "who are you"
+
+
+def test_hash_key():
+    assert hash_key("Harry", None) == hash_key("Harry", None)
+    assert hash_key("Harry", None) != hash_key("Harry", "None ")
+    # Parts are separated: ("ab", "c") is not ("a", "bc")
+    assert hash_key("ab", "c") != hash_key("a", "bc")
@@ -0,0 +1,33 @@
+from unittest.mock import patch
+from tellar.utils.token_utils import TokenCounter, get_encoding
+
+
+def test_estimate_without_encoding():
+    with patch("tellar.utils.token_utils.get_encoding", return_value=None):
+        counter = TokenCounter()
+
+    assert counter.count("abcdefgh") == 2
+    assert counter.count("abcdefghi") == 3
+    assert counter.truncate("abcdefghijkl", 2) == "abcdefgh"
+
+
+def test_unknown_encoding():
+    with patch("tellar.utils.token_utils.tiktoken.encoding_for_model", side_effect=KeyError("unknown")):
+        get_encoding.cache_clear()
+        assert get_encoding("unknown-model") is None
+    get_encoding.cache_clear()
+
+
+def test_with_encoding():
+    class FakeEncoding:
+        def encode(self, text, disallowed_special=()):
+            return list(text)
+
+        def decode(self, tokens):
+            return "".join(tokens)
+
+    with patch("tellar.utils.token_utils.get_encoding", return_value=FakeEncoding()):
+        counter = TokenCounter()
+
+    assert counter.count("abc") == 3
+    assert counter.truncate("abcdef", 2) == "ab"
@@ -0,0 +1,84 @@
+import faiss
+import numpy as np
+import pytest
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from tellar.vector_index import build_index, build_vector_store, filtered_search, load_vector_store
+
+
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(0)
+    return rng.normal(size=(2000, 32)).astype(np.float32)
+
+
+def recall(index, vectors, k=5):
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    queries = vectors[:50] + 0.01
+    _, expected = exact.search(queries, k)
+    _, found = index.search(queries, k)
+    return np.mean([len(set(e) & set(f)) / k for e, f in zip(expected, found)])
+
+
+def test_build_flat(vectors):
+    index = build_index(vectors, "flat")
+    assert isinstance(index, faiss.IndexFlatL2)
+    assert index.ntotal == 2000
+    assert recall(index, vectors) == 1.0
+
+
+def test_build_hnsw(vectors):
+    index = build_index(vectors, "hnsw", hnsw_ef_search=128)
+    assert isinstance(index, faiss.IndexHNSWFlat)
+    assert index.hnsw.efSearch == 128
+    assert recall(index, vectors) > 0.9
+
+
+def test_build_ivfpq(vectors):
+    index = build_index(vectors, "ivfpq")
+    assert isinstance(index, faiss.IndexIVFPQ)
+    assert index.is_trained
+    assert index.ntotal == 2000
+    assert index.nprobe >= 1
+
+
+def test_build_ivfpq_small_book(vectors):
+    # Too few vectors to train IVF-PQ
+    index = build_index(vectors[:100], "ivfpq")
+    assert isinstance(index, faiss.IndexFlatL2)
+
+
+def test_build_unknown_type(vectors):
+    with pytest.raises(ValueError):
+        build_index(vectors, "unknown")
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+@pytest.mark.parametrize("index_type", ["flat", "hnsw", "ivfpq"])
+def test_save_and_load(vectors, tmp_path, index_type, mmap):
+    embeddings = DeterministicFakeEmbedding(size=32)
+    texts = [f"text {i}" for i in range(len(vectors))]
+    metadatas = [{"page": i} for i in range(len(vectors))]
+    store = build_vector_store(texts, vectors, metadatas, embeddings, index_type=index_type)
+    store.save_local(str(tmp_path))
+
+    loaded = load_vector_store(str(tmp_path), embeddings, mmap=mmap)
+
+    docs = loaded.similarity_search_by_vector(vectors[42].tolist(), k=1)
+    assert docs[0].page_content == "text 42"
+    assert docs[0].metadata == {"page": 42}
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw", "ivfpq"])
+def test_filtered_search(vectors, index_type):
+    embeddings = DeterministicFakeEmbedding(size=32)
+    texts = [f"text {i}" for i in range(len(vectors))]
+    metadatas = [{"page": i} for i in range(len(vectors))]
+    store = build_vector_store(texts, vectors, metadatas, embeddings, index_type=index_type)
+    positions = np.arange(1000, 1100)
+
+    docs = filtered_search(store, vectors[42].tolist(), 5, positions)
+
+    assert 0 < len(docs) <= 5
+    assert all(1000 <= doc.metadata["page"] < 1100 for doc in docs)
+    assert filtered_search(store, vectors[42].tolist(), 5, positions[:0]) == []
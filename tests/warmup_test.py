@@ -0,0 +1,88 @@
+import asyncio
+import threading
+from unittest.mock import AsyncMock, Mock
+import pytest
+from tellar.character import Answer, Character
+from tellar.utils.single_flight import SingleFlight
+from tellar.warmup import GOAL_PROMPT, Warmup
+
+
+@pytest.fixture
+def char():
+    char = AsyncMock(spec=Character)
+    char.name = "Harry"
+    char.char_name = "Harry"
+    char.language = "french"
+    char.book_key = "book"
+    char.identity = "identity"
+    char.searchable_doc = Mock()
+    char.searchable_doc.wait_until_ready.return_value = True
+    char.clone = Mock(return_value=char)
+    char.answer.return_value = Answer(text="Trouver Voldemort")
+    return char
+
+
+@pytest.mark.asyncio
+async def test_warmup_goal(char, tmp_path):
+    warmup = Warmup(char, jobs=("goal",), user_data_path=str(tmp_path))
+    warmup.start()
+
+    assert await warmup.get("goal") == "Trouver Voldemort"
+    assert await warmup.get("goal") == "Trouver Voldemort"
+    char.clone.assert_called_once_with(language="english")
+    char.answer.assert_awaited_once_with(GOAL_PROMPT)
+    assert (tmp_path / "warmup" / warmup.key / "goal.txt").read_text() == "Trouver Voldemort"
+
+
+@pytest.mark.asyncio
+async def test_warmup_retry(char, tmp_path):
+    char.answer.side_effect = [RuntimeError("API down"), Answer(text="Brave")]
+    warmup = Warmup(char, user_data_path=str(tmp_path))
+
+    with pytest.raises(RuntimeError):
+        await warmup.get("description")
+    assert await warmup.get("description") == "Brave"
+
+
+@pytest.mark.asyncio
+async def test_warmup_shared_single_flight(char, tmp_path):
+    single_flight = SingleFlight()
+    warmup = Warmup(char, user_data_path=str(tmp_path), single_flight=single_flight)
+
+    await warmup.get("description")
+
+    # Reported with the other computations of the server
+    assert single_flight.stats.executions == 1
+
+
+@pytest.mark.asyncio
+async def test_warmup_waits_for_the_index(char, tmp_path):
+    indexed = threading.Event()
+    char.searchable_doc.wait_until_ready.side_effect = lambda: indexed.wait() and True
+    warmup = Warmup(char, jobs=("description",), user_data_path=str(tmp_path))
+    warmup.start()
+
+    # Nothing is answered from a partial index
+    await asyncio.sleep(0.05)
+    char.answer.assert_not_called()
+    indexed.set()
+    assert await warmup.get("description") == "Trouver Voldemort"
+
+
+@pytest.mark.asyncio
+async def test_warmup_index_failed(char, tmp_path):
+    char.searchable_doc.wait_until_ready.return_value = False
+    char.searchable_doc.progress.error = "corrupt PDF"
+    warmup = Warmup(char, user_data_path=str(tmp_path))
+
+    with pytest.raises(RuntimeError, match="corrupt PDF"):
+        await warmup.get("description")
+    char.answer.assert_not_called()
+    assert not (tmp_path / "warmup").exists()
+
+
+def test_warmup_key(char, tmp_path):
+    key = Warmup(char, user_data_path=str(tmp_path)).key
+    # Another character, book or language
+    char.identity = "other"
+    assert Warmup(char, user_data_path=str(tmp_path)).key != key